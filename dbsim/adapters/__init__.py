@@ -33,6 +33,88 @@ class Adapter(object):
     )
 
 
+  def statistics(self, relation):
+    """
+    Returns the TableStatistics (see dbsim.statistics) of the given relation, 
+      or None if the adapter does not maintain statistics for it. 
+    """
+    return None
+
+  def filtered_scan(self, relation, bool_op):
+    """
+    Returns a records function (ctx -> rows) for the given Relation provided by this adapter
+      that only reads the rows that may satisfy the selection predicate 'bool_op', 
+      e.g., by skipping blocks of rows using zone maps or by looking up indexes. 
+    The rows returned may be a superset of the rows satisfying 'bool_op', 
+      as the predicate is always applied to them afterwards.
+    Returns None if the whole relation has to be scanned.
+    """
+    return None
+
+  def filtered_nearest_scan(self, relation, bool_op, predicate, exprs, k, selectivity):
+    """
+    Returns a records function (ctx -> rows) for the given Relation provided by this adapter
+      generating the rows satisfying the selection predicate 'bool_op' among which 
+      the first k rows in the order of the expressions 'exprs' are searched,
+      e.g., by searching a vector index for the nearest rows first and filtering them (post-filtering) 
+      for a k-NN search over a selection, where 'predicate' is the function ((rows, ctx) -> booleans) 
+      evaluating 'bool_op' and 'selectivity' is the estimated fraction of the rows satisfying it.
+    Returns None if the selection should be evaluated as usual (pre-filtering).
+    """
+    return None
+
+  def create_index(self, relation, column_name, index_type, **params):
+    """Builds a secondary index (see dbsim.storage.index) over the column of the relation"""
+    raise NotImplementedError(
+      '{} does not support indexes'.format(
+        self.__class__.__name__
+      )
+    )
+
+  def drop_index(self, relation, column_name, index_type=None):
+    raise NotImplementedError(
+      '{} does not support indexes'.format(
+        self.__class__.__name__
+      )
+    )
+
+  def append(self, relation, rows):
+    """
+    Appends a batch of rows to the given relation (name) and returns the number of appended rows.
+    """
+    raise NotImplementedError(
+      '{} does not support appending rows'.format(
+        self.__class__.__name__
+      )
+    )
+
+  def index_lookup(self, relation, column_name):
+    """
+    Returns a function (value -> list of rows) looking up the rows of the given Relation 
+      whose column equals the value by an index, e.g., for index nested-loop joins, 
+      or None if the column is not indexed.
+    """
+    return None
+
+  def similarity_lookup(self, relation, column_name):
+    """
+    Returns a function ((vector, radius, k) -> list of rows) searching the rows of the given Relation 
+      whose vectors in the column are within distance 'radius' of the vector (a superset of them), 
+      or the k nearest rows to it if k is not None, by a vector index, e.g., for similarity joins, 
+      or None if the column has no vector index.
+    """
+    return None
+
+  def push_down(self, operation):
+    """
+    Returns a Relation equivalent to the given relational operator
+      (whose children are all Relations provided by this adapter)
+      if the adapter can evaluate the operator by itself,
+      e.g., by translating it into the query language of the underlying storage. 
+    Otherwise returns None, and the operator will be executed by the compiler as usual.
+    """
+    return None
+
   def evaluate(self,  loc):
     op = loc.node()
     func = partial(self.table_scan, op.name)
@@ -1,12 +1,15 @@
 import os
+import glob
 import pandas as pd
 import numpy
 import inspect
 import typing
 from typing import Dict, Type, Callable
+from concurrent.futures import ProcessPoolExecutor
 
 from . import Adapter
 from .dataframe_adapter import DataFrameAdapter
+from .partitioned_adapter import PartitionedAdapter
 from ..utils import *
 from ..utils.logger import Logger
 from .. import field 
@@ -30,6 +33,12 @@ class AdapterFactory(object):
 
   extendedSyntaxDataTypeConverters: Dict[Type, Callable] = dict()
 
+  vector_compression: Dict = None
+  """
+  The 'vector_compression' option of the tables loaded from files (see DataFrameTable), 
+    e.g., dict(num_subspaces=16) to keep the vectors as product-quantized codes so that large embedding datasets fit in memory.
+  """
+
   @classmethod
   def addDataTypeConverter(cls, extended_syntax: Type, datatype_converter: Callable):
     ERROR_IF_FALSE(
@@ -74,7 +83,8 @@ class AdapterFactory(object):
     (2) the FieldType to which the data type was converted
     """
     df_col_dtype = df_column.dtype 
-    if df_col_dtype == object:
+    # pandas may store the strings with its own string dtype instead of object
+    if df_col_dtype == object or pd.api.types.is_string_dtype(df_col_dtype):
       # The current dataframe column stores string type values.
       # Those values may be pure strings, or some complex objects
       #   that are not recognized by pandas.
@@ -101,19 +111,15 @@ class AdapterFactory(object):
     raise RuntimeError("No matched FieldType to pandas dtype '{}'".format(df_col_dtype))
 
   @classmethod
-  def fromFile(cls, filepath: str, ds_name: str = None) -> Adapter:
-    ext = os.path.splitext(filepath)[1]
-    # ext looks like ".csv", ".txt", etc.
-    if len(ext) > 0 and ext[0] == '.':
-      ext = ext[1:]
-    ERROR_IF_FALSE(
-      ext in cls.supported_filetypes,
-      "File type '{}' not supported currently (supported types: {})".format(ext, ', '.join(list(cls.supported_filetypes)))
-    )
-    if ds_name is None:
-      ds_name = os.path.basename(filepath)
-      if '.' in ds_name:
-        ds_name = ds_name.split('.')[0]
+  def readFile(cls, filepath: str) -> typing.Tuple[pd.DataFrame, typing.List[Dict]]:
+    """
+    Reads a data file into a DataFrame whose columns are converted by AdapterFactory.convertType.
+
+    Returns
+    ------------
+    (1) The DataFrame, and
+    (2) the fields of its schema, like [dict(name = ..., type = ...), ...]
+    """
     # infer the separator without being specified by users 
     # note that "iterator = True" will keep the input file open, 
     #   so here we must manually close the file. 
@@ -127,7 +133,124 @@ class AdapterFactory(object):
       converted_column, converted_type = cls.convertType(df[col_name])
       df[col_name] = converted_column
       fields.append(dict(name = col_name, type = converted_type))
+    return df, fields
+
+  @classmethod
+  def datasetName(cls, filepath: str) -> str:
+    """Returns the default dataset name of a file, i.e., its name without the extension"""
+    ds_name = os.path.basename(filepath)
+    if '.' in ds_name:
+      ds_name = ds_name.split('.')[0]
+    return ds_name
+
+  @classmethod
+  def checkFileType(cls, filepath: str) -> None:
+    ext = os.path.splitext(filepath)[1]
+    # ext looks like ".csv", ".txt", etc.
+    if len(ext) > 0 and ext[0] == '.':
+      ext = ext[1:]
+    ERROR_IF_FALSE(
+      ext in cls.supported_filetypes,
+      "File type '{}' not supported currently (supported types: {})".format(ext, ', '.join(list(cls.supported_filetypes)))
+    )
+
+  @classmethod
+  def fromFile(cls, filepath: str, ds_name: str = None) -> Adapter:
+    cls.checkFileType(filepath)
+    if ds_name is None:
+      ds_name = cls.datasetName(filepath)
+    df, fields = cls.readFile(filepath)
     schema = dict(fields = fields)
-    return DataFrameAdapter(**{ds_name: dict(schema = schema, dataframe = df)})
+    return DataFrameAdapter(**{ds_name: dict(schema = schema, dataframe = df, vector_compression = cls.vector_compression)})
 
+  @classmethod
+  def initWorker(cls, extended_syntaxes: typing.List[Type]) -> None:
+    """
+    Registers the extended data types (and their converters) of the given ExtendedSyntax subclasses
+      in a worker process of AdapterFactory.fromFiles, if they are not inherited from the parent process.
+    """
+    for extended_syntax in extended_syntaxes:
+      if extended_syntax not in cls.extendedSyntaxDataTypeConverters:
+        extended_syntax.addExtendedDataTypes()
+
+  @classmethod
+  def readFileInWorker(cls, filepath: str) -> typing.Tuple[pd.DataFrame, typing.List[typing.Tuple[str, str]]]:
+    """
+    Reads a data file in a worker process of AdapterFactory.fromFiles, 
+      returning the fields as (name, FieldType name) to be resolved in the parent process, 
+      since the FieldType enum is re-created whenever data types are added (see field.addDataTypes), 
+      so its members cannot be pickled across processes.
+    """
+    df, fields = cls.readFile(filepath)
+    return df, [(f['name'], f['type'].name) for f in fields]
+
+  @classmethod
+  def fromFiles(cls, filepaths: typing.List[str], ds_names: typing.List[str] = None, max_workers: int = None) -> typing.List[Adapter]:
+    """
+    Loads each file as a DataFrameAdapter like AdapterFactory.fromFile, 
+      where the files are parsed and their columns converted (see AdapterFactory.readFile) 
+      in a pool of 'max_workers' processes (the number of CPUs by default).
+
+    Parameters
+    ------------
+    filepaths: the files to load
+    ds_names: the dataset name of each file, which are the file names without the extensions by default
+    max_workers: the number of processes
 
+    Returns
+    ------------
+    The adapters in the order of 'filepaths'
+    """
+    filepaths = list(filepaths)
+    for filepath in filepaths:
+      cls.checkFileType(filepath)
+    if ds_names is None:
+      ds_names = [cls.datasetName(filepath) for filepath in filepaths]
+    ERROR_IF_FALSE(
+      len(ds_names) == len(filepaths),
+      "{} dataset names given for {} files".format(len(ds_names), len(filepaths))
+    )
+    if len(filepaths) <= 1 or max_workers == 1:
+      results = [cls.readFile(filepath) for filepath in filepaths]
+    else:
+      with ProcessPoolExecutor(
+        max_workers = min(max_workers or os.cpu_count() or 1, len(filepaths)),
+        initializer = cls.initWorker,
+        initargs = (list(cls.extendedSyntaxDataTypeConverters),)
+      ) as executor:
+        results = [
+          (df, [dict(name = name, type = getattr(field.FieldType, type_name)) for name, type_name in fields])
+          for df, fields in executor.map(cls.readFileInWorker, filepaths)
+        ]
+    return [
+      DataFrameAdapter(**{ds_name: dict(schema = dict(fields = fields), dataframe = df, vector_compression = cls.vector_compression)})
+      for ds_name, (df, fields) in zip(ds_names, results)
+    ]
+
+  @classmethod
+  def fromGlob(cls, pattern: str, max_workers: int = None) -> typing.List[Adapter]:
+    """
+    Loads the supported files matching the glob pattern (like 'data/*.csv') by AdapterFactory.fromFiles, 
+      in the order of their paths. 
+    """
+    filepaths = sorted(
+      filepath for filepath in glob.glob(pattern)
+      if os.path.isfile(filepath) and os.path.splitext(filepath)[1][1:] in cls.supported_filetypes
+    )
+    return cls.fromFiles(filepaths, max_workers = max_workers)
+
+  @classmethod
+  def fromPartitionedDirectory(cls, dirpath: str, ds_name: str = None, max_workers: int = None) -> Adapter:
+    """
+    Loads a Hive-style partitioned directory tree, like 'events/date=2026-10-01/part-0.csv',
+      as one table whose partition columns are parsed from the directory names (see PartitionedAdapter).
+
+    Parameters
+    ------------
+    dirpath: the root directory of the table
+    ds_name: the table name, which is the name of the root directory by default
+    max_workers: the number of threads reading the files of the table in parallel
+    """
+    if ds_name is None:
+      ds_name = os.path.basename(os.path.normpath(dirpath))
+    return PartitionedAdapter(**{ds_name: dict(dirpath = dirpath, max_workers = max_workers)})
@@ -0,0 +1,97 @@
+import typing
+
+import numpy as np
+from pandas import DataFrame
+
+from .memory_table import MemoryTable
+from ..storage.compression import CompressedColumn
+from ..storage.ranges import ColumnRange
+
+class CompressedTable(MemoryTable):
+  """
+  Table whose rows are only kept as compressed columns (see storage.compression),
+    e.g., to hold more datasets in memory at the cost of decoding the rows when they are scanned.
+
+  The table is created with (and appended) either a list of dictionaries or a DataFrame,
+    like DictTable and DataFrameTable respectively,
+    and the compression is enabled by 'compression=True' in the table setup of their adapters.
+  Range and equality predicates on the columns are evaluated on the compressed blocks,
+    so that only the rows satisfying them are decoded.
+  """
+  evaluates_ranges = True
+
+  def __init__(self, adapter, name, schema, rows, block_size=None):
+    super(CompressedTable, self).__init__(adapter, name, schema, block_size)
+    self._columns = [CompressedColumn(f.name, self.block_size) for f in self.schema.fields]
+    self._num_rows = 0
+    self._store(rows)
+    self.build_access_structures()
+
+  def _should_encode(self, f) -> bool:
+    # the string columns are dictionary-encoded by the compressed columns themselves
+    return False
+
+  def _columns_of(self, rows) -> typing.List[typing.Sequence]:
+    if isinstance(rows, DataFrame):
+      return [
+        rows[key].to_numpy() if key in rows.columns else [default] * len(rows)
+        for key, default in self.key_index
+      ]
+    rows = rows if isinstance(rows, list) else list(rows)
+    return [[row.get(key, default) for row in rows] for key, default in self.key_index]
+
+  def _store(self, rows) -> typing.List[typing.Sequence]:
+    columns = self._columns_of(rows)
+    for column, values in zip(self._columns, columns):
+      column.append(values)
+    self._num_rows += len(columns[0]) if len(columns) > 0 else 0
+    return columns
+
+  def _append_rows(self, rows):
+    return self._store(rows)
+
+  def __iter__(self):
+    # This will return a generator, which acts the same as an iterator
+    return self.scan_range(0, self._num_rows)
+
+  def scan_range(self, start, stop):
+    # decodes a block at a time
+    stop = min(stop, self._num_rows)
+    for block_start in range(start, stop, self.block_size):
+      block_stop = min(block_start + self.block_size, stop)
+      yield from zip(*[column.decode(block_start, block_stop).tolist() for column in self._columns])
+
+  def rows_at(self, row_ids):
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) == 0:
+      return iter(())
+    return zip(*[column.take(row_ids).tolist() for column in self._columns])
+
+  def column(self, name):
+    """Returns the values of the given column as a NumPy array"""
+    return self._columns[self.schema.field_position(name)].decode()
+
+  def _range_row_ids(self, ranges: typing.Dict[int, ColumnRange], blocks: typing.List[int]) -> np.ndarray:
+    row_ids = None
+    for pos, column_range in ranges.items():
+      selected = self._columns[pos].selectRange(column_range, blocks)
+      if selected is None:
+        continue
+      row_ids = selected if row_ids is None else np.intersect1d(row_ids, selected, assume_unique=True)
+    return row_ids
+
+  def nbytes(self) -> int:
+    """Number of bytes taken by the compressed columns"""
+    return sum(column.nbytes for column in self._columns)
+
+  def rows(self):
+    """Returns the decoded rows as a list of dictionaries"""
+    names = [name for name, _ in self.key_index]
+    return [dict(zip(names, row)) for row in self]
+
+  def df(self):
+    """Returns the decoded rows as a DataFrame"""
+    return DataFrame({name: self.column(name) for name, _ in self.key_index})
+
+  def size(self):
+    return self._num_rows
@@ -1,6 +1,26 @@
-from dbsim import Table
+import os
+import tempfile
+import typing
+import weakref
+from itertools import chain
+
+import pandas as pd
 from pandas import DataFrame
+import numpy as np
 from . import Adapter
+from .. import Relation
+from ..ast import TopKOp
+from .compressed_table import CompressedTable
+from .memory_table import MemoryTable
+from ..storage.index import IndexType
+from ..storage.vector_store import VectorStore
+from ..storage.product_quantization import QuantizedVectorStore
+
+def remove_file(path: str) -> None:
+  try:
+    os.remove(path)
+  except FileNotFoundError:
+    pass
 
 class DataFrameAdapter(Adapter):
   """
@@ -17,7 +37,14 @@ class DataFrameAdapter(Adapter):
       )
       other=dict(
         schema=[],
-        dataframe=pd.DataFrame(...)
+        dataframe=pd.DataFrame(...),
+        block_size=65536, # optional, number of rows per zone map entry
+        compression=True, # optional, keeps the rows only as compressed columns
+        vector_dtype=np.float16, # optional, the type of the elements of the stored vectors (float32 by default)
+        vector_compression=dict( # optional, keeps the vectors as product-quantized codes (see storage.product_quantization)
+          num_subspaces=16, # optional, number of bytes per vector
+          exact_dir='/path/to/dir' # optional, where the exact vectors are kept in memory-mapped files for re-ranking
+        )
       )
     )
 
@@ -28,15 +55,25 @@ class DataFrameAdapter(Adapter):
       if isinstance(table, dict):
         schema = table['schema']
         df = table['dataframe']
+        block_size = table.get('block_size')
+        compression = table.get('compression', False)
+        vector_dtype = table.get('vector_dtype', np.float32)
+        vector_compression = table.get('vector_compression')
       else:
         raise RuntimeError("Invalid table setup for '{}', please input the table using Python dict and specify its schema".format(name))
         
-      self._tables[name] = DataFrameTable(
-        self,
-        name, 
-        schema=schema, 
-        df=df
-      )
+      if compression:
+        self._tables[name] = CompressedTable(self, name, schema=schema, rows=df, block_size=block_size)
+      else:
+        self._tables[name] = DataFrameTable(
+          self,
+          name, 
+          schema=schema, 
+          df=df,
+          block_size=block_size,
+          vector_dtype=vector_dtype,
+          vector_compression=vector_compression
+        )
 
 
   @property
@@ -56,34 +93,215 @@ class DataFrameAdapter(Adapter):
   def get_relation(self, name):
     return self._tables.get(name)
 
+  def statistics(self, relation):
+    return self._tables[relation].statistics()
+
   def table_scan(self, name, ctx):
     return self._tables[name]
 
+  def filtered_scan(self, relation, bool_op):
+    table = self._tables.get(relation.name)
+    return table.filtered_scan(bool_op) if table is not None else None
+
+  def filtered_nearest_scan(self, relation, bool_op, predicate, exprs, k, selectivity):
+    table = self._tables.get(relation.name)
+    if table is None:
+      return None
+    return table.filtered_nearest_scan(bool_op, predicate, exprs, k, selectivity)
+
+  def push_down(self, operation):
+    """Evaluates a k-NN search (ORDER BY column TO vector LIMIT k) by the vector index over the column, if any"""
+    if type(operation) is not TopKOp:
+      return None
+    relation = operation.relation
+    table = self._tables.get(relation.name)
+    scan = table.nearest_scan(operation.exprs, operation.k) if table is not None else None
+    if scan is None:
+      return None
+    return Relation(self, relation.name, operation.schema, scan)
+
+  def create_index(self, relation, column_name, index_type=IndexType.SORTED, **params):
+    return self._tables[relation].create_index(column_name, index_type, **params)
+
+  def drop_index(self, relation, column_name, index_type=None):
+    self._tables[relation].drop_index(column_name, index_type)
 
+  def append(self, relation, rows):
+    return self._tables[relation].append(rows)
 
-class DataFrameTable(Table):
-  def __init__(self, adapter, name, schema, df):
-    super(self.__class__, self).__init__(adapter, name, schema)
-    self.key_index = [
-      (f.name, () if f.mode == 'REPEATED' else None)
+  def index_lookup(self, relation, column_name):
+    table = self._tables.get(relation.name)
+    return table.index_lookup(column_name) if table is not None else None
+
+  def similarity_lookup(self, relation, column_name):
+    table = self._tables.get(relation.name)
+    return table.similarity_lookup(column_name) if table is not None else None
+
+
+
+class DataFrameTable(MemoryTable):
+  """
+  Table over a DataFrame.
+
+  The appended rows are kept in separate DataFrames (segments) instead of being concatenated
+    to the existing rows on every append, which would copy the whole table each time.
+  Like a binary counter, the last two segments are merged whenever the last one is at least as large
+    as the one before it, so there are O(log n) segments and each row is copied O(log n) times.
+  The segments are concatenated into a single DataFrame only when it is requested (see DataFrameTable.df).
+
+  The dictionary-encoded columns are stored as pandas Categorical, 
+    whose codes and categories are those of the dictionaries.
+
+  The vector columns are stored as contiguous matrices (see storage.vector_store) 
+    and the DataFrames only keep the row ids in those columns, 
+    while the tuples of the rows (and DataFrameTable.df) carry views of the matrix rows.
+  With 'vector_compression', the vectors are stored as their product-quantized codes instead
+    (see storage.product_quantization.QuantizedVectorStore, to which its items are passed),
+    and 'exact_dir' is the directory of the files of the exact vectors, if kept,
+    where each store creates its own file (named '<table>.<column>.<random>.f32'),
+    so the tables of the same name in other adapters never share the file,
+    and the file is deleted once the store is garbage-collected (or at exit).
+  """
+  def __init__(self, adapter, name, schema, df, block_size=None, vector_dtype=np.float32, vector_compression=None):
+    super(self.__class__, self).__init__(adapter, name, schema, block_size)
+    self._vector_stores: typing.Dict[str, VectorStore] = {
+      f.name: self._new_vector_store(f.name, vector_dtype, vector_compression)
       for f in self.schema.fields
+      if f.mode != 'REPEATED' and f.type.name == 'VECTOR'
+    }
+    """column name -> contiguous storage of the vectors of the column"""
+    df = self._store_vectors(df, 0)
+    self._segments = [df]
+    self._starts = np.zeros(1, dtype=np.int64)
+    """The id of the first row of each segment"""
+    self._num_rows = len(df)
+    self.build_access_structures()
+    self._segments[0] = self._encode_segment(df, 0)
+
+  def _new_vector_store(self, column_name, vector_dtype, vector_compression) -> VectorStore:
+    if not vector_compression:
+      return VectorStore(dtype=vector_dtype)
+    params = dict(vector_compression) if isinstance(vector_compression, dict) else dict()
+    exact_dir = params.pop('exact_dir', None)
+    if exact_dir is None:
+      return QuantizedVectorStore(**params)
+    fd, params['exact_path'] = tempfile.mkstemp(suffix='.f32', prefix='{}.{}.'.format(self.name, column_name), dir=exact_dir)
+    os.close(fd)
+    store = QuantizedVectorStore(**params)
+    weakref.finalize(store, remove_file, params['exact_path'])
+    return store
+
+  def _store_vectors(self, df, start):
+    """Moves the vectors of the segment (whose first row is row 'start') to the vector stores, leaving their row ids"""
+    if len(self._vector_stores) == 0:
+      return df
+    for name, store in self._vector_stores.items():
+      store.append(df[name].to_numpy() if name in df.columns else [None] * len(df))
+    row_ids = np.arange(start, start + len(df))
+    return df.assign(**{name: row_ids for name in self._vector_stores})
+
+  def vector_store(self, column_name):
+    return self._vector_stores.get(column_name)
+
+  def _encode_segment(self, df, start):
+    """Stores the encoded columns of the segment (whose first row is row 'start') as pandas Categorical"""
+    encoded = {
+      name: pd.Categorical.from_codes(dictionary.codes[start:start + len(df)], dictionary.categories())
+      for name, dictionary in self._dictionaries.items()
+      if name in df.columns
+    }
+    return df.assign(**encoded) if len(encoded) > 0 else df
+
+  def _concat(self, segments):
+    # the categories of the earlier segments are a prefix of the categories of the later ones,
+    #   which have to be the same for pandas to keep the concatenated columns as Categorical
+    segments = [
+      segment.assign(**{
+        name: segment[name].cat.set_categories(dictionary.categories())
+        for name, dictionary in self._dictionaries.items()
+        if name in segment.columns
+      })
+      for segment in segments
     ]
-    self._df = df
+    return pd.concat(segments, ignore_index=True)
 
-  def __iter__(self):
+  def _tuples(self, df):
     key_index = self.key_index
+    stores = self._vector_stores
+    return (
+      tuple(
+        stores[key].row(row[key]) if key in stores else row.get(key, default=default) 
+        for key, default in key_index
+      )
+      for i, row in df.iterrows()
+    )
 
+  def __iter__(self):
     # This will return a generator, which acts the same as an iterator
-    return (
-      tuple(row.get(key, default=default) for key, default in key_index)
-      for i, row in self._df.iterrows()
+    return self.scan_range(0, self._num_rows)
+
+  def scan_range(self, start, stop):
+    return chain.from_iterable(
+      self._tuples(segment.iloc[max(start - seg_start, 0):stop - seg_start])
+      for seg_start, segment in zip(self._starts.tolist(), self._segments)
+      if seg_start < stop and seg_start + len(segment) > start
+    )
+
+  def rows_at(self, row_ids):
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) == 0:
+      return iter(())
+    segment_ids = np.searchsorted(self._starts, row_ids, side='right') - 1
+    # splits the row ids into runs within the same segment, keeping their order
+    run_starts = np.concatenate([[0], np.flatnonzero(np.diff(segment_ids)) + 1, [len(row_ids)]]).tolist()
+    return chain.from_iterable(
+      self._tuples(self._segments[segment_ids[a]].iloc[row_ids[a:b] - self._starts[segment_ids[a]]])
+      for a, b in zip(run_starts[:-1], run_starts[1:])
     )
 
+  def _segment_column(self, df, name, default):
+    if name in self._vector_stores:
+      return self._vector_stores[name].rows(df[name].to_numpy())
+    if name in df.columns:
+      return df[name].to_numpy()
+    return np.array([default] * len(df), dtype=object)
+
+  def column(self, name):
+    """Returns the values of the given column as a NumPy array"""
+    default = dict(self.key_index)[name]
+    columns = [self._segment_column(segment, name, default) for segment in self._segments]
+    return columns[0] if len(columns) == 1 else np.concatenate(columns)
+
+  def _append_rows(self, rows):
+    df = rows if isinstance(rows, DataFrame) else DataFrame(list(rows))
+    if len(df) == 0:
+      return []
+    df = self._store_vectors(df, self._num_rows)
+    columns = [self._segment_column(df, name, default) for name, default in self.key_index]
+    self._update_dictionaries(columns)
+    segments = self._segments
+    segments.append(self._encode_segment(df, self._num_rows))
+    while len(segments) > 1 and len(segments[-1]) >= len(segments[-2]):
+      last = segments.pop()
+      segments[-1] = self._concat([segments[-1], last])
+    self._num_rows += len(df)
+    self._starts = np.cumsum([0] + [len(segment) for segment in segments[:-1]])
+    return columns
+
   def df(self):
-    return self._df
+    if len(self._segments) > 1:
+      self._segments = [self._concat(self._segments)]
+      self._starts = np.zeros(1, dtype=np.int64)
+    df = self._segments[0]
+    if len(self._vector_stores) == 0:
+      return df
+    return df.assign(**{
+      name: pd.Series(self._segment_column(df, name, None), index=df.index, dtype=object) 
+      for name in self._vector_stores
+    })
   
   def storage(self):
     return self.df()
 
   def size(self):
-    return len(self._df)
\ No newline at end of file
+    return self._num_rows
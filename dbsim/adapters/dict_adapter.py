@@ -1,5 +1,9 @@
-from dbsim import Table
 from . import Adapter
+from .. import Relation
+from ..ast import TopKOp
+from .compressed_table import CompressedTable
+from .memory_table import MemoryTable
+from ..storage.index import IndexType
 
 class DictAdapter(Adapter):
   """
@@ -13,7 +17,9 @@ class DictAdapter(Adapter):
       users=[dict(),dict(),...],
       other=dict(
         schema=[],
-        rows=[dict(),dict(),...]
+        rows=[dict(),dict(),...],
+        block_size=65536, # optional, number of rows per zone map entry
+        compression=True # optional, keeps the rows only as compressed columns
       )
     )
 
@@ -21,18 +27,23 @@ class DictAdapter(Adapter):
     self._tables = {}
 
     for name, table in tables.items():
+      block_size = None
+      compression = False
       if isinstance(table, dict):
         schema = table['schema']
         rows=table['rows']
+        block_size = table.get('block_size')
+        compression = table.get('compression', False)
       else:
         rows = table
         schema = self.guess_schema(rows)
 
-      self._tables[name] = DictTable(
+      self._tables[name] = (CompressedTable if compression else DictTable)(
         self,
         name, 
         schema=schema, 
-        rows=rows
+        rows=rows,
+        block_size=block_size
       )
 
 
@@ -53,19 +64,59 @@ class DictAdapter(Adapter):
   def get_relation(self, name):
     return self._tables.get(name)
 
+  def statistics(self, relation):
+    return self._tables[relation].statistics()
+
   def table_scan(self, name, ctx):
     return self._tables[name]
 
+  def filtered_scan(self, relation, bool_op):
+    table = self._tables.get(relation.name)
+    return table.filtered_scan(bool_op) if table is not None else None
 
+  def filtered_nearest_scan(self, relation, bool_op, predicate, exprs, k, selectivity):
+    table = self._tables.get(relation.name)
+    if table is None:
+      return None
+    return table.filtered_nearest_scan(bool_op, predicate, exprs, k, selectivity)
 
-class DictTable(Table):
-  def __init__(self, adapter, name, schema, rows):
-    super(self.__class__, self).__init__(adapter, name, schema)
-    self.key_index = [
-      (f.name, () if f.mode == 'REPEATED' else None)
-      for f in self.schema.fields
-    ]
-    self._rows = rows
+  def push_down(self, operation):
+    """Evaluates a k-NN search (ORDER BY column TO vector LIMIT k) by the vector index over the column, if any"""
+    if type(operation) is not TopKOp:
+      return None
+    relation = operation.relation
+    table = self._tables.get(relation.name)
+    scan = table.nearest_scan(operation.exprs, operation.k) if table is not None else None
+    if scan is None:
+      return None
+    return Relation(self, relation.name, operation.schema, scan)
+
+  def create_index(self, relation, column_name, index_type=IndexType.SORTED, **params):
+    return self._tables[relation].create_index(column_name, index_type, **params)
+
+  def drop_index(self, relation, column_name, index_type=None):
+    self._tables[relation].drop_index(column_name, index_type)
+
+  def append(self, relation, rows):
+    return self._tables[relation].append(rows)
+
+  def index_lookup(self, relation, column_name):
+    table = self._tables.get(relation.name)
+    return table.index_lookup(column_name) if table is not None else None
+
+  def similarity_lookup(self, relation, column_name):
+    table = self._tables.get(relation.name)
+    return table.similarity_lookup(column_name) if table is not None else None
+
+
+
+class DictTable(MemoryTable):
+  def __init__(self, adapter, name, schema, rows, block_size=None):
+    super(self.__class__, self).__init__(adapter, name, schema, block_size)
+    # copied since the table appends to it
+    self._rows = list(rows)
+    self.build_access_structures()
+    self._share_dictionary_values(self._rows, 0)
 
   def __iter__(self):
     key_index = self.key_index
@@ -76,6 +127,47 @@ class DictTable(Table):
       for row in self._rows
     )
 
+  def scan_range(self, start, stop):
+    key_index = self.key_index
+    return (
+      tuple(row.get(key, default) for key, default in key_index)
+      for row in self._rows[start:stop]
+    )
+
+  def rows_at(self, row_ids):
+    key_index = self.key_index
+    rows = self._rows
+    return (
+      tuple(rows[i].get(key, default) for key, default in key_index)
+      for i in row_ids
+    )
+
+  def column(self, name):
+    """Returns the values of the given column as a list"""
+    default = dict(self.key_index)[name]
+    return [row.get(name, default) for row in self._rows]
+
+  def _share_dictionary_values(self, rows, start):
+    """
+    Replaces the values of the encoded columns in the rows (the first of which is row 'start')
+      with the equal string objects of the dictionaries, so that each distinct value is stored once.
+    """
+    for name, dictionary in self._dictionaries.items():
+      values = dictionary.values
+      for row, code in zip(rows, dictionary.codes[start:start + len(rows)].tolist()):
+        if code >= 0:
+          row[name] = values[code]
+
+  def _append_rows(self, rows):
+    # the list over-allocates as it grows, so appending is amortized O(1) per row
+    rows = list(rows)
+    start = len(self._rows)
+    self._rows.extend(rows)
+    columns = [[row.get(key, default) for row in rows] for key, default in self.key_index]
+    self._update_dictionaries(columns)
+    self._share_dictionary_values(rows, start)
+    return columns
+
   def rows(self):
     return self._rows
     
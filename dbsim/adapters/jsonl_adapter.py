@@ -0,0 +1,309 @@
+import os
+import io
+import gzip
+import json
+import typing
+from typing import Dict, List
+
+from dbsim import Table
+from . import Adapter
+from .. import Relation
+from .. import field
+from ..ast import *
+from ..utils import *
+
+class JsonlAdapter(Adapter):
+  """
+  An adapter for working with JSON Lines files, i.e., one JSON object per line, optionally gzip-compressed.
+
+  The files are streamed: nothing is loaded when the adapter is created except a sample of the lines,
+    from which the (possibly nested) schema of each table is inferred (see inferFields),
+    and every scan parses the file again line by line.
+  Nested objects are RECORD fields and arrays are REPEATED fields,
+    which can be unnested by the 'flatten' function (see functions.relational).
+
+  Only the requested paths are kept in the rows:
+    the table setup may restrict the columns to some paths like 'user.id' (see JsonlAdapter.__init__),
+    and a projection of columns over a table is evaluated while parsing (see JsonlAdapter.push_down).
+  """
+  sample_size = 1000
+  """Number of lines from which the schema is inferred"""
+
+  def __init__(self, **tables):
+    """
+
+    Examples:
+    JsonlAdapter(
+      clicks='/path/to/clicks.jsonl.gz',
+      other=dict(
+        filepath='/path/to/other.jsonl',
+        sample_size=10000, # optional, number of lines to infer the schema from
+        paths=['ts', 'user.id', 'items'] # optional, the (dot-separated) paths kept in the table
+      )
+    )
+    """
+    self._tables = {}
+
+    for name, table in tables.items():
+      table = table if isinstance(table, dict) else dict(filepath=table)
+      ERROR_IF_FALSE(
+        os.path.isfile(table.get('filepath', '')),
+        "Invalid table setup for '{}', '{}' is not a file".format(name, table.get('filepath'))
+      )
+      self._tables[name] = JsonlTable(
+        self,
+        name,
+        table['filepath'],
+        sample_size=table.get('sample_size', self.sample_size),
+        paths=table.get('paths')
+      )
+
+  @property
+  def relations(self):
+    return [
+      (name, table.schema)
+      for name, table in self._tables.items()
+    ]
+
+  def has(self, relation):
+    return relation in self._tables
+
+  def schema(self, relation):
+    return self._tables[relation].schema
+
+  def get_relation(self, name):
+    return self._tables.get(name)
+
+  def table_scan(self, name, ctx):
+    return self._tables[name]
+
+  def push_down(self, operation):
+    """
+    Evaluates a projection of columns over a table while parsing the lines,
+      so that the tuples are built from the projected columns only.
+    Returns None for any other operator.
+    """
+    if type(operation) is not ProjectionOp:
+      return None
+    table = self._tables.get(operation.relation.name)
+    if table is None or operation.relation.records != table.records:
+      # not a plain scan of the table
+      return None
+    schema = operation.relation.schema
+    positions = []
+    for expr in operation.exprs:
+      if isinstance(expr, SelectAllExpr):
+        positions.extend(
+          pos for pos, f in enumerate(schema.fields)
+          if expr.table is None or f.schema_name == expr.table
+        )
+        continue
+      if isinstance(expr, RenameOp):
+        expr = expr.expr
+      if not isinstance(expr, Var):
+        return None
+      try:
+        positions.append(schema.field_position(expr.path))
+      except (FieldNotFoundError, AmbigousFieldError):
+        return None
+    if len(positions) != len(operation.schema.fields):
+      return None
+    extractors = [table.extractors[pos] for pos in positions]
+    return Relation(self, operation.relation.name, operation.schema, lambda ctx: table.scan(extractors))
+
+  def evaluate(self, loc):
+    op = loc.node()
+    table = self._tables[op.name]
+    return loc.replace(Relation(self, op.name, table.schema, table.records))
+
+
+class JsonlTable(Table):
+  batch_size = 1 << 20
+  """Approximate number of bytes read from the file at a time"""
+
+  def __init__(self, adapter, name, filepath, sample_size=JsonlAdapter.sample_size, paths=None):
+    self.filepath = filepath
+    full_fields = inferFields(self.sample(sample_size))
+    fields = full_fields if paths is None else projectFields(full_fields, [path.split('.') for path in paths])
+    super(JsonlTable, self).__init__(adapter, name, dict(fields=fields))
+    full_fields = {f['name']: f for f in full_fields}
+    self.extractors = [(f['name'], valueExtractor(f, full_fields[f['name']])) for f in fields]
+
+  def open(self) -> typing.BinaryIO:
+    # gzip files are recognized by their magic number rather than by the file extension
+    with open(self.filepath, 'rb') as file:
+      is_gzip = file.read(2) == b'\x1f\x8b'
+    return io.BufferedReader(gzip.open(self.filepath, 'rb')) if is_gzip else open(self.filepath, 'rb')
+
+  def lines(self):
+    """Returns a generator of the non-empty lines of the file (as bytes)"""
+    with self.open() as file:
+      while True:
+        lines = file.readlines(self.batch_size)
+        if not lines:
+          break
+        for line in lines:
+          if not line.isspace():
+            yield line
+
+  def sample(self, sample_size: int) -> List[Dict]:
+    """Returns the objects of the first 'sample_size' lines"""
+    objects = []
+    for line in self.lines():
+      if len(objects) >= sample_size:
+        break
+      objects.append(json.loads(line))
+    return objects
+
+  def scan(self, extractors):
+    """
+    Returns a generator of the tuples of the given column extractors,
+      each of which is (top-level name, function extracting the column from the value under the name),
+      where the function is None if the value is kept as it is.
+    """
+    loads = json.loads
+    if all(extract is None for _, extract in extractors):
+      names = [name for name, _ in extractors]
+      for line in self.lines():
+        obj = loads(line)
+        yield tuple([obj.get(name) for name in names])
+      return
+    for line in self.lines():
+      obj = loads(line)
+      yield tuple([
+        obj.get(name) if extract is None else extract(obj.get(name))
+        for name, extract in extractors
+      ])
+
+  def records(self, ctx):
+    return self.scan(self.extractors)
+
+  def __iter__(self):
+    return self.scan(self.extractors)
+
+
+JSON_FIELD_TYPES = [
+  # bool is a subclass of int, so it has to be checked first
+  (bool, 'BOOLEAN'),
+  (int, 'INTEGER'),
+  (float, 'FLOAT'),
+  (str, 'STRING'),
+  (dict, 'RECORD'),
+]
+
+def jsonFieldType(value) -> str:
+  """Returns the name of the FieldType of a parsed JSON (non-array) value"""
+  for python_type, type_name in JSON_FIELD_TYPES:
+    if isinstance(value, python_type):
+      return type_name
+  return 'STRING'
+
+class FieldInference(object):
+  """The type (name) and mode of a field inferred from the values seen so far, and the inference of its sub-fields"""
+  __slots__ = ('type', 'repeated', 'fields')
+
+  def __init__(self):
+    self.type = None
+    self.repeated = False
+    self.fields: Dict[str, 'FieldInference'] = dict()
+
+  def add(self, value) -> None:
+    if value is None:
+      return
+    if isinstance(value, list):
+      self.repeated = True
+      for element in value:
+        self.addScalar(element)
+    else:
+      self.addScalar(value)
+
+  def addScalar(self, value) -> None:
+    if value is None:
+      return
+    value_type = jsonFieldType(value)
+    if self.type is None or self.type == value_type:
+      self.type = value_type
+    elif {self.type, value_type} == {'INTEGER', 'FLOAT'}:
+      self.type = 'FLOAT'
+    else:
+      # conflicting types, the values are kept as they are
+      self.type = 'STRING'
+    if value_type == 'RECORD':
+      addObject(self.fields, value)
+
+  def toField(self, name: str) -> Dict:
+    type_name = self.type if self.type is not None else 'STRING'
+    f = dict(name=name, type=getattr(field.FieldType, type_name), mode='REPEATED' if self.repeated else 'NULLABLE')
+    if type_name == 'RECORD':
+      f['fields'] = [inference.toField(sub_name) for sub_name, inference in self.fields.items()]
+    return f
+
+def addObject(inferences: Dict[str, FieldInference], obj: Dict) -> None:
+  for name, value in obj.items():
+    inference = inferences.get(name)
+    if inference is None:
+      inference = inferences[name] = FieldInference()
+    inference.add(value)
+
+def inferFields(objects: List[Dict]) -> List[Dict]:
+  """
+  Infers the fields from the sample objects, in the order of their first appearance.
+  The fields never appearing in the sample are not in the schema.
+  A field without any non-null value in the sample is a STRING field.
+  """
+  inferences: Dict[str, FieldInference] = dict()
+  for obj in objects:
+    ERROR_IF_FALSE(isinstance(obj, dict), "Each line must be a JSON object ({} received)".format(type(obj).__name__))
+    addObject(inferences, obj)
+  return [inference.toField(name) for name, inference in inferences.items()]
+
+def projectFields(fields: List[Dict], paths: List[List[str]]) -> List[Dict]:
+  """Returns the fields (in the order of 'fields') restricted to the given paths, each as a list of names"""
+  projected = []
+  for f in fields:
+    sub_paths = [path[1:] for path in paths if path[0] == f['name']]
+    if len(sub_paths) == 0:
+      continue
+    if any(len(sub_path) == 0 for sub_path in sub_paths):
+      # the whole field is requested
+      projected.append(f)
+      continue
+    ERROR_IF_FALSE(
+      f['type'].name == 'RECORD',
+      "Path '{}.{}' not found, '{}' is not a record".format(f['name'], '.'.join(sub_paths[0]), f['name'])
+    )
+    projected.append(dict(f, fields=projectFields(f['fields'], sub_paths)))
+  found = set(f['name'] for f in fields)
+  for path in paths:
+    ERROR_IF_FALSE(path[0] in found, "Path '{}' not found".format('.'.join(path)))
+  return projected
+
+def valueExtractor(f: Dict, full_field: Dict) -> typing.Callable:
+  """
+  Returns the function extracting the value of the (projected) field 'f' from the parsed value of the full field,
+    or None if the value is kept as parsed, i.e., the whole field is requested.
+  """
+  if f is full_field:
+    return None
+  full_sub_fields = {sub_f['name']: sub_f for sub_f in full_field['fields']}
+  sub_extractors = [
+    (sub_f['name'], valueExtractor(sub_f, full_sub_fields[sub_f['name']]))
+    for sub_f in f['fields']
+  ]
+
+  def extract_record(obj):
+    if not isinstance(obj, dict):
+      return None
+    return {
+      name: obj.get(name) if extract is None else extract(obj.get(name))
+      for name, extract in sub_extractors
+    }
+
+  if f['mode'] != 'REPEATED':
+    return extract_record
+
+  def extract_records(objs):
+    if not isinstance(objs, list):
+      return None
+    return [extract_record(obj) for obj in objs]
+  return extract_records
@@ -0,0 +1,553 @@
+import typing
+from functools import partial
+from itertools import chain, compress
+
+import numpy as np
+
+from dbsim import Table
+from ..planners.cost.cardinality import (
+  DEFAULT_EQ_SELECTIVITY, DEFAULT_RANGE_SELECTIVITY, column_range_selectivity, equality_selectivity
+)
+from ..statistics import TableStatistics, isOrderableField
+from ..storage.bitmap import Bitmap, predicateBitmap, predicateFraction
+from ..storage.dictionary import Dictionary
+from ..storage.index import Index, IndexType, INDEX_TYPES
+from ..storage.ranges import ColumnRange, columnRanges
+from ..storage.similarity_cache import SimilarityCache, toleratedRadius
+from ..storage.vector_index import VectorIndex, similarityRanges, nearestNeighbourQuery
+from ..storage.vector_store import VectorStore
+from ..storage.zone_map import ZoneMap
+from ..utils import *
+
+class MemoryTable(Table):
+  """
+  Base class of the tables held in memory (see DictTable and DataFrameTable).
+
+  Besides the rows, the table maintains the statistics and the zone map of its columns,
+    and the secondary indexes created on them (see MemoryTable.create_index),
+    so that scans with a selection predicate only read the rows that may satisfy it
+    (see MemoryTable.filtered_scan).
+
+  The results of the similarity range searches are cached by query vector (see storage.similarity_cache),
+    so repeating a search with the same query vector and another radius computes few distances, if any.
+
+  String columns with few distinct values relative to the number of rows are dictionary-encoded
+    (see storage.dictionary), where the rows share the string objects of the dictionary,
+    and the dictionary answers equality predicates on the column like a hash index.
+
+  Rows can be appended in batches (see MemoryTable.append), 
+    which incrementally maintains the statistics, the zone map and the indexes,
+    and increments 'version' so that the caches derived from the rows can tell they are stale.
+
+  Subclasses implement 'column', 'scan_range', 'rows_at', 'size' and '_append_rows' over their own storage,
+    and call 'build_access_structures' once the storage is set up.
+  """
+  dictionary_max_size = 1 << 16
+  """Maximum number of distinct values of a dictionary-encoded column"""
+  dictionary_max_distinct_ratio = 0.5
+  """Maximum ratio of distinct values to non-null values of a dictionary-encoded column"""
+  vector_search_cost_ratio = 0.1
+  """
+  Cost of computing the distance to a vector in a vector search (over contiguous vectors) 
+    relative to the cost of reading a row and evaluating a predicate on it, used to plan the scans
+  """
+  evaluates_ranges = False
+  """True if the table evaluates the column ranges directly on its storage (see _range_row_ids)"""
+  knn_overfetch_factor = 1.5
+  """Factor of the number of rows fetched by the post-filtering k-NN searches over the expected number (see filtered_nearest_scan)"""
+
+  def __init__(self, adapter, name, schema, block_size: int = None):
+    super(MemoryTable, self).__init__(adapter, name, schema)
+    self.key_index = [
+      (f.name, () if f.mode == 'REPEATED' else None)
+      for f in self.schema.fields
+    ]
+    self.block_size = block_size or ZoneMap.default_block_size
+    """Number of rows summarized by each entry of the zone map"""
+    self._statistics: TableStatistics = None
+    self._zone_map: ZoneMap = None
+    self._indexes: typing.Dict[str, typing.Dict[IndexType, Index]] = dict()
+    """column name -> index type -> index"""
+    self._dictionaries: typing.Dict[str, Dictionary] = dict()
+    """column name -> dictionary of the encoded column"""
+    self.version = 0
+    """Number of batches appended to the table"""
+    self.similarity_cache = SimilarityCache()
+    """Cache of the results of the similarity range searches (see _similarity_row_ids)"""
+
+  def build_access_structures(self) -> None:
+    columns = [self.column(f.name) for f in self.schema.fields]
+    self._statistics = TableStatistics.fromColumns(self.schema, columns)
+    self._zone_map = ZoneMap.fromColumns(self.schema, columns, self.block_size)
+    self._dictionaries = dict()
+    for f, values in zip(self.schema.fields, columns):
+      if self._should_encode(f):
+        try:
+          self._dictionaries[f.name] = Dictionary(f.name, values)
+        except TypeError:
+          # unhashable values
+          continue
+
+  def _should_encode(self, f) -> bool:
+    if f.mode == 'REPEATED' or (f.type.name if hasattr(f.type, 'name') else str(f.type)) != 'STRING':
+      return False
+    column_stats = self._statistics[f.name]
+    num_distinct = column_stats.distinct_count
+    return (
+      num_distinct is not None and column_stats.count > 0
+      and num_distinct <= self.dictionary_max_size
+      and num_distinct <= self.dictionary_max_distinct_ratio * column_stats.count
+    )
+
+  def _update_dictionaries(self, columns: typing.List[typing.Sequence]) -> None:
+    """Encodes the values of the appended rows, given as one sequence per field"""
+    for pos, (name, _) in enumerate(self.key_index):
+      if name in self._dictionaries:
+        self._dictionaries[name].update(columns[pos])
+
+  def column(self, name: str) -> typing.Sequence:
+    """Returns the values of the given column"""
+    raise NotImplementedError
+
+  def scan_range(self, start: int, stop: int) -> typing.Iterator[typing.Tuple]:
+    """Returns a generator of the tuples of rows [start, stop)"""
+    raise NotImplementedError
+
+  def rows_at(self, row_ids: typing.Sequence[int]) -> typing.Iterator[typing.Tuple]:
+    """Returns a generator of the tuples of the given rows"""
+    raise NotImplementedError
+
+  def size(self) -> int:
+    raise NotImplementedError
+
+  def _append_rows(self, rows) -> typing.List[typing.Sequence]:
+    """
+    Appends the rows to the storage and returns their values as one sequence per field,
+      where the values of the encoded columns are added to their dictionaries (see _update_dictionaries).
+    """
+    raise NotImplementedError
+
+  def append(self, rows) -> int:
+    """
+    Appends a batch of rows to the table and returns the number of appended rows.
+
+    The statistics, the zone map, the indexes and the dictionaries are updated with the new rows only,
+      instead of being rebuilt from the whole table.
+
+    Parameters
+    ------------
+    rows: the rows to append, in the same format as the rows the table was created with
+    """
+    columns = self._append_rows(rows)
+    num_new_rows = len(columns[0]) if len(columns) > 0 else 0
+    if num_new_rows == 0:
+      return 0
+    self._statistics.update(columns)
+    self._zone_map.update(columns)
+    positions = {name: pos for pos, (name, _) in enumerate(self.key_index)}
+    for column_name, indexes in self._indexes.items():
+      for index in indexes.values():
+        index.update(columns[positions[column_name]])
+    self.version += 1
+    return num_new_rows
+
+  def statistics(self) -> TableStatistics:
+    return self._statistics
+
+  def zone_map(self) -> ZoneMap:
+    return self._zone_map
+
+  def dictionary(self, column_name: str) -> Dictionary:
+    """Returns the dictionary of the column, or None if the column is not dictionary-encoded"""
+    return self._dictionaries.get(column_name)
+
+  def create_index(self, column_name: str, index_type: IndexType = IndexType.SORTED, **params) -> Index:
+    """
+    Builds (or rebuilds) an index of the given type over the column and returns it, 
+      where 'params' are passed to the index, e.g., 'nprobe' of a vector index (see storage.vector_index).
+    """
+    f = self.schema.get_field(column_name)
+    index_class = INDEX_TYPES[index_type]
+    if issubclass(index_class, VectorIndex):
+      is_indexable = f.mode != 'REPEATED' and (f.type.name if hasattr(f.type, 'name') else str(f.type)) == 'VECTOR'
+    else:
+      is_indexable = isOrderableField(f)
+    ERROR_IF_FALSE(
+      is_indexable,
+      "cannot create {} index on column '{}' of type {}{}"\
+        .format(index_type.name, column_name, f.type, ' (repeated)' if f.mode == 'REPEATED' else '')
+    )
+    store = self.vector_store(f.name) if issubclass(index_class, VectorIndex) else None
+    # the vectors are indexed from their contiguous storage if any
+    index = index_class(f.name, store if store is not None else self.column(f.name), **params)
+    self._indexes.setdefault(f.name, dict())[index_type] = index
+    return index
+
+  def drop_index(self, column_name: str, index_type: IndexType = None) -> None:
+    """Drops the index of the given type (or all the indexes if no type given) over the column"""
+    if index_type is None:
+      self._indexes.pop(column_name, None)
+    else:
+      self._indexes.get(column_name, dict()).pop(index_type, None)
+
+  def indexes(self, column_name: str) -> typing.List[Index]:
+    return list(self._indexes.get(column_name, dict()).values())
+
+  def vector_index(self, column_name: str) -> VectorIndex:
+    """Returns a vector index over the column, or None if the column has no vector index"""
+    for index in self.indexes(column_name):
+      if isinstance(index, VectorIndex):
+        return index
+    return None
+
+  def vector_store(self, column_name: str) -> VectorStore:
+    """
+    Returns the contiguous storage of the vectors of the column (see storage.vector_store), 
+      or None if the table does not store the column that way.
+    """
+    return None
+
+  def index_lookup(self, column_name: str) -> typing.Callable:
+    """
+    Returns a function looking up the rows (as tuples) whose column equals a given value
+      by an index over the column (or its dictionary), or None if the column is not indexed.
+    """
+    indexes = self._indexes.get(column_name, dict())
+    # hash index and dictionary are preferred for equality lookups
+    index = (
+      indexes.get(IndexType.HASH) or self._dictionaries.get(column_name)
+      or indexes.get(IndexType.SORTED) or indexes.get(IndexType.BITMAP)
+    )
+    if index is None:
+      return None
+
+    def lookup(value):
+      if value is None:
+        return []
+      try:
+        row_ids = index.lookupValue(value)
+      except TypeError:
+        # not comparable with the indexed values
+        return []
+      return list(self.rows_at(row_ids))
+
+    return lookup
+
+  def similarity_lookup(self, column_name: str) -> typing.Callable:
+    """
+    Returns a function searching the rows (as tuples) by the vector index over the column, 
+      or None if the column has no vector index:
+      given (vector, radius, k), the rows within distance 'radius' of the vector (a superset of them) if k is None,
+      otherwise the (approximate) k nearest rows ordered by their distances.
+    """
+    index = self.vector_index(column_name)
+    if index is None:
+      return None
+
+    def lookup(vector, radius, k):
+      if vector is None:
+        return []
+      row_ids = index.rangeSearch(vector, radius) if k is None else index.knnSearch(vector, k)[0]
+      return list(self.rows_at(row_ids))
+
+    return lookup
+
+  def filtered_scan(self, bool_op) -> typing.Callable:
+    """
+    Returns the records function (ctx -> rows) scanning only the rows that may satisfy 'bool_op',
+      or None if all the rows have to be scanned.
+    The returned rows are a superset of the rows satisfying 'bool_op',
+      so the predicate still has to be applied to them.
+
+    The rows are located by the zone map, by looking up one of the indexes
+      (or the dictionaries of the encoded columns), by evaluating the predicate on the bitmap indexes,
+      by evaluating the column ranges on the storage (see _range_row_ids),
+      or by searching a vector index for the similarity predicates (see _similarity_row_ids), 
+      whichever reads fewer rows.
+    The similarity predicates are planned last: when the attribute predicates already narrow the scan
+      to fewer rows than a vector search would compute distances for,
+      the distances are only computed for those rows (pre-filtering),
+      otherwise the rows found by the vector search are filtered by the attribute predicates (post-filtering).
+    """
+    scan_plan = self._scan_plan(bool_op)
+    if scan_plan is None:
+      return None
+    row_ids, row_ranges = scan_plan
+
+    if row_ids is not None:
+      def index_scan(ctx):
+        return self.rows_at(row_ids)
+      return index_scan
+
+    if row_ranges == [(0, self.size())]:
+      return None
+
+    def zone_map_scan(ctx):
+      return chain.from_iterable(self.scan_range(start, stop) for start, stop in row_ranges)
+
+    return zone_map_scan
+
+  def estimated_scanned_rows(self, bool_op) -> float:
+    """
+    Estimates the number of rows read by the scan of filtered_scan(bool_op) without running its access paths,
+      so that the scans can be planned when the query is compiled (see filtered_nearest_scan).
+
+    The zone map returns the rows of the blocks that may satisfy the column ranges from the bounds of the blocks,
+      while the rows returned by the indexes (and the dictionaries), the bitmap indexes, the storage and the vector searches 
+      are estimated from the column statistics, i.e., the selectivity of the predicates they evaluate times the number of rows.
+    """
+    ranges = columnRanges(bool_op, self.schema)
+    bitmap_fraction = predicateFraction(bool_op, self.schema, self._bitmap_fraction_of) if bool_op is not None else None
+    similarity_ranges = similarityRanges(bool_op, self.schema)
+    num_rows = self.size()
+    if len(ranges) == 0 and bitmap_fraction is None and len(similarity_ranges) == 0:
+      return float(num_rows)
+    num_scanned_rows = float(sum(stop - start for start, stop in self._zone_map.candidateRowRanges(ranges)))
+    range_fractions = {pos: self._range_fraction(pos, column_range) for pos, column_range in ranges.items()}
+    for pos, column_range in ranges.items():
+      if any(index.supports(column_range) for index in self._range_indexes(self.schema.fields[pos].name)):
+        num_scanned_rows = min(num_scanned_rows, range_fractions[pos] * num_rows)
+    if bitmap_fraction is not None:
+      num_scanned_rows = min(num_scanned_rows, bitmap_fraction * num_rows)
+    if len(ranges) > 0 and self.evaluates_ranges:
+      num_scanned_rows = min(num_scanned_rows, float(np.prod(list(range_fractions.values()))) * num_rows)
+    for pos, query, radius in similarity_ranges:
+      name = self.schema.fields[pos].name
+      index = self.vector_index(name)
+      if index is None:
+        index = self.vector_store(name)
+      if index is None or (
+        not self.similarity_cache.covers(name, query, radius, num_rows)
+        and index.rangeSearchCost(query, radius) * self.vector_search_cost_ratio >= num_scanned_rows
+      ):
+        continue
+      num_scanned_rows = min(num_scanned_rows, self._distance_fraction(name, query, radius) * num_rows)
+    return num_scanned_rows
+
+  def _scan_plan(self, bool_op) -> typing.Tuple[np.ndarray, typing.List[typing.Tuple[int, int]]]:
+    """
+    Returns (the ids of the rows to read, or None to read the row ranges, the row ranges of the zone map) 
+      for filtered_scan, or None if there is no predicate the scan can use.
+    """
+    ranges = columnRanges(bool_op, self.schema)
+    bitmap = predicateBitmap(bool_op, self.schema, self._bitmap_of) if bool_op is not None else None
+    similarity_ranges = similarityRanges(bool_op, self.schema)
+    if len(ranges) == 0 and bitmap is None and len(similarity_ranges) == 0:
+      return None
+    row_ranges = self._zone_map.candidateRowRanges(ranges)
+    num_scanned_rows = sum(stop - start for start, stop in row_ranges)
+    row_ids = self._index_row_ids(ranges, num_scanned_rows)
+    if bitmap is not None and bitmap.count() < (len(row_ids) if row_ids is not None else num_scanned_rows):
+      row_ids = bitmap.rowIds()
+    if len(ranges) > 0:
+      range_row_ids = self._range_row_ids(ranges, self._zone_map.candidateBlocks(ranges))
+      if range_row_ids is not None and len(range_row_ids) < (len(row_ids) if row_ids is not None else num_scanned_rows):
+        row_ids = range_row_ids
+    similarity_row_ids = self._similarity_row_ids(bool_op, len(row_ids) if row_ids is not None else num_scanned_rows)
+    if similarity_row_ids is not None and len(similarity_row_ids) < (len(row_ids) if row_ids is not None else num_scanned_rows):
+      row_ids = similarity_row_ids
+    return row_ids, row_ranges
+
+  def nearest_scan(self, exprs, k: int) -> typing.Callable:
+    """
+    Returns the records function (ctx -> rows) of the first k rows in the order of the expressions 
+      if they are a k-NN search (see vector_index.nearestNeighbourQuery) over a column with a vector index, 
+      which returns the (approximate) k nearest rows found by the index ordered by their distances, 
+      or over a column in contiguous storage, which is searched exactly (see VectorStore.knnSearch), 
+      or returns None otherwise.
+    When the search returns fewer than k rows, the rows with null vectors follow them in row order,
+      as their distances are sorted last (see local.top_k_op).
+    """
+    knn_query = nearestNeighbourQuery(exprs, self.schema)
+    if knn_query is None:
+      return None
+    pos, query = knn_query
+    name = self.schema.fields[pos].name
+    index = self.vector_index(name)
+    if index is None:
+      index = self.vector_store(name)
+    if index is None:
+      return None
+
+    def knn_scan(ctx):
+      row_ids, _ = index.knnSearch(query, k)
+      if len(row_ids) < k:
+        row_ids = np.concatenate([row_ids, self._null_vector_row_ids(name)[:k - len(row_ids)]])
+      return self.rows_at(row_ids)
+
+    return knn_scan
+
+  def filtered_nearest_scan(self, bool_op, predicate: typing.Callable, exprs, k: int, selectivity: float) -> typing.Callable:
+    """
+    Returns the records function (ctx -> rows) of the rows satisfying 'bool_op' 
+      among which the first k rows in the order of the expressions are searched, 
+      when they are a k-NN search (see vector_index.nearestNeighbourQuery) over a column with a vector index
+      and post-filtering is estimated to be cheaper than pre-filtering, otherwise returns None.
+
+    Pre-filtering reads the rows that may satisfy 'bool_op' (see filtered_scan) and computes the distances
+      of those satisfying it, which is cheap for selective predicates or ones with a selective access path.
+    Post-filtering searches the vector index for the k / selectivity nearest rows (times knn_overfetch_factor)
+      and keeps the rows satisfying 'bool_op', which only reads a few rows for unselective predicates.
+    When fewer than k of the fetched rows satisfy 'bool_op', the search is repeated for twice as many rows,
+      and falls back to pre-filtering if the index cannot return more rows.
+
+    Parameters
+    ------------
+    predicate: the function ((rows, ctx) -> booleans) evaluating 'bool_op' on a list of rows
+    selectivity: the estimated fraction of the rows satisfying 'bool_op'
+    """
+    knn_query = nearestNeighbourQuery(exprs, self.schema)
+    if knn_query is None or k <= 0:
+      return None
+    pos, query = knn_query
+    index = self.vector_index(self.schema.fields[pos].name)
+    if index is None:
+      return None
+    num_rows = self.size()
+    num_fetched = min(int(np.ceil(k / max(selectivity, 1.0 / max(num_rows, 1)) * self.knn_overfetch_factor)), num_rows)
+    pre_filter_cost = self.estimated_scanned_rows(bool_op) + selectivity * num_rows * self.vector_search_cost_ratio
+    post_filter_cost = index.knnSearchCost(num_fetched) * self.vector_search_cost_ratio + num_fetched
+    if post_filter_cost >= pre_filter_cost:
+      return None
+
+    def post_filter_scan(ctx):
+      fetched = num_fetched
+      while True:
+        row_ids, _ = index.knnSearch(query, fetched)
+        rows = list(self.rows_at(row_ids))
+        matched = list(compress(rows, predicate(rows, ctx)))
+        if len(matched) >= k or len(row_ids) >= num_rows:
+          # the rows are ordered by their distances
+          return matched[:k]
+        if len(row_ids) < fetched or fetched >= num_rows:
+          # e.g., the rows with null vectors, which the index does not return
+          break
+        fetched = min(2 * fetched, num_rows)
+      # the index cannot return more rows: pre-filtering
+      scan = self.filtered_scan(bool_op)
+      rows = list(scan(ctx) if scan is not None else self.scan_range(0, num_rows))
+      return list(compress(rows, predicate(rows, ctx)))
+
+    return post_filter_scan
+
+  def _similarity_row_ids(self, bool_op, max_num_rows: float = float('Inf')) -> np.ndarray:
+    """
+    Returns the ids of the rows found by the vector index (or the contiguous storage of the vectors) 
+      returning the fewest rows for the similarity predicates like 'column TO vector < r' in the conjuncts of 'bool_op', 
+      or None if no such predicate is over a column with a vector index or in contiguous storage.
+    The searches estimated to compute the distances of at least 'max_num_rows' vectors are skipped,
+      as it is cheaper to compute the distances of the 'max_num_rows' rows read otherwise,
+      unless they are answered by the cached results (see similarity_cache).
+    """
+    best_row_ids = None
+    num_rows = self.size()
+    for pos, query, radius in similarityRanges(bool_op, self.schema):
+      name = self.schema.fields[pos].name
+      index = self.vector_index(name)
+      if index is None:
+        index = self.vector_store(name)
+      if index is None or (
+        not self.similarity_cache.covers(name, query, radius, num_rows)
+        and index.rangeSearchCost(query, radius) * self.vector_search_cost_ratio >= max_num_rows
+      ):
+        continue
+      row_ids = self.similarity_cache.rangeSearch(
+        name, query, radius, num_rows, partial(self._similarity_search, index), partial(self._vector_distances, pos)
+      )
+      if best_row_ids is None or len(row_ids) < len(best_row_ids):
+        best_row_ids = row_ids
+    return best_row_ids
+
+  def _similarity_search(self, index, query: np.ndarray, radius: float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids of the rows found by the range search of the vector index (or the contiguous storage of the vectors),
+      and their distances to the query vector if computed by the search, i.e., over the contiguous storage.
+    """
+    if not isinstance(index, VectorStore):
+      return index.rangeSearch(query, radius), None
+    distances = index.distances(query)
+    row_ids = np.flatnonzero(distances <= toleratedRadius(radius))
+    return row_ids, distances[row_ids]
+
+  def _null_vector_row_ids(self, column_name: str) -> np.ndarray:
+    """Returns the ids (in ascending order) of the rows whose vectors in the column are null"""
+    store = self.vector_store(column_name)
+    if store is not None:
+      return np.flatnonzero(~store.valid)
+    return np.array([i for i, v in enumerate(self.column(column_name)) if v is None], dtype=np.int64)
+
+  def _vector_distances(self, pos: int, query: np.ndarray, row_ids: np.ndarray) -> np.ndarray:
+    """Returns the Euclidean distances between the query vector and the vectors of the rows (NaN for the null vectors)"""
+    store = self.vector_store(self.schema.fields[pos].name)
+    if store is not None:
+      vectors, valid = store.vectors(row_ids), store.valid[row_ids]
+    else:
+      values = [row[pos] for row in self.rows_at(row_ids)]
+      valid = np.array([v is not None for v in values], dtype=bool)
+      vectors = np.zeros((len(values), len(query)))
+      for i in np.flatnonzero(valid).tolist():
+        vectors[i] = values[i]
+    diff = vectors.astype(np.float64) - query
+    distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    distances[~valid] = np.nan
+    return distances
+
+  def _range_row_ids(self, ranges: typing.Dict[int, ColumnRange], blocks: typing.List[int]) -> np.ndarray:
+    """
+    Returns the ids of the rows in the given blocks (of the zone map) within all the column ranges,
+      if the table can evaluate the ranges directly on its storage, otherwise returns None.
+    """
+    return None
+
+  def _range_fraction(self, pos: int, column_range: ColumnRange) -> float:
+    """Estimates the fraction of the rows whose column (by field position) is within the range from the column statistics"""
+    try:
+      return column_range_selectivity(self._statistics[self.schema.fields[pos].name], column_range)
+    except TypeError:
+      # the constants in the predicate are not comparable with the column values
+      return DEFAULT_RANGE_SELECTIVITY
+
+  def _distance_fraction(self, column_name: str, query: np.ndarray, radius: float) -> float:
+    """Estimates the fraction of the rows whose vectors are within the radius of the query vector from the column statistics"""
+    stats = self._statistics[column_name]
+    if stats.distance_distribution is None:
+      return DEFAULT_RANGE_SELECTIVITY
+    return (1.0 - stats.null_fraction()) * stats.distance_distribution.fraction(radius, query)
+
+  def _bitmap_fraction_of(self, pos: int, value) -> float:
+    """Estimates the fraction of the rows whose column (by field position) equals the value, or None if not bitmap-indexed"""
+    name = self.schema.fields[pos].name
+    if IndexType.BITMAP not in self._indexes.get(name, dict()):
+      return None
+    try:
+      return equality_selectivity(self._statistics[name], value)
+    except TypeError:
+      return DEFAULT_EQ_SELECTIVITY
+
+  def _bitmap_of(self, pos: int, value) -> Bitmap:
+    """Returns the bitmap of the rows whose column (by field position) equals the value, or None if not bitmap-indexed"""
+    index = self._indexes.get(self.schema.fields[pos].name, dict()).get(IndexType.BITMAP)
+    return index.bitmap(value) if index is not None else None
+
+  def _range_indexes(self, column_name: str) -> typing.List:
+    """Returns the indexes of the column, and its dictionary if the column is dictionary-encoded"""
+    dictionary = self._dictionaries.get(column_name)
+    return self.indexes(column_name) + ([dictionary] if dictionary is not None else [])
+
+  def _index_row_ids(self, ranges: typing.Dict[int, ColumnRange], max_num_rows: int) -> np.ndarray:
+    """
+    Returns the ids of the rows within the ranges found by the index returning the fewest rows,
+      or None if no index applies or every index returns at least 'max_num_rows' rows.
+    """
+    best_row_ids = None
+    for pos, column_range in ranges.items():
+      for index in self._range_indexes(self.schema.fields[pos].name):
+        if not index.supports(column_range):
+          continue
+        try:
+          row_ids = index.lookup(column_range)
+        except TypeError:
+          continue
+        if len(row_ids) < max_num_rows:
+          best_row_ids, max_num_rows = row_ids, len(row_ids)
+    return best_row_ids
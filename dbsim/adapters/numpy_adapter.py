@@ -0,0 +1,200 @@
+import os
+import json
+import typing
+from typing import Dict
+
+import numpy as np
+
+from dbsim import Table
+from . import Adapter
+from .. import field
+from ..utils import *
+from ..statistics import TableStatistics
+
+class NumpyAdapter(Adapter):
+  """
+  An adapter for working with memory-mapped NumPy columnar tables.
+
+  Each table is a directory holding one '.npy' file per column
+    and a schema file (see NumpyAdapter.schema_filename).
+  The column files are opened with 'mmap_mode = "r"',
+    so loading a table costs almost nothing,
+    the pages of a table are shared (read-only) by all the processes scanning it,
+    and the tables can be larger than the memory.
+
+  Vector columns are stored as one 2-D float32 array of shape (num_rows, dim).
+  """
+  schema_filename = 'schema.json'
+  column_file_ext = '.npy'
+
+  def __init__(self, **tables):
+    """
+
+    Examples:
+    NumpyAdapter(
+      users='/path/to/users',
+      other='/path/to/other'
+    )
+
+    where each path is a directory written by NumpyAdapter.writeTable.
+    """
+    self._tables = {}
+
+    for name, dirpath in tables.items():
+      ERROR_IF_FALSE(
+        os.path.isdir(dirpath),
+        "Invalid table setup for '{}', '{}' is not a directory".format(name, dirpath)
+      )
+      self._tables[name] = NumpyTable(
+        self,
+        name,
+        dirpath=dirpath
+      )
+
+  @classmethod
+  def fromDirectory(cls, dirpath: str) -> 'NumpyAdapter':
+    """
+    Loads every sub-directory of 'dirpath' that contains a schema file as a table,
+      where the table name is the name of the sub-directory.
+    """
+    tables = dict()
+    for table_name in sorted(os.listdir(dirpath)):
+      table_dirpath = os.path.join(dirpath, table_name)
+      if os.path.isfile(os.path.join(table_dirpath, cls.schema_filename)):
+        tables[table_name] = table_dirpath
+    return cls(**tables)
+
+  @classmethod
+  def writeTable(cls, dirpath: str, schema: Dict, columns: Dict[str, typing.Any]) -> None:
+    """
+    Writes a table into 'dirpath' in the layout read by NumpyAdapter.
+
+    Parameters
+    ------------
+    dirpath: the table directory, created if not existing
+    schema: the schema of the table as a dict, like dict(fields = [dict(name = ..., type = ...), ...])
+    columns: dict(column_name -> values), where the values of a vector column
+              can be either a 2-D array or a sequence of 1-D arrays with the same size.
+    """
+    os.makedirs(dirpath, exist_ok=True)
+    num_rows = None
+    fields = []
+    for f in schema['fields']:
+      f = f if isinstance(f, field.Field) else field.Field(**f)
+      ERROR_IF_FALSE(
+        f.mode != 'REPEATED' and fieldTypeName(f.type) != 'RECORD',
+        "NumpyAdapter does not support repeated or record field '{}'".format(f.name)
+      )
+      ERROR_IF_FALSE(f.name in columns, "no values given for column '{}'".format(f.name))
+      values = toColumnArray(f, columns[f.name])
+      if num_rows is None:
+        num_rows = len(values)
+      ERROR_IF_FALSE(
+        len(values) == num_rows,
+        "column '{}' has {} values while the previous columns have {}".format(f.name, len(values), num_rows)
+      )
+      np.save(os.path.join(dirpath, f.name + cls.column_file_ext), values)
+      fields.append(dict(name=f.name, type=fieldTypeName(f.type), mode=f.mode))
+    with open(os.path.join(dirpath, cls.schema_filename), 'w') as schema_file:
+      json.dump(dict(fields=fields), schema_file)
+
+  @property
+  def relations(self):
+    return [
+      (name, table.schema)
+      for name, table in self._tables.items()
+    ]
+
+  def has(self, relation):
+    return relation in self._tables
+
+  def schema(self, relation):
+    return self._tables[relation].schema
+
+  def get_relation(self, name):
+    return self._tables.get(name)
+
+  def table_scan(self, name, ctx):
+    return self._tables[name]
+
+  def statistics(self, relation):
+    return self._tables[relation].statistics()
+
+
+class NumpyTable(Table):
+  block_size = 4096
+  """Number of rows converted from the column files into tuples at a time"""
+
+  def __init__(self, adapter, name, dirpath):
+    with open(os.path.join(dirpath, NumpyAdapter.schema_filename)) as schema_file:
+      schema = json.load(schema_file)
+    for f in schema['fields']:
+      # the schema file stores the name of the field type
+      f['type'] = getattr(field.FieldType, f['type'])
+    super(self.__class__, self).__init__(adapter, name, schema)
+    self.dirpath = dirpath
+    self._columns = [
+      np.load(os.path.join(dirpath, f.name + NumpyAdapter.column_file_ext), mmap_mode='r')
+      for f in self.schema.fields
+    ]
+    self._is_vector = [isVectorField(f) for f in self.schema.fields]
+    self._statistics = None
+
+  def __iter__(self):
+    return self.scan_range(0, self.size())
+
+  def scan_range(self, start: int, stop: int):
+    """Returns a generator of the tuples of rows [start, stop)"""
+    for block_start in range(start, stop, self.block_size):
+      block_stop = min(block_start + self.block_size, stop)
+      values = [
+        # vectors are yielded as read-only views over the memory-mapped matrix,
+        # while scalars are converted into Python objects
+        list(column[block_start:block_stop]) if is_vector else column[block_start:block_stop].tolist()
+        for column, is_vector in zip(self._columns, self._is_vector)
+      ]
+      for row in zip(*values):
+        yield row
+
+  def column(self, name: str) -> np.ndarray:
+    return self._columns[self.schema.field_position(name)]
+
+  def statistics(self):
+    # computed on first use (instead of at load time) to keep loading the table cheap
+    if self._statistics is None:
+      self._statistics = TableStatistics(self.schema)
+      for block_start in range(0, self.size(), self.block_size * 16):
+        block_stop = block_start + self.block_size * 16
+        self._statistics.update([column[block_start:block_stop] for column in self._columns])
+    return self._statistics
+
+  def storage(self):
+    return self._columns
+
+  def size(self):
+    return len(self._columns[0]) if self._columns else 0
+
+
+def fieldTypeName(field_type) -> str:
+  return field_type.name if hasattr(field_type, 'name') else str(field_type)
+
+def isVectorField(f: field.Field) -> bool:
+  return fieldTypeName(f.type) == 'VECTOR'
+
+def toColumnArray(f: field.Field, values) -> np.ndarray:
+  type_name = fieldTypeName(f.type)
+  if type_name == 'VECTOR':
+    if not isinstance(values, np.ndarray) or values.dtype == object:
+      values = np.stack([np.asarray(v) for v in values])
+    matrix = np.ascontiguousarray(values, dtype=np.float32)
+    ERROR_IF_FALSE(matrix.ndim == 2, "vector column '{}' must be 2-D ({}-D received)".format(f.name, matrix.ndim))
+    return matrix
+  if type_name == 'STRING':
+    return np.asarray(values, dtype=str)
+  if type_name == 'DATE':
+    return np.asarray(values, dtype='datetime64[D]')
+  if type_name == 'DATETIME':
+    return np.asarray(values, dtype='datetime64[us]')
+  values = np.asarray(values)
+  ERROR_IF_FALSE(values.dtype != object, "column '{}' cannot be stored as a non-object NumPy array".format(f.name))
+  return values
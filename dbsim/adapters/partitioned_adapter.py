@@ -0,0 +1,252 @@
+import os
+import typing
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+
+from dbsim import Table
+from . import Adapter
+from .. import field
+from ..ast import *
+from ..storage.bitmap import constantValue
+from ..storage.ranges import conjuncts, comparedColumn, RANGE_COMPARISONS
+from ..utils import *
+
+class PartitionedAdapter(Adapter):
+  """
+  An adapter for working with Hive-style partitioned directories,
+    where each directory tree is loaded as one table, e.g.,
+
+    events/
+      date=2026-10-01/region=eu/part-0.csv
+      date=2026-10-01/region=us/part-0.csv
+      date=2026-10-02/region=eu/part-0.csv
+      ...
+
+  is the table 'events' whose columns are the columns of the files followed by
+    the partition columns 'date' and 'region', whose values are parsed from the directory names.
+
+  Selections on the partition columns prune the partitions before any file is opened
+    (see PartitionedAdapter.filtered_scan), and the files of the remaining partitions are read in parallel.
+  """
+  def __init__(self, **tables):
+    """
+
+    Examples:
+    PartitionedAdapter(
+      events='/path/to/events',
+      other=dict(
+        dirpath='/path/to/other',
+        max_workers=8 # optional, number of threads reading the files
+      )
+    )
+    """
+    self._tables = {}
+
+    for name, table in tables.items():
+      table = table if isinstance(table, dict) else dict(dirpath=table)
+      ERROR_IF_FALSE(
+        os.path.isdir(table.get('dirpath', '')),
+        "Invalid table setup for '{}', '{}' is not a directory".format(name, table.get('dirpath'))
+      )
+      self._tables[name] = PartitionedTable(self, name, table['dirpath'], max_workers=table.get('max_workers'))
+
+  @property
+  def relations(self):
+    return [
+      (name, table.schema)
+      for name, table in self._tables.items()
+    ]
+
+  def has(self, relation):
+    return relation in self._tables
+
+  def schema(self, relation):
+    return self._tables[relation].schema
+
+  def get_relation(self, name):
+    return self._tables.get(name)
+
+  def table_scan(self, name, ctx):
+    return self._tables[name]
+
+  def filtered_scan(self, relation, bool_op):
+    table = self._tables.get(relation.name)
+    if table is None or bool_op is None:
+      return None
+    partitions = table.prune(bool_op)
+    if len(partitions) == len(table.partitions):
+      return None
+
+    def partition_scan(ctx):
+      return table.scan_partitions(partitions)
+    return partition_scan
+
+
+class Partition(object):
+  """A leaf directory of a partitioned table, with the values of its partition columns and its data files"""
+  __slots__ = ('values', 'filepaths')
+
+  def __init__(self, values: typing.Tuple, filepaths: List[str]):
+    self.values = values
+    self.filepaths = filepaths
+
+  def __repr__(self):
+    return "Partition({}, {} files)".format(self.values, len(self.filepaths))
+
+
+class PartitionedTable(Table):
+  default_partition_name = '__HIVE_DEFAULT_PARTITION__'
+  """Directory name value of the partitions whose partition column is null"""
+
+  def __init__(self, adapter, name, dirpath, max_workers=None):
+    self.dirpath = dirpath
+    self.max_workers = max_workers
+    self.partition_keys = []
+    raw_partitions = []
+    self._discover(dirpath, [], raw_partitions)
+    ERROR_IF_FALSE(len(raw_partitions) > 0, "No data files found under '{}'".format(dirpath))
+
+    partition_types = [
+      partitionValueType([values[i] for values, _ in raw_partitions])
+      for i in range(len(self.partition_keys))
+    ]
+    self.partitions = [
+      Partition(
+        tuple(parsePartitionValue(value, partition_type) for value, partition_type in zip(values, partition_types)),
+        filepaths
+      )
+      for values, filepaths in raw_partitions
+    ]
+    # the columns of the files are inferred from the first file
+    _, file_fields = self._read_file(self.partitions[0].filepaths[0])
+    ERROR_IF_FALSE(
+      all(f['name'] not in self.partition_keys for f in file_fields),
+      "The files under '{}' contain partition columns".format(dirpath)
+    )
+    self.file_columns = [f['name'] for f in file_fields]
+    fields = file_fields + [
+      dict(name=key, type=partition_type)
+      for key, partition_type in zip(self.partition_keys, partition_types)
+    ]
+    super(PartitionedTable, self).__init__(adapter, name, dict(fields=fields))
+
+  def _discover(self, dirpath: str, values: List[str], partitions: List) -> None:
+    """Collects (the raw partition values, the data files) of every leaf directory under 'dirpath'"""
+    from .adapter_factory import AdapterFactory
+
+    filepaths, subdirs = [], []
+    for entry in sorted(os.listdir(dirpath)):
+      path = os.path.join(dirpath, entry)
+      if os.path.isdir(path):
+        subdirs.append(entry)
+      elif os.path.splitext(entry)[1][1:] in AdapterFactory.supported_filetypes:
+        filepaths.append(path)
+    depth = len(values)
+    if len(filepaths) > 0:
+      ERROR_IF_FALSE(
+        len(subdirs) == 0 and depth == len(self.partition_keys),
+        "Data files found in the non-leaf partition directory '{}'".format(dirpath)
+      )
+      partitions.append((values, filepaths))
+    for subdir in subdirs:
+      ERROR_IF_FALSE('=' in subdir, "Partition directory '{}' is not named like 'key=value'".format(subdir))
+      key, value = subdir.split('=', 1)
+      if depth == len(self.partition_keys):
+        self.partition_keys.append(key)
+      ERROR_IF_FALSE(
+        self.partition_keys[depth] == key,
+        "Partition directory '{}' under '{}' does not match the partition column '{}'"\
+          .format(subdir, dirpath, self.partition_keys[depth])
+      )
+      self._discover(os.path.join(dirpath, subdir), values + [value], partitions)
+
+  def _read_file(self, filepath: str):
+    from .adapter_factory import AdapterFactory
+    return AdapterFactory.readFile(filepath)
+
+  def _read_rows(self, partition: Partition, filepath: str) -> List[tuple]:
+    df, _ = self._read_file(filepath)
+    columns = [
+      df[name].tolist() if name in df.columns else [None] * len(df)
+      for name in self.file_columns
+    ]
+    columns.extend([value] * len(df) for value in partition.values)
+    return list(zip(*columns))
+
+  def prune(self, bool_op: Expr) -> List[Partition]:
+    """Returns the partitions whose partition values may satisfy 'bool_op'"""
+    predicates = partitionPredicates(bool_op, self.schema, len(self.file_columns))
+    return [
+      partition for partition in self.partitions
+      if all(predicate(partition.values) for predicate in predicates)
+    ]
+
+  def scan_partitions(self, partitions: List[Partition]):
+    """Returns a generator of the rows of the given partitions, whose files are read in parallel"""
+    tasks = [(partition, filepath) for partition in partitions for filepath in partition.filepaths]
+    if len(tasks) == 0:
+      return
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      # the files are read in parallel, while the rows are yielded in the order of the files
+      yield from chain.from_iterable(executor.map(lambda task: self._read_rows(*task), tasks))
+
+  def __iter__(self):
+    return self.scan_partitions(self.partitions)
+
+
+def partitionValueType(values: List[str]) -> field.FieldType:
+  """Infers the type of a partition column from its (non-null) values in the directory names"""
+  values = [value for value in values if value != PartitionedTable.default_partition_name]
+  for field_type, parse in [(field.FieldType.INTEGER, int), (field.FieldType.FLOAT, float)]:
+    try:
+      for value in values:
+        parse(value)
+      return field_type
+    except ValueError:
+      continue
+  return field.FieldType.STRING
+
+def parsePartitionValue(value: str, field_type: field.FieldType):
+  if value == PartitionedTable.default_partition_name:
+    return None
+  if field_type.name == 'INTEGER':
+    return int(value)
+  if field_type.name == 'FLOAT':
+    return float(value)
+  return value
+
+def partitionPredicates(bool_op: Expr, schema, first_partition_pos: int) -> List[typing.Callable]:
+  """
+  Returns the predicates (partition values -> bool) implied by the conjuncts of 'bool_op'
+    that compare a partition column (at or after 'first_partition_pos') with constants.
+  A partition not satisfying any of them cannot contain rows satisfying 'bool_op'.
+  """
+  predicates = []
+  for conjunct in conjuncts(bool_op):
+    compared = comparedColumn(conjunct, schema)
+    if compared is not None:
+      pos, op_class, value = compared
+      if pos >= first_partition_pos:
+        predicates.append(partial(rangePredicate, pos - first_partition_pos, RANGE_COMPARISONS[op_class](value)))
+      continue
+    if isinstance(conjunct, InOp) and isinstance(conjunct.lhs, Var) and isinstance(conjunct.rhs, Tuple):
+      try:
+        pos = schema.field_position(conjunct.lhs.path)
+        values = [constantValue(expr) for expr in conjunct.rhs.exprs]
+      except (FieldNotFoundError, AmbigousFieldError, ValueError):
+        continue
+      if pos >= first_partition_pos:
+        predicates.append(partial(inPredicate, pos - first_partition_pos, values))
+  return predicates
+
+def rangePredicate(i, column_range, values) -> bool:
+  try:
+    return column_range.contains(values[i])
+  except TypeError:
+    # not comparable with the constant, so the partition cannot be pruned
+    return True
+
+def inPredicate(i, constants, values) -> bool:
+  return values[i] is not None and values[i] in constants
@@ -0,0 +1,361 @@
+import os
+import sqlite3
+import threading
+import typing
+from typing import List
+
+from dbsim import Table
+from . import Adapter
+from .. import Relation
+from ..ast import *
+from ..field import FieldType
+from ..compilers.join import is_equi_join
+from ..utils import *
+
+class SqliteAdapter(Adapter):
+  """
+  An adapter for working with the tables and views of a local SQLite database file.
+
+  Besides plain table scans, the adapter evaluates whole subtrees of the plan inside SQLite
+    (see SqliteAdapter.push_down), i.e., scans with selections, projections,
+    limits and equi-joins among the tables of the same database
+    are translated into one SQL statement whose results are streamed in batches,
+    so that SQLite's own indexes do the filtering.
+  """
+  batch_size = 1024
+  """Number of rows fetched from SQLite at a time"""
+
+  def __init__(self, filepath: str, batch_size: int = None):
+    ERROR_IF_FALSE(os.path.isfile(filepath), "SQLite database file '{}' not found".format(filepath))
+    self.filepath = filepath
+    if batch_size is not None:
+      self.batch_size = batch_size
+    # per-thread connection pool:
+    #   sqlite3 connections should not be shared across threads,
+    #   so each thread lazily opens and then reuses its own connection.
+    self._local = threading.local()
+    self._connections = []
+    self._connections_lock = threading.Lock()
+    self._tables = {
+      name: SqliteTable(self, name, schema=self._read_schema(name))
+      for name in self._read_table_names()
+    }
+
+  def connection(self) -> sqlite3.Connection:
+    """Returns the connection of the current thread"""
+    connection = getattr(self._local, 'connection', None)
+    if connection is None:
+      connection = sqlite3.connect(
+        'file:{}?mode=ro'.format(self.filepath), uri=True, check_same_thread=False
+      )
+      self._local.connection = connection
+      with self._connections_lock:
+        self._connections.append(connection)
+    return connection
+
+  def close(self) -> None:
+    """Closes the connections opened by all threads"""
+    with self._connections_lock:
+      for connection in self._connections:
+        connection.close()
+      self._connections = []
+    self._local = threading.local()
+
+  def _read_table_names(self) -> List[str]:
+    cursor = self.connection().execute(
+      "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+  def _read_schema(self, name: str) -> typing.Dict:
+    cursor = self.connection().execute("PRAGMA table_info({})".format(quote_identifier(name)))
+    return dict(fields=[
+      dict(name=column_name, type=sqlite_type_to_field_type(declared_type))
+      for _, column_name, declared_type, _, _, _ in cursor.fetchall()
+    ])
+
+  @property
+  def relations(self):
+    return [
+      (name, table.schema)
+      for name, table in self._tables.items()
+    ]
+
+  def has(self, relation):
+    return relation in self._tables
+
+  def schema(self, relation):
+    return self._tables[relation].schema
+
+  def get_relation(self, name):
+    return self._tables.get(name)
+
+  def table_scan(self, name, ctx):
+    return self._tables[name].query()(ctx)
+
+  def evaluate(self, loc):
+    op = loc.node()
+    table = self._tables[op.name]
+    return loc.replace(Relation(self, op.name, table.schema, table.query()))
+
+  def push_down(self, operation):
+    """
+    Translates the given operator, whose children are all Relations from this adapter,
+      into one SQL statement and returns it as a new Relation.
+    Returns None if the operator (or any expression in it) cannot be evaluated by SQLite,
+      in which case the operator is executed by the compiler as usual.
+    """
+    try:
+      query = SQL_OPS[type(operation)](operation)
+    except (KeyError, NotPushable, FieldNotFoundError, AmbigousFieldError):
+      return None
+    return Relation(self, query.sql, operation.schema, query)
+
+
+class SqliteTable(Table):
+  def __init__(self, adapter, name, schema):
+    super(self.__class__, self).__init__(adapter, name, schema)
+
+  def query(self) -> 'SqliteQuery':
+    columns = ', '.join(
+      '{} AS c{}'.format(quote_identifier(f.name), pos)
+      for pos, f in enumerate(self.schema.fields)
+    )
+    return SqliteQuery(
+      self.adapter,
+      'SELECT {} FROM {}'.format(columns, quote_identifier(self.name)),
+      ()
+    )
+
+  def __iter__(self):
+    return self.query()({})
+
+  def size(self):
+    cursor = self.adapter.connection().execute('SELECT COUNT(*) FROM {}'.format(quote_identifier(self.name)))
+    return cursor.fetchone()[0]
+
+
+class SqliteQuery(object):
+  """
+  The records callable of a Relation evaluated by SQLite.
+
+  The i-th output column of the SQL statement is always named 'c<i>',
+    so that the statement can be nested into the statement of the parent operator
+    without worrying about the column names.
+  """
+  __slots__ = ('adapter', 'sql', 'params')
+
+  def __init__(self, adapter: SqliteAdapter, sql: str, params: typing.Tuple):
+    self.adapter = adapter
+    self.sql = sql
+    self.params = tuple(params)
+
+  def __call__(self, ctx):
+    cursor = self.adapter.connection().execute(self.sql, self.params)
+    try:
+      while True:
+        rows = cursor.fetchmany(self.adapter.batch_size)
+        if not rows:
+          break
+        for row in rows:
+          yield row
+    finally:
+      cursor.close()
+
+
+class NotPushable(Exception):
+  """Informational exception raised when an expression cannot be translated into SQL."""
+  pass
+
+def quote_identifier(name: str) -> str:
+  return '"{}"'.format(name.replace('"', '""'))
+
+def sqlite_type_to_field_type(declared_type: str) -> FieldType:
+  """Maps the declared type of a SQLite column to FieldType following SQLite's type affinity rules"""
+  declared_type = (declared_type or '').upper()
+  if 'INT' in declared_type:
+    return FieldType.INTEGER
+  if any(t in declared_type for t in ('CHAR', 'CLOB', 'TEXT')):
+    return FieldType.STRING
+  if 'BOOL' in declared_type:
+    return FieldType.BOOLEAN
+  if any(t in declared_type for t in ('REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL')):
+    return FieldType.FLOAT
+  return FieldType.STRING
+
+def child_query(relation) -> SqliteQuery:
+  if not isinstance(relation, Relation) or not isinstance(relation.records, SqliteQuery):
+    raise NotPushable
+  return relation.records
+
+SQL_BINARY_OPS = {
+  And: 'AND',
+  Or: 'OR',
+  AddOp: '+',
+  SubOp: '-',
+  MulOp: '*',
+}
+
+SQL_COMPARISON_OPS = {
+  LtOp: '<',
+  LeOp: '<=',
+  EqOp: '=',
+  NeOp: '!=',
+  GeOp: '>=',
+  GtOp: '>',
+}
+
+def sql_expr(expr, schema, column_ref, params: list) -> str:
+  """
+  Translates a predicate/value expression into SQL text,
+    appending the values of constants to 'params' in the order they appear in the text.
+
+  The comparisons are false when either side is null, like the compiled comparisons (see local.comparison_op), 
+    instead of SQL's unknown (NULL), so that negating them gives the same rows in SQLite as in the compiler.
+  NOT is only translated over such two-valued predicates (see is_two_valued).
+
+  Parameters
+  ------------
+  column_ref: a function mapping the position of a field in 'schema' to the SQL column reference
+  """
+  if type(expr) in SQL_COMPARISON_OPS:
+    if isinstance(expr.lhs, NullConst) or isinstance(expr.rhs, NullConst):
+      return '0'
+    # the operands are translated in the order they appear in the text, for the order of the parameters
+    guards = [
+      '{} IS NOT NULL'.format(sql_expr(operand, schema, column_ref, params))
+      for operand in (expr.lhs, expr.rhs)
+      if not isinstance(operand, (NumberConst, StringConst))
+    ]
+    lhs = sql_expr(expr.lhs, schema, column_ref, params)
+    rhs = sql_expr(expr.rhs, schema, column_ref, params)
+    return '({})'.format(' AND '.join(guards + ['{} {} {}'.format(lhs, SQL_COMPARISON_OPS[type(expr)], rhs)]))
+  if type(expr) in SQL_BINARY_OPS:
+    lhs = sql_expr(expr.lhs, schema, column_ref, params)
+    rhs = sql_expr(expr.rhs, schema, column_ref, params)
+    return '({} {} {})'.format(lhs, SQL_BINARY_OPS[type(expr)], rhs)
+  if type(expr) == NotOp:
+    if not is_two_valued(expr.expr):
+      # e.g., NOT over a nullable column, which is true for the nulls in the compiler but NULL in SQLite
+      raise NotPushable
+    return '(NOT {})'.format(sql_expr(expr.expr, schema, column_ref, params))
+  if type(expr) == NegOp:
+    return '(-{})'.format(sql_expr(expr.expr, schema, column_ref, params))
+  if type(expr) == Var:
+    return column_ref(schema.field_position(expr.path))
+  if type(expr) in (NumberConst, StringConst):
+    params.append(expr.const)
+    return '?'
+  if type(expr) == TrueConst:
+    return '1'
+  if type(expr) == FalseConst:
+    return '0'
+  if type(expr) == NullConst:
+    return 'NULL'
+  raise NotPushable
+
+def is_two_valued(expr) -> bool:
+  """Returns True if the SQL translation of the predicate (see sql_expr) is never NULL"""
+  if type(expr) in SQL_COMPARISON_OPS or type(expr) in (TrueConst, FalseConst):
+    return True
+  if type(expr) == NotOp:
+    return is_two_valued(expr.expr)
+  if type(expr) in (And, Or):
+    return is_two_valued(expr.lhs) and is_two_valued(expr.rhs)
+  return False
+
+def scan_ref(pos: int) -> str:
+  return 'c{}'.format(pos)
+
+def selection_sql(operation) -> SqliteQuery:
+  child = child_query(operation.relation)
+  params = list(child.params)
+  predicate = sql_expr(operation.bool_op, operation.relation.schema, scan_ref, params)
+  return SqliteQuery(
+    child.adapter,
+    'SELECT * FROM ({}) WHERE {}'.format(child.sql, predicate),
+    params
+  )
+
+def projection_sql(operation) -> SqliteQuery:
+  child = child_query(operation.relation)
+  schema = operation.relation.schema
+  params = []
+  columns = []
+  for expr in operation.exprs:
+    if isinstance(expr, SelectAllExpr):
+      columns.extend(
+        scan_ref(pos)
+        for pos, f in enumerate(schema.fields)
+        if expr.table is None or f.schema_name == expr.table
+      )
+    else:
+      if isinstance(expr, RenameOp):
+        expr = expr.expr
+      columns.append(sql_expr(expr, schema, scan_ref, params))
+  ERROR_IF_FALSE(len(columns) == len(operation.schema.fields), exception_type=NotPushable)
+  return SqliteQuery(
+    child.adapter,
+    'SELECT {} FROM ({})'.format(
+      ', '.join('{} AS c{}'.format(column, pos) for pos, column in enumerate(columns)),
+      child.sql
+    ),
+    params + list(child.params)
+  )
+
+def join_sql(operation) -> SqliteQuery:
+  left, right = child_query(operation.left), child_query(operation.right)
+  if not isinstance(operation.bool_op, TrueConst):
+    # only equi-joins (and cross products) are pushed down
+    if not is_equi_join(operation.left.schema, operation.right.schema, operation.bool_op):
+      raise NotPushable
+  num_left_fields = len(operation.left.schema.fields)
+  num_fields = num_left_fields + len(operation.right.schema.fields)
+
+  def join_ref(pos):
+    if pos < num_left_fields:
+      return 'l.c{}'.format(pos)
+    return 'r.c{}'.format(pos - num_left_fields)
+
+  params = list(left.params) + list(right.params)
+  predicate = sql_expr(operation.bool_op, operation.schema, join_ref, params)
+  return SqliteQuery(
+    left.adapter,
+    'SELECT {} FROM ({}) AS l {} ({}) AS r ON {}'.format(
+      ', '.join('{} AS c{}'.format(join_ref(pos), pos) for pos in range(num_fields)),
+      left.sql,
+      'LEFT JOIN' if isinstance(operation, LeftJoinOp) else 'JOIN',
+      right.sql,
+      predicate
+    ),
+    params
+  )
+
+def alias_sql(operation) -> SqliteQuery:
+  return child_query(operation.relation)
+
+def slice_sql(operation) -> SqliteQuery:
+  child = child_query(operation.relation)
+  start = operation.start or 0
+  # a negative limit means no limit in SQLite
+  stop = -1 if operation.stop is None else operation.stop - start
+  return SqliteQuery(
+    child.adapter,
+    'SELECT * FROM ({}) LIMIT ? OFFSET ?'.format(child.sql),
+    list(child.params) + [stop, start]
+  )
+
+SQL_OPS = {
+  SelectionOp: selection_sql,
+  ProjectionOp: projection_sql,
+  JoinOp: join_sql,
+  LeftJoinOp: join_sql,
+  AliasOp: alias_sql,
+  SliceOp: slice_sql,
+}
+"""
+SQL_OPS stores the mapping: relational operator -> the function translating it into a SqliteQuery.
+
+Note that the keys are matched by the exact type of the operator,
+  e.g., extended operators inheriting SelectionOp (like SimSelectionOp) are not pushed down.
+"""
@@ -742,12 +742,30 @@ class OrderByOp(RelationalOp):
     # OrderByOp's __init__ doesn't match what's defined in __slots__
     # so we have to help it make a copy of this object
     exprs = parts.pop('exprs', self.exprs)
+    parts.setdefault('schema', self.schema)
+    parts.setdefault('cost_factor', self.cost_factor)
     first = exprs[0]
     tail = exprs[1:]
     relation = parts.pop('relation', self.relation)
 
     return self.__class__(relation, first, *tail, **parts)
 
+class TopKOp(OrderByOp):
+  """
+  The first k rows of the relation in the order of the expressions,
+    i.e., an ORDER BY under a LIMIT, which does not need to sort the whole relation.
+  It is only created by the compiler (see compilers.local.bound_order_by),
+    e.g., for the k-nearest-neighbour queries like 'ORDER BY embedding TO [..] LIMIT k'.
+  """
+  __slots__ = ('relation', 'exprs', 'k', 'schema', 'cost_factor', 'num_input_rows')
+  def __init__(self, relation, first, *exprs, **kw):
+    super().__init__(relation, first, *exprs, **kw)
+    self.k = kw.get('k')
+
+  def new(self, **parts):
+    parts.setdefault('k', self.k)
+    return super().new(**parts)
+
 
 class GroupByOp(RelationalOp):
   __slots__ = ('relation','aggregates','exprs','schema', 'cost_factor', 'num_input_rows')
@@ -783,6 +801,8 @@ class SliceOp(RelationalOp):
     # so we have to help it make a copy of this object
     args = parts.pop('start', self.start), parts.pop('stop', self.stop)
     relation = parts.pop('relation', self.relation)
+    parts.setdefault('schema', self.schema)
+    parts.setdefault('cost_factor', self.cost_factor)
  
     return self.__class__(relation, *args, **parts)
 
@@ -792,8 +812,9 @@ def getChildren(node: Expr) -> List[Expr]:
   ERROR_IF_NOT_INSTANCE_OF(node, Expr, 
     "getChildren(node) only accepts an Expr as input ({} received)".format(type(node))
   )
-  if isinstance(node, (LoadOp, Relation, Value)):
-    # LoadOp, Relation and Value nodes all have no children
+  if isinstance(node, (LoadOp, Relation, Value, ParamGetterOp)):
+    # LoadOp, Relation and Value nodes all have no children, 
+    #   neither has ParamGetterOp, whose 'expr' is the position of the parameter
     return []
   if isinstance(node, UnaryOp) and hasattr(node, "expr"):
     return [node.expr]
@@ -0,0 +1,212 @@
+"""
+Batched execution of a parameterized similarity search for many query vectors (see DataSet.execute_batch).
+
+The statement is a similarity search over a single relation whose query vector is a parameter (?<n>):
+  a threshold 'column TO ?n < r' in the selection over the relation,
+  and/or a k-NN ordering 'ORDER BY column TO ?n LIMIT k' right over that selection (or the relation).
+
+Instead of executing the statement once per query vector, which scans the relation each time,
+  the relation is scanned once, the conjuncts of the selection without the parameter are evaluated once,
+  and the distances between the vectors of the remaining rows and all the query vectors
+  are computed by one matrix multiplication per block of rows.
+The rows within the threshold (and among the k nearest ones, ties included) of each query vector are its candidates,
+  over which the statement is then executed with that query vector as usual, so the results are exact.
+Without a threshold, the rows with null vectors are candidates of every query vector as well,
+  since the k-NN ordering sorts their (null) distances last, and other predicates on the distances may hold for them
+  (e.g., 'not (column TO ?n < r)'), like when the statement is executed with each query vector.
+"""
+import typing
+from functools import reduce
+
+import numpy as np
+
+from ..ast import *
+from ..storage.ranges import conjuncts
+from ..storage.vector_index import squaredDistances
+from ..utils import *
+from ..utils.exceptions import *
+from ..operations import walk
+from .join import similarity_condition, vector_matrix
+from . import local
+
+candidate_rows_field_in_ctx = 'batch_candidate_rows'
+max_block_elements = 1 << 22
+"""Maximum number of distances computed at a time, which bounds the size of the temporary matrices"""
+
+def param_vector_column(column, vector, param: int):
+  """Returns the column of 'column TO ?param' (or '?param TO column'), or None for any other operands"""
+  if isinstance(column, ParamGetterOp):
+    column, vector = vector, column
+  if isinstance(column, Var) and isinstance(vector, ParamGetterOp) and vector.expr == param:
+    return column
+  return None
+
+def uses_param(expr, param: int) -> bool:
+  return any(isinstance(node, ParamGetterOp) and node.expr == param for node in traverse(expr))
+
+def relational_chain(plan) -> typing.List[Expr]:
+  """Returns the nodes of a plan from its root down to its single relation, which must not contain any join"""
+  chain = [plan]
+  while not isinstance(chain[-1], Relation):
+    children = getChildren(chain[-1]) if isinstance(chain[-1], RelationalOp) else []
+    ERROR_IF_NOT_EQ(
+      len(children), 1,
+      "batched similarity searches are only supported over a single relation ({} received)".format(getClassNameOfInstance(chain[-1]))
+    )
+    chain.append(children[0])
+  return chain
+
+def compile_batch(query, param: int = 0) -> typing.Callable:
+  """
+  Compiles the parameterized similarity search into the function ((ctx, query vectors) -> list of the result rows of each query vector),
+    where ctx['params'] holds the values of the parameters, whose value at position 'param' is replaced with each query vector.
+  Raises ValueError if the query is not a similarity search over the parameter (see the module docstring).
+  """
+  chain = relational_chain(query.operations)
+  relation = chain[-1]
+  pos = len(chain) - 1
+  selections = []
+  while pos > 0 and isinstance(chain[pos - 1], SelectionOp) and chain[pos - 1].bool_op is not None:
+    pos -= 1
+    selections.append(chain[pos])
+
+  # the conjuncts of the selections: thresholds on the distances to the parameter,
+  #   and those without the parameter, which are evaluated once for all the query vectors
+  columns, radius, k, prefilter = [], None, None, []
+  # whether other conjuncts with the parameter are only applied to the candidates
+  filtered_by_param = False
+  for selection in selections:
+    for conjunct in conjuncts(selection.bool_op):
+      condition = similarity_condition(conjunct)
+      if condition is not None and condition[1] is not None:
+        (x, y), r, _ = condition
+        column = param_vector_column(x, y, param)
+        if column is not None:
+          columns.append(column)
+          radius = r if radius is None else min(radius, r)
+          continue
+      if not uses_param(conjunct, param):
+        prefilter.append(conjunct)
+      else:
+        filtered_by_param = True
+
+  if pos >= 2 and type(chain[pos - 1]) is OrderByOp and isinstance(chain[pos - 2], SliceOp) and chain[pos - 2].stop is not None:
+    exprs = chain[pos - 1].exprs
+    expr = exprs[0].expr if len(exprs) == 1 and isinstance(exprs[0], Asc) else exprs[0]
+    column = param_vector_column(expr.lhs, expr.rhs, param) if len(exprs) == 1 and isInstanceByClassName(expr, 'ToOp') else None
+    if column is not None:
+      columns.append(column)
+      # the k nearest rows within the radius may not satisfy the other conjuncts with the parameter,
+      #   in which case the candidates are all the rows within the radius
+      k = chain[pos - 2].stop if not filtered_by_param else None
+
+  if len(columns) == 0:
+    raise ValueError("the query is not a similarity search over the parameter ?{}".format(param))
+  column_positions = {relation.schema.field_position(column.path) for column in columns}
+  if len(column_positions) != 1:
+    raise ValueError("the similarity searches over the parameter ?{} must be over the same column".format(param))
+  column_pos = column_positions.pop()
+  prefilter = local.value_expr(reduce(And, prefilter), relation.schema, query.dataset) if prefilter else None
+
+  # the statement is executed over the candidate rows of each query vector
+  candidates = Relation(None, relation.name, relation.schema, lambda ctx: ctx[candidate_rows_field_in_ctx])
+  plan = walk(query.operations, lambda loc: loc.replace(candidates) if loc.node() is relation else loc)
+  statement = local.compile(query.__class__(query.dataset, plan, resolve_op_schema=False))
+  store = vector_store_of(relation, column_pos)
+
+  def execute_batch(ctx, vectors):
+    queries = np.asarray(vectors, dtype=np.float64)
+    ERROR_IF_FALSE(queries.ndim == 2, "the query vectors must be given as a (n, dim) matrix or a list of vectors")
+    rows = list(relation(ctx))
+    if prefilter is not None:
+      row_ids = np.array([i for i, row in enumerate(rows) if prefilter(row, ctx)], dtype=np.int64)
+    else:
+      row_ids = np.arange(len(rows))
+    if store is not None and len(store) == len(rows):
+      valid = store.valid[row_ids]
+      row_ids, null_row_ids = row_ids[valid], row_ids[~valid]
+      matrix = store.vectors(row_ids) if len(row_ids) < len(store) else store.matrix
+    else:
+      matrix, positions = vector_matrix([rows[i][column_pos] for i in row_ids])
+      row_ids, null_row_ids = row_ids[positions], np.delete(row_ids, positions)
+    if radius is not None:
+      # the distances to the null vectors are never within the threshold
+      null_row_ids = null_row_ids[:0]
+
+    params = tuple(ctx.get('params', ()))
+    results = []
+    for i, row_positions in enumerate(candidate_row_ids(matrix, queries, radius, k)):
+      query_ctx = dict(ctx)
+      query_ctx['params'] = params[:param] + (queries[i],) + params[param + 1:]
+      candidate_ids = row_ids[row_positions]
+      if len(null_row_ids) > 0:
+        candidate_ids = np.union1d(candidate_ids, null_row_ids)
+      query_ctx[candidate_rows_field_in_ctx] = [rows[j] for j in candidate_ids]
+      results.append(list(statement(query_ctx)))
+    return results
+
+  return execute_batch
+
+def vector_store_of(relation, column_pos: int):
+  """Returns the contiguous storage of the vector column of the relation (see storage.vector_store), or None"""
+  if relation.adapter is None:
+    return None
+  table = relation.adapter.get_relation(relation.name)
+  if table is None or not hasattr(table, 'vector_store'):
+    return None
+  return table.vector_store(relation.schema.fields[column_pos].name)
+
+def candidate_row_ids(matrix: np.ndarray, queries: np.ndarray, radius: float, k: int) -> typing.List[np.ndarray]:
+  """
+  Returns the positions (in ascending order) of the rows of 'matrix' that are candidates of each query vector:
+    the rows within distance 'radius' (if not None) and, if k is not None,
+    within the distance of the k-th nearest of those rows, so the ties and rounding errors are included.
+  The squared distances are computed as |m|^2 - 2 m.q + |q|^2, one matrix multiplication per block of rows.
+  """
+  num_queries = len(queries)
+  if len(matrix) == 0 or matrix.shape[1] == 0:
+    return [np.empty(0, dtype=np.int64)] * num_queries
+  ERROR_IF_NOT_EQ(
+    matrix.shape[1], queries.shape[1],
+    "could not compute the distances between vectors of sizes {} and {}".format(matrix.shape[1], queries.shape[1])
+  )
+  query_norms = np.einsum('ij,ij->i', queries, queries)
+  block_size = max(max_block_elements // max(num_queries, 1), 1)
+  blocks = [
+    (start, np.asarray(matrix[start:start + block_size], dtype=np.float64))
+    for start in range(0, len(matrix), block_size)
+  ]
+
+  def block_distances(block):
+    squared = squaredDistances(block, queries, query_norms)
+    # slack for the rounding errors of the squared distances, as the exact predicates are applied to the candidates
+    tolerance = 1e-9 * (np.einsum('ij,ij->i', block, block)[:, None] + query_norms[None, :]) + 1e-12
+    return squared, tolerance
+
+  bounds = np.full(num_queries, np.inf) if radius is None else np.full(num_queries, max(radius, 0) ** 2)
+  if k is not None:
+    # the squared distance of the k-th nearest row within the radius of each query vector
+    best = np.full((num_queries, 0), np.inf)
+    for start, block in blocks:
+      squared, tolerance = block_distances(block)
+      squared = np.where(squared <= bounds[None, :] + tolerance, squared, np.inf)
+      best = np.concatenate([best, squared.T], axis=1)
+      if best.shape[1] > k:
+        best = np.partition(best, k - 1, axis=1)[:, :k] if k > 0 else best[:, :0]
+    if k == 0:
+      bounds = np.full(num_queries, -np.inf)
+    elif best.shape[1] == k:
+      # with fewer than k rows, all the rows within the radius are candidates
+      bounds = np.minimum(bounds, best.max(axis=1))
+
+  row_positions = [[] for _ in range(num_queries)]
+  for start, block in blocks:
+    squared, tolerance = block_distances(block)
+    query_ids, block_positions = np.nonzero((squared <= bounds[None, :] + tolerance).T)
+    boundaries = np.searchsorted(query_ids, np.arange(num_queries + 1))
+    for i in np.flatnonzero(np.diff(boundaries)).tolist():
+      row_positions[i].append(start + block_positions[boundaries[i]:boundaries[i + 1]])
+  return [
+    np.concatenate(positions) if len(positions) > 0 else np.empty(0, dtype=np.int64)
+    for positions in row_positions
+  ]
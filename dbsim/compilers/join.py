@@ -1,8 +1,15 @@
 from collections import defaultdict
-from functools import partial
+from functools import partial, reduce
 from sys import getsizeof
+import numbers
 
-from ..ast import EqOp, And, Var
+import numpy as np
+
+from ..ast import EqOp, LtOp, LeOp, And, Var, Function, NumberConst
+from ..storage.ranges import conjuncts, MIRRORED_RANGE_COMPARISONS
+from ..storage.vector_index import squaredDistances
+from ..utils import ERROR_IF_NOT_EQ, isInstanceByClassName
+from ..utils.exceptions import SQLSyntaxError
 from .local import var_expr
 
 B=1
@@ -10,6 +17,8 @@ K=1024
 M=K**2
 MAX_SIZE=10*M
 
+KNN_FUNCTION = 'knn'
+
 def record_size(record):
   # size of outer tuple
   sz = getsizeof(record)
@@ -72,6 +81,50 @@ def hash_join(left_join, l_op, r_op, comparison, ctx):
         for r_row in probe.get(left_key(l_row,ctx), default):
           yield l_row + r_row 
 
+def index_nested_loop_join(left_join, lookup, left_key, right_width, left_rows, ctx):
+  """
+  Joins each row of the left relation with the rows of the right relation 
+    found by looking up the index over the right join key.
+
+  Parameters
+  ------------
+  lookup: a function (value -> list of rows of the right relation), see Adapter.index_lookup
+  left_key: a function extracting the (single) join key from a row of the left relation
+  right_width: number of fields of the right relation
+  """
+  if left_join:
+    default = ((None,) * right_width,)
+  else:
+    default = ()
+
+  for l_row in left_rows:
+    r_rows = lookup(left_key(l_row, ctx)[0])
+    for r_row in (r_rows or default):
+      yield l_row + r_row
+
+def right_join_columns(left_schema, right_schema, op):
+  """
+  Returns the names of the fields of the right relation used as the equi-join keys, 
+    in the same order as the keys returned by join_keys.
+  """
+  if isinstance(op, And):
+    return (
+      right_join_columns(left_schema, right_schema, op.lhs)
+      + right_join_columns(left_schema, right_schema, op.rhs)
+    )
+
+  if not (isinstance(op, EqOp) and isinstance(op.lhs, Var) and isinstance(op.rhs, Var)):
+    raise ValueError("Expression is not equijoinable")
+
+  for var in (op.lhs, op.rhs):
+    parts = var.path.split('.')
+    if len(parts) == 1:
+      if not left_schema.field_map.get(parts[0]) and right_schema.field_map.get(parts[0]):
+        return [parts[0]]
+    elif left_schema.name != parts[0] and right_schema.name == parts[0]:
+      return [parts[1]]
+  raise ValueError("Expression is not equijoinable")
+
 def join_keys(left_schema, right_schema, op):
   """
   Given two relations that need to be joined and
@@ -131,24 +184,218 @@ def join_keys_expr(left_schema, right_schema, op):
 
   cols = [None, None]
   for var in (op.lhs, op.rhs):
-    parts = var.path.split('.')
-    if len(parts) == 1:
-      if left_schema.field_map.get(parts[0]):
-        cols[0] = var_expr(var, left_schema, None)
-      elif right_schema.field_map.get(parts[0]):
-        cols[1] =  var_expr(var, right_schema, None)
-      else:
-        raise ValueError('column "{}" does not exist'.format(var.path))
-    else:
-      relation_name = parts[0]
-      if left_schema.name == relation_name:
-        cols[0] = var_expr(Var(parts[1]), left_schema, None)
-      elif right_schema.name == relation_name:
-        cols[1] = var_expr(Var(parts[1]), right_schema, None)
-      else: 
-        raise ValueError('relation "{}" does not exist'.format(parts[0]))
+    side_and_column = join_side(left_schema, right_schema, var)
+    if side_and_column is None:
+      raise ValueError('column "{}" does not exist'.format(var.path))
+    side, column = side_and_column
+    cols[side] = var_expr(column, (left_schema, right_schema)[side], None)
 
   return (cols,)
 
+def is_equi_join(left_schema, right_schema, op):
+  """
+  Returns True if the expression is a conjunction of equalities between a column of each relation, 
+    i.e., join_keys can extract the keys of an equi-join from it.
+  """
+  for conjunct in conjuncts(op):
+    if not (isinstance(conjunct, EqOp) and isinstance(conjunct.lhs, Var) and isinstance(conjunct.rhs, Var)):
+      return False
+    sides = [join_side(left_schema, right_schema, var) for var in (conjunct.lhs, conjunct.rhs)]
+    if None in sides or sides[0][0] == sides[1][0]:
+      return False
+  return True
+
+def join_side(left_schema, right_schema, var):
+  """
+  Returns (0, column) if the Var is a column of the left relation, 
+    or (1, column) if it is a column of the right relation,
+    where column is the Var relative to that relation, 
+    or None if it is a column of neither.
+  """
+  parts = var.path.split('.')
+  if len(parts) == 1:
+    if left_schema.field_map.get(parts[0]):
+      return 0, var
+    elif right_schema.field_map.get(parts[0]):
+      return 1, var
+    return None
+
+  relation_name = parts[0]
+  if left_schema.name == relation_name:
+    return 0, Var(parts[1])
+  elif right_schema.name == relation_name:
+    return 1, Var(parts[1])
+  return None
+
+
+
+
+def similarity_condition(op):
+  """
+  Returns ((the two vector expressions), radius, k) if the expression is a similarity join condition:
+    'x TO y < r' (or <=, or mirrored) where k is None, 
+    or 'knn(x, y, k)' where the radius is None,
+  otherwise returns None.
+  Raises SQLSyntaxError for a knn() call whose k is not a non-negative integer.
+  """
+  if isinstance(op, Function):
+    if op.name.lower() != KNN_FUNCTION or len(op.args) != 3:
+      return None
+    x, y, k = op.args
+    if not isinstance(k, NumberConst) or not isinstance(k.const, numbers.Integral) or k.const < 0:
+      raise SQLSyntaxError(
+        "invalid {0}() join condition: k (the third argument of {0}()) must be a non-negative integer".format(KNN_FUNCTION)
+      )
+    return (x, y), None, k.const
+
+  op_class = type(op)
+  if op_class not in MIRRORED_RANGE_COMPARISONS:
+    return None
+  lhs, rhs = op.lhs, op.rhs
+  if isinstance(lhs, NumberConst):
+    op_class, lhs, rhs = MIRRORED_RANGE_COMPARISONS[op_class], rhs, lhs
+  if op_class not in (LtOp, LeOp) or not isinstance(rhs, NumberConst) or not isInstanceByClassName(lhs, 'ToOp'):
+    return None
+  return (lhs.lhs, lhs.rhs), rhs.const, None
+
+def similarity_join_keys(left_schema, right_schema, op):
+  """
+  Given two relations that need to be joined and an expression, returns
+    (the function extracting the vector from a row of the left relation, 
+     the function extracting the vector from a row of the right relation, 
+     the name of the vector column of the right relation, radius, k, residual)
+  if one of the conjuncts of the expression is a similarity condition between a vector column of each relation:
+
+  left.v TO right.v < r
+    joins the pairs of rows whose vectors are within distance r (<= r also, and the sides can be swapped), 
+    where k is None
+  knn(left.v, right.v, k)
+    joins each left row with the k rows of the right relation nearest to it, 
+    where the radius is None
+
+  'residual' is the predicate to apply to the joined rows (or None): 
+    the whole expression for the threshold joins, whose candidate pairs are found with a small slack for the rounding errors, 
+    and the other conjuncts for the k-NN joins.
+
+  Returns None if the expression has no such condition,
+    and raises SQLSyntaxError if it has a knn() condition whose arguments are not as above.
+  """
+  all_conjuncts = conjuncts(op)
+  for conjunct in all_conjuncts:
+    condition = similarity_condition(conjunct)
+    if condition is None:
+      continue
+    vectors, radius, k = condition
+    sides = [join_side(left_schema, right_schema, var) if isinstance(var, Var) else None for var in vectors]
+    if None in sides:
+      if k is not None:
+        raise SQLSyntaxError(
+          "invalid {0}() join condition: the first two arguments of {0}() must be columns of the joined relations".format(KNN_FUNCTION)
+        )
+      continue
+    if k is not None and (sides[0][0] != 0 or sides[1][0] != 1):
+      # a k-NN join is not symmetric: each row of the first relation gets its nearest rows of the second one
+      raise SQLSyntaxError(
+        "invalid {0}() join condition: the first argument of {0}() must be a column of the left relation, "
+        "and the second one a column of the right relation".format(KNN_FUNCTION)
+      )
+    if sides[0][0] == sides[1][0]:
+      continue
+    (_, left_column), (_, right_column) = sorted(sides, key=lambda side: side[0])
+
+    if k is None:
+      residual = op
+    else:
+      others = [c for c in all_conjuncts if c is not conjunct]
+      residual = reduce(And, others) if others else None
+    return (
+      var_expr(left_column, left_schema, None), var_expr(right_column, right_schema, None), 
+      right_column.path, radius, k, residual
+    )
+
+  return None
 
+def vector_matrix(vectors):
+  """
+  Stacks the vectors (or None) into a (n, dim) float64 matrix, 
+    and returns it with the positions of the non-null vectors.
+  """
+  positions = np.array([i for i, v in enumerate(vectors) if v is not None], dtype=np.int64)
+  if len(positions) == 0:
+    return np.empty((0, 0)), positions
+  return np.stack([np.asarray(vectors[i], dtype=np.float64) for i in positions]), positions
+
+def joined_rows(left_join, l_row, r_rows, right_width, residual, ctx):
+  matched = False
+  for r_row in r_rows:
+    row = l_row + r_row
+    if residual is None or residual(row, ctx):
+      matched = True
+      yield row
+  if left_join and not matched:
+    yield l_row + (None,) * right_width
+
+def similarity_join(left_join, left_vector, right_vector, radius, k, residual, left_rows, right_rows, right_width, ctx):
+  """
+  Joins each row of the left relation with the rows of the right relation 
+    whose vectors are within distance 'radius' of its vector, or with its k nearest rows of the right relation.
+
+  The Euclidean distances between a block of left rows and all the right rows are computed 
+    as one matrix by NumPy, instead of one distance per pair of rows like nested_block_join,
+    where the blocks are sized so that a matrix takes about half of 'sort_buffer_size' bytes.
+  The right rows matched with a left row are ordered by their positions (by the distances for the k-NN joins).
+
+  Parameters
+  ------------
+  left_vector, right_vector: functions extracting the vectors from the rows of the relations, see similarity_join_keys
+  residual: the predicate applied to the joined rows, or None
+  right_width: number of fields of the right relation, for the left joins
+  """
+  right_matrix, right_positions = vector_matrix([right_vector(row, ctx) for row in right_rows])
+  left_matrix, left_positions = vector_matrix([left_vector(row, ctx) for row in left_rows])
+  matches = [[] for _ in left_rows]
+
+  if len(right_positions) > 0 and len(left_positions) > 0:
+    ERROR_IF_NOT_EQ(
+      left_matrix.shape[1], right_matrix.shape[1], 
+      "could not compute the distances between vectors of sizes {} and {}".format(left_matrix.shape[1], right_matrix.shape[1])
+    )
+    right_norms = np.einsum('ij,ij->i', right_matrix, right_matrix)
+    block_size = max(int(ctx.get('sort_buffer_size', MAX_SIZE) / 2 / (8 * len(right_positions))), 1)
+    for start in range(0, len(left_positions), block_size):
+      block = left_matrix[start:start + block_size]
+      squared = squaredDistances(block, right_matrix, right_norms)
+      if k is None:
+        # slack for the rounding errors of |l|^2 - 2 l.r + |r|^2, the residual predicate checks the exact distances
+        left_norms = np.einsum('ij,ij->i', block, block)
+        tolerance = 1e-9 * (left_norms[:, None] + right_norms[None, :]) + 1e-12
+        within = squared <= max(radius, 0) ** 2 + tolerance
+        for i, j in zip(*np.nonzero(within)):
+          matches[left_positions[start + i]].append(right_positions[j])
+        continue
+      nearest = np.argpartition(squared, k - 1, axis=1)[:, :k] if 0 < k < len(right_positions) \
+        else np.tile(np.arange(len(right_positions)), (len(block), 1))[:, :k]
+      # the exact distances of the nearest rows order them
+      diff = right_matrix[nearest] - block[:, None, :]
+      distances = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+      for i in range(len(block)):
+        order = np.lexsort((nearest[i], distances[i]))
+        matches[left_positions[start + i]] = right_positions[nearest[i][order]].tolist()
+
+  for l_row, positions in zip(left_rows, matches):
+    r_rows = (right_rows[j] for j in positions)
+    yield from joined_rows(left_join, l_row, r_rows, right_width, residual, ctx)
+
+def index_similarity_join(left_join, lookup, left_vector, radius, k, residual, left_rows, right_width, ctx):
+  """
+  Joins each row of the left relation with the rows of the right relation 
+    found by searching the vector index over the right vector column, like index_nested_loop_join.
 
+  Parameters
+  ------------
+  lookup: a function ((vector, radius, k) -> list of rows of the right relation), see Adapter.similarity_lookup
+  """
+  for l_row in left_rows:
+    vector = left_vector(l_row, ctx)
+    r_rows = lookup(vector, radius, k) if vector is not None else ()
+    yield from joined_rows(left_join, l_row, r_rows, right_width, residual, ctx)
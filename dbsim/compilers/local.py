@@ -1,17 +1,21 @@
 import operator
+import heapq
 from functools import partial
-from itertools import islice
+from itertools import islice, compress
 import numbers
 
+import numpy as np
+
 from ..ast import *
 from .. import compat
 from ..field import FieldType
 
-from ..operations import  walk, visit_with, isa
+from ..operations import  walk, visit_with, isa, make_node
 from ..schema_interpreter import (
   field_from_expr,  JoinSchema, relational_function
 )
 
+from ..planners.cost.cardinality import CardinalityEstimator
 from ..utils.logger import Logger
 
 import inspect 
@@ -93,6 +97,17 @@ def removePredicateOps(executors: typing.Dict[typing.Type[Expr], Callable]):
   global VALUE_EXPR
   removeExecutors(executors, VALUE_EXPR)
 
+def addBatchOps(executors: typing.Dict[typing.Type[Expr], Callable]):
+  """
+  Adds batch execution functions (see BATCH_VALUE_EXPR) for extended predicate operators from the external
+  """
+  global BATCH_VALUE_EXPR
+  addExecutors(executors, BATCH_VALUE_EXPR)
+
+def removeBatchOps(executors: typing.Dict[typing.Type[Expr], Callable]):
+  global BATCH_VALUE_EXPR
+  removeExecutors(executors, BATCH_VALUE_EXPR)
+
 def addRelationOps(executors: typing.Dict[typing.Type[Expr], Callable]):
   """
   Adds execution functions for extended relational operators from the external
@@ -152,6 +167,9 @@ def compile(query):
       query.dataset,      
       (isa(LoadOp), load_relation),
       (isa(ProjectionOp), ensure_group_op_when_ags),
+      (is_filtered_nearest_selection, filtered_nearest_selection),
+      (is_bounded_order_by, bound_order_by),
+      (is_push_down_candidate, push_down),
       (isa_op, relational_op), # here the logical plan node is transformed to its physical executable
       (is_callable, validate_function)
     )
@@ -162,6 +180,125 @@ def isa_op(loc):
   # check whether the current node is one of the RELATION_OPS
   return type(loc.node()) in RELATION_OPS
 
+def relation_children(operation) -> typing.Tuple:
+  if isinstance(operation, BinRelationalOp):
+    return (operation.left, operation.right)
+  if isinstance(operation, RelationalOp) and hasattr(operation, 'relation'):
+    return (operation.relation,)
+  return ()
+
+def is_push_down_candidate(loc):
+  """
+  Checks whether the current node is one of the RELATION_OPS 
+    whose children are all Relations provided by the same adapter.
+  """
+  operation = loc.node()
+  if type(operation) not in RELATION_OPS:
+    return False
+  children = relation_children(operation)
+  return len(children) > 0 and all(
+    isinstance(child, Relation) 
+    and child.adapter is not None 
+    and child.adapter is children[0].adapter
+    for child in children
+  )
+
+def push_down(dataset, loc, operation):
+  """
+  Lets the adapter providing the children evaluate the current node by itself. 
+  If the adapter accepts, the node is replaced with the Relation returned by the adapter, 
+    which can be further pushed down together with its parent.
+  The records of the returned Relation count its rows into the context (see PushedDownRecords), 
+    while the adapter is given the children with the records it returned for them.
+  """
+  children = relation_children(operation)
+  unwrapped = tuple(
+    child._replace(records=child.records.records) if isinstance(child.records, PushedDownRecords) else child
+    for child in children
+  )
+  if any(child is not unwrapped_child for child, unwrapped_child in zip(children, unwrapped)):
+    operation = make_node(operation, unwrapped)
+  relation = children[0].adapter.push_down(operation)
+  if relation is None:
+    return loc
+  return loc.replace(relation._replace(records=PushedDownRecords(operation, relation.records)))
+
+class PushedDownRecords(object):
+  """
+  The records function of a Relation returned by Adapter.push_down, 
+    which records the number of rows of the pushed-down operator like the other operators do (see computeCost), 
+    except that the output rows are counted, as its input rows are only seen by the adapter.
+  """
+  __slots__ = ('operation', 'records')
+
+  def __init__(self, operation, records):
+    self.operation = operation
+    self.records = records
+
+  def __call__(self, ctx):
+    output_rows = tuple(self.records(ctx))
+    computeCost(ctx, self.operation, output_rows)
+    return (row for row in output_rows)
+
+def is_bounded_order_by(loc):
+  """Checks whether the current node is an ORDER BY right under a LIMIT"""
+  if type(loc.node()) is not OrderByOp:
+    return False
+  parent = loc.up()
+  return parent is not None and isinstance(parent.node(), SliceOp) and parent.node().stop is not None
+
+def bound_order_by(dataset, loc, operation):
+  """
+  Replaces the ORDER BY under a LIMIT with a TopKOp keeping only the rows within the limit, 
+    which the adapter providing the input may also evaluate by itself (see push_down), 
+    e.g., a k-nearest-neighbour search answered by a vector index.
+  """
+  return loc.replace(TopKOp(
+    operation.relation, *operation.exprs, 
+    k=loc.up().node().stop, schema=operation.schema, cost_factor=operation.cost_factor
+  ))
+
+def is_filtered_nearest_selection(loc):
+  """Checks whether the current node is a selection over a Relation right under a bounded ORDER BY (see is_bounded_order_by)"""
+  operation = loc.node()
+  if not isinstance(operation, SelectionOp) or operation.bool_op is None:
+    return False
+  if not isinstance(operation.relation, Relation) or operation.relation.adapter is None:
+    return False
+  parent = loc.up()
+  return parent is not None and is_bounded_order_by(parent)
+
+def filtered_nearest_selection(dataset, loc, operation):
+  """
+  Plans the selection under a k-NN search (ORDER BY column TO vector LIMIT k): 
+    the adapter providing the input may search the nearest rows first and filter them (post-filtering, 
+    see Adapter.filtered_nearest_scan) when the predicate is estimated to be unselective, 
+    in which case the selection is replaced with the scan of the rows it returns.
+  Otherwise, the selection is evaluated as usual before the k-NN search (pre-filtering).
+  """
+  relation = operation.relation
+  order_by = loc.up().node()
+  k = loc.up().up().node().stop
+  estimator = CardinalityEstimator(dataset)
+  num_rows = estimator.rows(relation)
+  selectivity = estimator.rows(operation) / num_rows if num_rows > 0 else 1.0
+
+  predicate = value_expr(operation.bool_op, operation.schema, dataset)
+  batch_predicate = batch_value_expr(operation.bool_op, operation.schema, dataset)
+  if batch_predicate is None:
+    batch_predicate = lambda rows, ctx: [predicate(row, ctx) for row in rows]
+  scan = relation.adapter.filtered_nearest_scan(relation, operation.bool_op, batch_predicate, order_by.exprs, k, selectivity)
+  if scan is None:
+    return loc
+
+  def selection(ctx):
+    input_rows = list(scan(ctx))
+    computeCost(ctx, operation, tuple(input_rows))
+    return (row for row in input_rows)
+
+  selection.schema = operation.schema
+  return loc.replace(selection)
+
 def relational_op(dataset, loc, operation):
   func = RELATION_OPS[type(operation)](dataset,  operation)
   func.schema = operation.schema
@@ -264,12 +401,16 @@ def selection_op(dataset, operation):
     return lambda relation, ctx: relation
 
   predicate  = value_expr(operation.bool_op, operation.schema, dataset)
+  batch_predicate = batch_value_expr(operation.bool_op, operation.schema, dataset)
+  scan = selection_scan(operation)
 
   def selection(ctx):
-    relation = operation.relation(ctx)
+    relation = scan(ctx)
 
     input_rows = list(relation)
     computeCost(ctx, operation, tuple(input_rows))
+    if batch_predicate is not None:
+      return batch_selection(batch_predicate, input_rows, ctx)
     # re-build the generator 'relation'
     relation = (row for row in input_rows)
 
@@ -281,6 +422,28 @@ def selection_op(dataset, operation):
     
   return selection
 
+selection_batch_size = 4096
+"""Number of rows evaluated at a time by the batch predicates of selections"""
+
+def batch_selection(batch_predicate, rows, ctx):
+  for start in range(0, len(rows), selection_batch_size):
+    batch = rows[start:start + selection_batch_size]
+    yield from compress(batch, batch_predicate(batch, ctx))
+
+def selection_scan(operation):
+  """
+  Returns the function generating the input rows of the selection. 
+  When the input is a Relation, the adapter providing it may scan only the rows 
+    that can satisfy the predicate (see Adapter.filtered_scan), 
+    otherwise the whole input is generated.
+  """
+  relation = operation.relation
+  if isinstance(relation, Relation) and relation.adapter is not None:
+    scan = relation.adapter.filtered_scan(relation, operation.bool_op)
+    if scan is not None:
+      return scan
+  return relation
+
 def union_all_op(dataset, operation):
 
   def union_all(ctx):
@@ -305,11 +468,17 @@ def join_op(left_join, dataset, operation):
   left  = operation.left
   right = operation.right
 
-  try:
+  if is_equi_join(left.schema, right.schema, operation.bool_op):
     comparison = join_keys(left.schema, right.schema, operation.bool_op)
     # left inner join
     method = partial(hash_join, left_join)
-  except ValueError:
+    index_lookup = right_index_lookup(operation)
+    if index_lookup is not None:
+      return index_join_op(left_join, operation, comparison, *index_lookup)
+  else:
+    similarity_keys = similarity_join_keys(left.schema, right.schema, operation.bool_op)
+    if similarity_keys is not None:
+      return similarity_join_op(left_join, dataset, operation, similarity_keys)
     # icky cross product
     comparison = value_expr(operation.bool_op, operation.schema, dataset)
     method = nested_block_join
@@ -338,6 +507,108 @@ def join_op(left_join, dataset, operation):
 
 
 
+def right_index_lookup(operation):
+  """
+  Returns (the index lookup function, the number of rows) of the right relation of an equi-join 
+    if the right relation is a Relation whose (single) join key is indexed by its adapter, 
+    otherwise returns None.
+  """
+  right = operation.right
+  if not isinstance(right, Relation) or right.adapter is None:
+    return None
+  columns = right_join_columns(operation.left.schema, right.schema, operation.bool_op)
+  if len(columns) != 1:
+    return None
+  lookup = right.adapter.index_lookup(right, columns[0])
+  if lookup is None:
+    return None
+  table = right.adapter.get_relation(right.name)
+  num_right_rows = table.size() if hasattr(table, 'size') else float('Inf')
+  return lookup, num_right_rows
+
+def index_join_op(left_join, operation, comparison, lookup, num_right_rows):
+  """
+  Physical choice between the index nested-loop join and the hash join, 
+    made once the rows of the left relation are known:
+    the index is probed for each left row only when there are fewer left rows than right rows, 
+    so that the right relation is never fully scanned; 
+    otherwise, the hash join is used.
+  """
+  left_key, _ = comparison
+
+  def join(ctx):
+    input_rows_left = list(operation.left(ctx))
+    if len(input_rows_left) >= num_right_rows:
+      input_rows_right = list(operation.right(ctx))
+      computeCost(
+        ctx, operation, 
+        tuple(input_rows_left), tuple(input_rows_right), 
+        lambda l, r: len(l) * len(r)
+      )
+      left_records = lambda ctx: input_rows_left
+      left_records.schema = operation.left.schema
+      right_records = lambda ctx: input_rows_right
+      right_records.schema = operation.right.schema
+      return hash_join(left_join, left_records, right_records, comparison, ctx)
+    # each left row is processed by one index lookup
+    computeCost(ctx, operation, tuple(input_rows_left))
+    return index_nested_loop_join(
+      left_join, lookup, left_key, len(operation.right.schema.fields), input_rows_left, ctx
+    )
+
+  return join
+
+def right_similarity_lookup(operation, column_name):
+  """
+  Returns (the similarity lookup function, the number of rows) of the right relation of a similarity join 
+    if the right relation is a Relation whose vector column has a vector index, 
+    otherwise returns None.
+  """
+  right = operation.right
+  if not isinstance(right, Relation) or right.adapter is None:
+    return None
+  lookup = right.adapter.similarity_lookup(right, column_name)
+  if lookup is None:
+    return None
+  table = right.adapter.get_relation(right.name)
+  num_right_rows = table.size() if hasattr(table, 'size') else float('Inf')
+  return lookup, num_right_rows
+
+def similarity_join_op(left_join, dataset, operation, keys):
+  """
+  Compiles a join on a similarity condition between the vector columns of the two relations 
+    (see join.similarity_join_keys), made once the rows of the left relation are known:
+    the vector index of the right relation is searched for each left row 
+    when there are fewer left rows than right rows (see right_similarity_lookup), 
+    otherwise the distances are computed as blocked matrices (see join.similarity_join).
+  """
+  left_vector, right_vector, right_column, radius, k, residual = keys
+  if residual is not None:
+    residual = value_expr(residual, operation.schema, dataset)
+  index_lookup = right_similarity_lookup(operation, right_column)
+  right_width = len(operation.right.schema.fields)
+
+  def join(ctx):
+    input_rows_left = list(operation.left(ctx))
+    if index_lookup is not None and len(input_rows_left) < index_lookup[1]:
+      # each left row is processed by one index search
+      computeCost(ctx, operation, tuple(input_rows_left))
+      return index_similarity_join(
+        left_join, index_lookup[0], left_vector, radius, k, residual, input_rows_left, right_width, ctx
+      )
+    input_rows_right = list(operation.right(ctx))
+    computeCost(
+      ctx, operation, 
+      tuple(input_rows_left), tuple(input_rows_right), 
+      lambda l, r: len(l) * len(r)
+    )
+    return similarity_join(
+      left_join, left_vector, right_vector, radius, k, residual, 
+      input_rows_left, input_rows_right, right_width, ctx
+    )
+
+  return join
+
 def order_by_op(dataset, operation):
   columns = tuple(
     value_expr(expr, operation.relation.schema, dataset)
@@ -362,6 +633,56 @@ def order_by_op(dataset, operation):
     
   return order_by
 
+def top_k_op(dataset, operation):
+  """
+  Compiles a TopKOp into the function returning its first k rows, like order_by_op followed by a LIMIT k. 
+
+  When it orders by a single expression which can be evaluated in batches (see batch_value_expr), 
+    e.g., the distances to a vector, the values are computed a batch of rows at a time
+    and only the k rows with the smallest values so far are kept between the batches, 
+    otherwise the k smallest rows are kept by a heap of size k. 
+  The rows with equal values are kept in their input order, as by sorting. 
+  """
+  k = max(operation.k, 0)
+  columns = tuple(
+    value_expr(expr, operation.relation.schema, dataset)
+    for expr in operation.exprs
+  )
+  batch_key = None
+  if len(operation.exprs) == 1:
+    expr = operation.exprs[0]
+    descending = isinstance(expr, Desc)
+    batch_key = batch_value_expr(expr.expr if isinstance(expr, (Asc, Desc)) else expr, operation.relation.schema, dataset)
+
+  def key(row, ctx):
+    return tuple(
+      compat.python2_sort_key(c(row, ctx)) for c in columns
+    )
+
+  def top_k(ctx):
+    relation = operation.relation(ctx)
+
+    input_rows = list(relation)
+    computeCost(ctx, operation, tuple(input_rows))
+    if batch_key is None:
+      return heapq.nsmallest(k, input_rows, key=lambda row: key(row, ctx))
+
+    best_keys, best_positions = np.empty(0), np.empty(0, dtype=np.int64)
+    for start in range(0, len(input_rows), selection_batch_size):
+      keys = np.asarray(batch_key(input_rows[start:start + selection_batch_size], ctx), dtype=np.float64)
+      if descending:
+        keys = -keys
+      best_keys = np.concatenate([best_keys, keys])
+      best_positions = np.concatenate([best_positions, np.arange(start, start + len(keys))])
+      if len(best_keys) > k:
+        # the null values (NaN) come last
+        best = np.lexsort((best_positions, best_keys))[:k]
+        best_keys, best_positions = best_keys[best], best_positions[best]
+    order = np.lexsort((best_positions, best_keys))
+    return [input_rows[pos] for pos in best_positions[order].tolist()]
+
+  return top_k
+
 def group_by_op(dataset, group_op):
 
   if group_op.exprs:
@@ -630,14 +951,15 @@ def desc_expr(expr, schema, dataset):
   field = field_from_expr(expr.expr, dataset, schema)
   value = value_expr(expr.expr, schema, dataset)
 
-  if field.type in (FieldType.INTEGER, FieldType.FLOAT, ):
+  # compared by name, as the FieldType enum is re-created when data types are added by extensions
+  if field.type.name in (FieldType.INTEGER.name, FieldType.FLOAT.name):
 
     def invert_number(record, ctx):
       return -value(record,ctx)
 
     return invert_number
 
-  elif field.type == FieldType.STRING:
+  elif field.type.name == FieldType.STRING.name:
     def invert_string(record, ctx):
       return [-b for b in bytearray(value(record,ctx))]
     return invert_string
@@ -660,7 +982,106 @@ def binary_op(operator, expr, schema, dataset):
   _.__name__ = operator.__name__
   return _
 
+def comparison_op(operator, expr, schema, dataset):
+  """Compiles a comparison, which is false when either side is null (e.g., the distance to a null vector)"""
+  lhs = value_expr(expr.lhs, schema, dataset)
+  rhs = value_expr(expr.rhs, schema, dataset)
+
+  def _(row, ctx):
+    lhs_value, rhs_value = lhs(row, ctx), rhs(row, ctx)
+    return lhs_value is not None and rhs_value is not None and operator(lhs_value, rhs_value)
+  _.__name__ = operator.__name__
+  return _
+
+def in_op(expr, schema, dataset):
+  lhs = value_expr(expr.lhs, schema, dataset)
+  if all(isinstance(item, Const) for item in expr.rhs.exprs):
+    # the constants are collected once instead of for every row
+    values = [item.const for item in expr.rhs.exprs]
+    try:
+      values = frozenset(values)
+    except TypeError:
+      # unhashable constants
+      pass
+    def _(row, ctx):
+      return lhs(row, ctx) in values
+  else:
+    items = [value_expr(item, schema, dataset) for item in expr.rhs.exprs]
+    def _(row, ctx):
+      return lhs(row, ctx) in [item(row, ctx) for item in items]
+  return _
 
+def between_op(expr, schema, dataset):
+  value = value_expr(expr.expr, schema, dataset)
+  low = value_expr(expr.lhs, schema, dataset)
+  high = value_expr(expr.rhs, schema, dataset)
+  def _(row, ctx):
+    return low(row, ctx) <= value(row, ctx) <= high(row, ctx)
+  return _
+
+def batch_value_expr(expr, schema, dataset):
+  """
+  Compiles the expression into a function (rows, ctx) -> NumPy array of its values over a batch of rows, 
+    or returns None if the expression has no batch execution function (see BATCH_VALUE_EXPR).
+  """
+  compile_batch = BATCH_VALUE_EXPR.get(type(expr))
+  return compile_batch(expr, schema, dataset) if compile_batch is not None else None
+
+def batch_number_const(expr):
+  """Returns the batch function of a number constant, which is broadcast over the batch, or None for any other expression"""
+  if not isinstance(expr, NumberConst):
+    return None
+  const = expr.const
+  return lambda rows, ctx: const
+
+def batch_nulls(values) -> np.ndarray:
+  """Returns the mask of the null values (NaN) of a batch, or False if the values cannot be null"""
+  values = np.asarray(values)
+  return np.isnan(values) if values.dtype.kind == 'f' else np.False_
+
+def batch_comparison_op(operator, expr, schema, dataset):
+  """
+  Compiles a comparison between an expression evaluated in batches and a number constant (or another such expression), 
+    e.g., a distance between vectors compared with a threshold.
+  """
+  lhs = batch_value_expr(expr.lhs, schema, dataset)
+  rhs = batch_value_expr(expr.rhs, schema, dataset)
+  if lhs is None and rhs is None:
+    return None
+  lhs = lhs if lhs is not None else batch_number_const(expr.lhs)
+  rhs = rhs if rhs is not None else batch_number_const(expr.rhs)
+  if lhs is None or rhs is None:
+    return None
+
+  def _(rows, ctx):
+    lhs_values, rhs_values = lhs(rows, ctx), rhs(rows, ctx)
+    with np.errstate(invalid='ignore'):
+      results = operator(lhs_values, rhs_values)
+    # like comparison_op, a comparison with a null value (NaN, e.g., the distance to a null vector) is false
+    return np.logical_and(results, ~(batch_nulls(lhs_values) | batch_nulls(rhs_values)))
+  _.__name__ = operator.__name__
+  return _
+
+def batch_logical_op(operator, expr, schema, dataset):
+  """
+  Compiles a conjunction or disjunction in which at least one side is evaluated in batches, 
+    while the other side, if it cannot be, is evaluated row by row into an array of bools.
+  """
+  lhs = batch_value_expr(expr.lhs, schema, dataset)
+  rhs = batch_value_expr(expr.rhs, schema, dataset)
+  if lhs is None and rhs is None:
+    return None
+
+  def row_wise(side_expr):
+    value = value_expr(side_expr, schema, dataset)
+    return lambda rows, ctx: np.fromiter((bool(value(row, ctx)) for row in rows), dtype=bool, count=len(rows))
+  lhs = lhs if lhs is not None else row_wise(expr.lhs)
+  rhs = rhs if rhs is not None else row_wise(expr.rhs)
+
+  def _(rows, ctx):
+    return operator(lhs(rows, ctx), rhs(rows, ctx))
+  _.__name__ = operator.__name__
+  return _
 
 VALUE_EXPR = {
   Var: var_expr,
@@ -681,14 +1102,16 @@ VALUE_EXPR = {
   And: partial(binary_op, operator.and_),
   Or: partial(binary_op, operator.or_),
 
-  LtOp: partial(binary_op, operator.lt),
-  LeOp: partial(binary_op, operator.le),
-  EqOp: partial(binary_op, operator.eq),
-  NeOp: partial(binary_op, operator.ne),
-  GeOp: partial(binary_op, operator.ge),
-  GtOp: partial(binary_op, operator.gt),
+  LtOp: partial(comparison_op, operator.lt),
+  LeOp: partial(comparison_op, operator.le),
+  EqOp: partial(comparison_op, operator.eq),
+  NeOp: partial(comparison_op, operator.ne),
+  GeOp: partial(comparison_op, operator.ge),
+  GtOp: partial(comparison_op, operator.gt),
   IsOp: partial(binary_op, operator.is_),
   IsNotOp: partial(binary_op, operator.is_not),
+  InOp: in_op,
+  BetweenOp: between_op,
 
   AddOp: partial(binary_op, operator.add),
   SubOp: partial(binary_op, operator.sub),
@@ -718,11 +1141,37 @@ The compilation function is such a function: (expr, schema, dataset) -> ((row, c
 Those compilation functions will be called by the relational operator compilers present in RELATION_OPS.
 """
 
+BATCH_VALUE_EXPR = {
+  And: partial(batch_logical_op, operator.and_),
+  Or: partial(batch_logical_op, operator.or_),
+
+  LtOp: partial(batch_comparison_op, operator.lt),
+  LeOp: partial(batch_comparison_op, operator.le),
+  EqOp: partial(batch_comparison_op, operator.eq),
+  NeOp: partial(batch_comparison_op, operator.ne),
+  GeOp: partial(batch_comparison_op, operator.ge),
+  GtOp: partial(batch_comparison_op, operator.gt),
+}
+"""
+BATCH_VALUE_EXPR stores the mapping: predicate operator -> its batch compilation function.
+
+The batch compilation function is such a function: (expr, schema, dataset) -> ((rows, ctx) -> np.ndarray) or None
+  i.e., like the compilation functions in VALUE_EXPR, 
+        but the returned function evaluates the expression over a list of rows at once, 
+        e.g., the distances between a vector column and a constant vector are computed by one NumPy expression 
+              for all the rows (see extensions.extended_syntax.sim_select_syntax), 
+        and None is returned when the expression cannot be evaluated in batches. 
+
+A selection whose predicate can be evaluated in batches is executed a batch of rows at a time (see selection_op), 
+  so only the operators that benefit from it have batch compilation functions.
+"""
+
 RELATION_OPS = {
   AliasOp: alias_op,
   ProjectionOp: projection_op,
   SelectionOp: selection_op,
   OrderByOp: order_by_op,
+  TopKOp: top_k_op,
   GroupByOp: group_by_op,
   SliceOp: slice_op,
   JoinOp: partial(join_op, False),
@@ -742,4 +1191,7 @@ The compilation function is such a function: (dataset,  operation) -> ((ctx) ->
 """
 
 # sigh, oh python and your circular import
-from .join import nested_block_join, hash_join, join_keys
+from .join import (
+  nested_block_join, hash_join, index_nested_loop_join, is_equi_join, join_keys, right_join_columns, 
+  similarity_join, index_similarity_join, similarity_join_keys
+)
@@ -4,11 +4,12 @@ from .query_parser import parse_statement
 from .adapters.null_adapter import  NullAdapter
 from .ast import LoadOp, Expr, AliasOp
 from .aggregates import Aggregate
-from .compilers import local
+from .compilers import local, batch_search
 
 from .compilers.local import relational_function
 
 from .field import Field
+from .storage.index import IndexType
 
 from .operations import walk
 
@@ -81,6 +82,34 @@ class DataSet(object):
 
     self.views[name] = AliasOp(name,operations, operations.schema)
     
+  def create_index(self, relation_name, column_name, index_type=IndexType.SORTED, **params):
+    """
+    Builds a secondary index over the column of the relation, 
+      like 'CREATE INDEX ON relation_name (column_name)', and returns the index.
+
+    Sorted indexes serve both range and equality predicates, 
+      while hash indexes only serve equality predicates (and equi-joins). 
+    Vector indexes (like IndexType.IVF_FLAT) serve similarity predicates like 'column TO [..] < r', 
+      and take their tuning parameters by 'params', e.g., 'nprobe' (see storage.vector_index).
+    Selections over the relation and joins with it use the index automatically 
+      when it is cheaper than scanning the relation.
+    """
+    return self.adapter_for(relation_name).create_index(relation_name, column_name, index_type, **params)
+
+  def drop_index(self, relation_name, column_name, index_type=None):
+    """Drops the index of the given type (or all the indexes if no type given) over the column"""
+    self.adapter_for(relation_name).drop_index(relation_name, column_name, index_type)
+
+  def append(self, relation_name, rows):
+    """
+    Appends a batch of rows to the relation, like 'INSERT INTO relation_name VALUES ...',
+      and returns the number of appended rows.
+
+    The statistics and the indexes of the relation are updated incrementally,
+      so appending in large batches is much cheaper than appending row by row.
+    """
+    return self.adapter_for(relation_name).append(relation_name, rows)
+
   def aggregate(self, returns=None, initial=None, name=None, finalize=None):
     def _(func, name):
       if name is None:
@@ -221,6 +250,33 @@ class DataSet(object):
     return callable(ctx)
 
 
+  def execute_batch(self, query, vectors, *params, **kw):
+    """
+    Executes the parameterized similarity search 'query' (a Query or a statement) for each of the query vectors
+      in a single scan of its relation (see compilers.batch_search),
+      and returns the list of the resulting rows of each query vector,
+      like calling 'execute' once per query vector but much faster for many query vectors,
+      including for the rows with null vectors, whose distances compare as false and are sorted last by k-NN orderings.
+
+    Parameters
+    ------------
+    query: a similarity search over a single relation whose query vector is a parameter, e.g.,
+            "simselect id from items where embedding to ?0 < 1.5"
+            or "select id from items where category = 'book' order by embedding to ?0 limit 10"
+    vectors: the query vectors, as a (n, dim) matrix or a list of vectors
+    params: the values of the other parameters
+    param: (keyword) the position of the parameter of the query vector (0 by default),
+            before which 'params' are the values of the parameters at lower positions
+    """
+    if not isinstance(query, Query):
+      query = self.query(query)
+    param = kw.get('param', 0)
+    execute = batch_search.compile_batch(query, param)
+    # copied, as the caller's ctx is not to be modified
+    ctx = dict(kw.get('ctx', {'dataset': self}))
+    ctx['params'] = params[:param] + (None,) + params[param:]
+    return execute(ctx, vectors)
+
   def query(self, statement):
     """Parses the statement and returns a Query"""
     return Query(self, parse_statement(statement))
@@ -7,7 +7,7 @@ from dbsim.query_parser import parse_statement
 from dbsim.query import Query
 from dbsim.planners import rules
 from dbsim.planners.heuristic.heuristic_planner import HeuristicPlanner
-from dbsim.planners.cost.logical_cost import LogicalCost
+from dbsim.planners.cost.logical_cost import LogicalCost, CostMode
 
 
 dataset = ds.DataSet()
@@ -40,8 +40,11 @@ best_plan = planner.findBestPlan(plan)
 LogicalCost.refineCostFactors(plan, False)
 LogicalCost.refineCostFactors(best_plan, False)
 # After refineCostFactors, call getCost to return the cost of the input plan.
+# By default the cost is estimated from the statistics of the relations, 
+#   while CostMode.CALIBRATE executes the plan to compute the actual cost.
 print("Cost (initial plan): ", LogicalCost.getCost(plan, dataset).toNumeric())
 print("Cost (best plan): ", LogicalCost.getCost(best_plan, dataset).toNumeric())
+print("Actual cost (best plan): ", LogicalCost.getCost(best_plan, dataset, CostMode.CALIBRATE).toNumeric())
 
 print("Results:\n----------------")
 for row in Query(dataset, best_plan, False):
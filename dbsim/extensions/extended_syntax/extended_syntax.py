@@ -21,6 +21,8 @@ class ExtendedSyntax(object):
     '_extended_predicate_parsers_': '-> typing.Tuple[Dict[PredExprLevel, Callable], bool]', 
     # plugin predicate operator executors, used by query compilers
     '_extended_predicate_op_executors_': '-> Dict[Type[SimpleOp], Callable[ [SimpleOp,Schema,DataSet], Callable[[row,ctx],Any] ]]',
+    # plugin batch executors of predicate operators (optional), evaluating the operators over batches of rows
+    '_extended_batch_op_executors_': '-> Dict[Type[SimpleOp], Callable[ [SimpleOp,Schema,DataSet], Callable[[rows,ctx],numpy.ndarray] ]]',
     # plugin relational operator schema resolvers (used by schema_interpreter) and executors (used by compilers)
     '_extended_relation_op_schema_': '-> Dict[Type[SuperRelationalOp], Callable[[SuperRelationalOp, DataSet], Schema]]', 
     '_extended_relation_op_executors_': '-> Dict[Type[SuperRelationalOp], Callable[ [DataSet,SuperRelationalOp], Callable[[ctx],Any] ]]', 
@@ -97,11 +99,16 @@ class ExtendedSyntax(object):
     """Extends predicate operators"""
     if hasattr(cls, "_extended_predicate_op_executors_"):
       main_compiler.addPredicateOps(cls._extended_predicate_op_executors_)
+    # (not defined by every subclass, while hasattr is always True for the attributes in __slots__)
+    if isinstance(getattr(cls, "_extended_batch_op_executors_", None), dict):
+      main_compiler.addBatchOps(cls._extended_batch_op_executors_)
 
   @classmethod
   def removeExtendedPredicateOps(cls) -> bool:
     if hasattr(cls, "_extended_predicate_op_executors_"):
       main_compiler.removePredicateOps(cls._extended_predicate_op_executors_)
+    if isinstance(getattr(cls, "_extended_batch_op_executors_", None), dict):
+      main_compiler.removeBatchOps(cls._extended_batch_op_executors_)
 
   @classmethod
   def addExtendedRelationOps(cls) -> bool:
@@ -9,16 +9,63 @@ from ... import field
 
 from functools import partial
 from enum import Enum
-from scipy.spatial.distance import cosine, euclidean
+from csv import QUOTE_NONE
+from io import StringIO
 
 import numpy as np
+import pandas as pd
 import typing
 
 Vec = np.ndarray
 VecDim = 4
 
+def parseVectors(literals: typing.Sequence[str], dim: int = None) -> np.ndarray:
+  """
+  Parses vector literals like '[1, 2.5, -3e-1]' into a contiguous 2-D float array (one row per literal).
+
+  The literals are never evaluated as Python code. 
+  Instead, the brackets of all the literals are stripped at once, 
+    and the elements are parsed in a single pass by the C parser of pandas.
+
+  Parameters
+  ------------
+  literals: the vector literals, e.g., the string values of a dataframe column
+  dim: the expected dimension of the vectors, inferred from the first literal if not given
+
+  Returns
+  ------------
+  The (number of literals, dim) float64 array
+  """
+  literals = pd.Series(literals, dtype=object).reset_index(drop=True)
+  non_strings = np.flatnonzero(~literals.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool))
+  if len(non_strings) > 0:
+    raise ValueError("vector literal #{} is not a string ('{}' received)".format(non_strings[0], literals[non_strings[0]]))
+  literals = literals.str.strip()
+  invalid = np.flatnonzero(~(literals.str.startswith('[') & literals.str.endswith(']')).to_numpy(dtype=bool))
+  if len(invalid) > 0:
+    raise ValueError("vector literal #{} is not enclosed in '[]' ('{}' received)".format(invalid[0], literals[invalid[0]]))
+  # line breaks within a literal would split it into several rows of the parsed text
+  elements = literals.str.slice(1, -1).str.replace(r'[\r\n]', ' ', regex=True)
+  dims = (elements.str.count(',') + 1).to_numpy(copy=True)
+  dims[elements.str.strip().to_numpy() == ''] = 0
+  if dim is None:
+    dim = int(dims[0]) if len(dims) > 0 else 0
+  invalid = np.flatnonzero(dims != dim)
+  if len(invalid) > 0:
+    raise ValueError("vector literal #{} has {} elements ({} expected)".format(invalid[0], dims[invalid[0]], dim))
+  if len(literals) == 0 or dim == 0:
+    return np.empty((len(literals), dim), dtype=np.float64)
+  try:
+    vectors = pd.read_csv(
+      StringIO('\n'.join(elements)), header=None, names=range(dim), 
+      dtype=np.float64, na_filter=False, quoting=QUOTE_NONE, skip_blank_lines=False, engine='c'
+    ).to_numpy()
+  except ValueError as e:
+    raise ValueError("invalid vector element: {}".format(e))
+  return np.ascontiguousarray(vectors)
+
 def toVector(list_str: str):
-  return np.array(eval(list_str))
+  return parseVectors([list_str])[0]
 
 class Metric(Enum):
   EUC = 1 # euclidean distance
@@ -54,27 +101,122 @@ class Vector(Const):
     return np.array_equal(self.const, other.const)
 
 def getVecDistance(v1: Vec, v2: Vec, metric: Metric = Metric.EUC) -> float:
+  """Returns the distance between the vectors, or None if either vector is null"""
+  if v1 is None or v2 is None:
+    return None
   ERROR_IF_NOT_EQ(
     v1.shape, v2.shape, 
     "could not compute the distance between vectors with different shapes {} and {}"\
       .format(v1.shape, v2.shape)
   )
   if metric == Metric.EUC:
-    return euclidean(v1, v2)
-  if metric == Metric.COS_DIST:
-    return cosine(v1, v2)
-  if metric == Metric.COS_SIM:
-    return 1 - cosine(v1, v2)
+    diff = v1 - v2
+    return float(np.sqrt(np.dot(diff, diff)))
   if metric == Metric.DOT:
     return np.dot(v1, v2)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    similarity = float(np.dot(v1, v2) / np.sqrt(np.dot(v1, v1) * np.dot(v2, v2)))
+  return similarity if metric == Metric.COS_SIM else 1 - similarity
+
+def getVecDistances(matrix: np.ndarray, v: Vec, metric: Metric = Metric.EUC, norms: np.ndarray = None) -> np.ndarray:
+  """
+  Computes the distances between each row of 'matrix' and 'v' by one NumPy expression, 
+    like getVecDistance for each row.
+
+  Parameters
+  ------------
+  matrix: the (n, dim) matrix of vectors
+  v: the vector of size dim, or a (n, dim) matrix for the row-wise distances
+  metric: the distance metric
+  norms: the precomputed L2 norms of the rows of 'matrix' (optional), 
+          with which the cosine distances (and similarities) take a single matrix-vector product, 
+          and so do the Euclidean distances (by |m - v|^2 = |m|^2 - 2 m.v + |v|^2)
+
+  Returns
+  ------------
+  The array of the n distances
+  """
+  ERROR_IF_NOT_EQ(
+    matrix.shape[-1], v.shape[-1], 
+    "could not compute the distances between vectors of sizes {} and {}".format(matrix.shape[-1], v.shape[-1])
+  )
+  if metric == Metric.EUC and norms is None:
+    diff = matrix - v
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+  dots = matrix @ v if v.ndim == 1 else np.einsum('ij,ij->i', matrix, v)
+  if metric == Metric.DOT:
+    return dots
+  if norms is None:
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+  v_norms = np.sqrt(np.dot(v, v)) if v.ndim == 1 else np.sqrt(np.einsum('ij,ij->i', v, v))
+  if metric == Metric.EUC:
+    return np.sqrt(np.maximum(norms * norms - 2 * dots + v_norms * v_norms, 0))
+  with np.errstate(invalid='ignore', divide='ignore'):
+    similarities = dots / (norms * v_norms)
+  return similarities if metric == Metric.COS_SIM else 1 - similarities
+
+def stackVectors(vectors: typing.List[Vec]) -> np.ndarray:
+  """Stacks the vectors into a (n, dim) matrix, where a null vector becomes a row of NaN"""
+  if all(v is not None for v in vectors):
+    return np.stack(vectors)
+  valid = [v for v in vectors if v is not None]
+  dim = valid[0].shape[0] if len(valid) > 0 else 0
+  matrix = np.full((len(vectors), dim), np.nan)
+  for i, v in enumerate(vectors):
+    if v is not None:
+      matrix[i] = v
+  return matrix
 
 def get_to_op_executor():
   return partial(main_compiler.binary_op, getVecDistance)
 
+def batch_vector_operand(expr: Expr, schema) -> typing.Callable:
+  """
+  Returns the function ((rows, ctx) -> matrix or vector, or None for a null parameter)
+    of a vector column, constant or parameter, or None for any other expression.
+  """
+  if isinstance(expr, Vector):
+    return lambda rows, ctx: expr.const
+  if isinstance(expr, ParamGetterOp):
+    pos = expr.expr
+    def param_vector(rows, ctx):
+      vector = ctx.get('params', [])[pos]
+      return np.asarray(vector, dtype=np.float64) if vector is not None else None
+    return param_vector
+  if isinstance(expr, Var):
+    pos = schema.field_position(expr.path)
+    return lambda rows, ctx: stackVectors([row[pos] for row in rows])
+  return None
+
+def batch_to_op(expr: ToOp, schema, dataset) -> typing.Callable:
+  """
+  Compiles 'lhs TO rhs' between a vector column and a constant vector, a parameter (or another vector column)
+    into the function computing the distances for a batch of rows at once (see getVecDistances),
+    where the distances to the null vectors are NaN.
+  """
+  lhs, rhs = batch_vector_operand(expr.lhs, schema), batch_vector_operand(expr.rhs, schema)
+  if lhs is None or rhs is None or (not isinstance(expr.lhs, Var) and not isinstance(expr.rhs, Var)):
+    return None
+  if not isinstance(expr.lhs, Var):
+    # the distance is symmetric, so the column is always the matrix
+    lhs, rhs = rhs, lhs
+  def to(rows, ctx):
+    matrix, vector = lhs(rows, ctx), rhs(rows, ctx)
+    if vector is None or matrix.shape[-1] == 0 or vector.shape[-1] == 0:
+      # a null parameter, or only null vectors
+      return np.full(len(rows), np.nan)
+    return getVecDistances(matrix, vector)
+  return to
+
 def convert_values_to_vectors(df_column):
   num_detect_samples = 5
-  if df_column.dtype == object and all(value.startswith('[') and value.endswith(']') for value in df_column[:num_detect_samples]):
-    return df_column.apply(lambda value: toVector(value)), field.FieldType.VECTOR 
+  if pd.api.types.is_string_dtype(df_column.dtype) and all(
+    isinstance(value, str) and value.strip().startswith('[') and value.strip().endswith(']') 
+    for value in df_column[:num_detect_samples]
+  ):
+    vectors = parseVectors(df_column)
+    # each value is a view of a row of the contiguous array
+    return pd.Series(list(vectors), index=df_column.index, name=df_column.name, dtype=object), field.FieldType.VECTOR 
   return df_column, None
 
 def parse_value_exp(tokens: TokenList) -> Expr:
@@ -148,6 +290,9 @@ class SimSelectionSyntax(ExtendedSyntax):
   _extended_predicate_op_executors_: \
       typing.Dict[typing.Type[SimpleOp], typing.Callable[[typing.Any], typing.Callable]] = \
         {ToOp: get_to_op_executor()}
+  _extended_batch_op_executors_: \
+      typing.Dict[typing.Type[SimpleOp], typing.Callable[[typing.Any], typing.Callable]] = \
+        {ToOp: batch_to_op}
   _extended_relation_op_schema_: \
       typing.Dict[typing.Type[SuperRelationalOp], typing.Callable[[SuperRelationalOp, 'DataSet'], 'Schema']] = \
         {SimSelectionOp: schema_interpreter.schema_from_relation}
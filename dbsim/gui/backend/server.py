@@ -29,10 +29,12 @@ planner = HeuristicPlanner(max_limit = float('Inf'))
 
 def refreshDatasets():
   dataset.reset()
-  for ds_filename in os.listdir(ds_folder):
-    ds_filepath = os.path.join(ds_folder, ds_filename)
-    ds_name = ds_filename.split('.')[0]
-    dataset.add_adapter(AdapterFactory.fromFile(ds_filepath, ds_name))
+  ds_filenames = os.listdir(ds_folder)
+  ds_filepaths = [os.path.join(ds_folder, ds_filename) for ds_filename in ds_filenames]
+  ds_names = [ds_filename.split('.')[0] for ds_filename in ds_filenames]
+  # the files are parsed in parallel by a pool of processes
+  for adapter in AdapterFactory.fromFiles(ds_filepaths, ds_names):
+    dataset.add_adapter(adapter)
 
 def initialize():
   registry.initRegistry()
@@ -0,0 +1,506 @@
+"""
+Cardinality estimation of logical plans based on the statistics maintained by adapters
+  (see dbsim.statistics) and simple predicate selectivity models.
+
+The estimation never executes the plan,
+  so it is cheap enough to be run for every equivalent plan generated by the planner.
+When the statistics of a column are unavailable,
+  the selectivity falls back to the default values below.
+
+The distance thresholds over vectors, like 'column TO q < r' (ToOp, see extensions.extended_syntax.sim_select_syntax),
+  are estimated from the distance distribution of the vector column (see statistics.DistanceDistribution).
+"""
+import typing
+from numbers import Number
+from typing import List, Callable
+
+from ...ast import *
+from ...statistics import ColumnStatistics, TableStatistics, DistanceDistribution
+from ...utils import *
+from ...utils.exceptions import *
+from ...utils.logger import Logger
+
+logger = Logger.general_logger
+
+DEFAULT_ROW_COUNT: float = 1000.0
+"""Number of rows assumed for a relation whose size is unknown"""
+DEFAULT_EQ_SELECTIVITY: float = 0.005
+DEFAULT_RANGE_SELECTIVITY: float = 1.0 / 3
+DEFAULT_MATCH_SELECTIVITY: float = 0.1
+"""Selectivity of pattern matching predicates, like LIKE and REGEXP"""
+DEFAULT_SELECTIVITY: float = 1.0 / 3
+"""Selectivity of the predicates without any selectivity model"""
+DEFAULT_NUM_GROUPS: float = 200.0
+
+class PlanEstimate(object):
+  """
+  The estimated output of a plan node:
+    the number of rows and the statistics of each output column
+    (None for the columns not directly derived from a base table column).
+  """
+  __slots__ = ('rows', 'columns')
+
+  def __init__(self, rows: float, columns: List[ColumnStatistics]):
+    self.rows = rows
+    self.columns = columns
+
+class CardinalityEstimator(object):
+  """
+  Estimates the number of output rows of each relational operator in a resolved plan.
+
+  The estimates are cached by node, so the plans should not be modified while being estimated.
+
+  Parameters
+  ------------
+  dataset: the dataset providing the relations in the plans (optional)
+  sampler: a SamplingEstimator (see planners.cost.sampling) used for the predicates 
+            that the selectivity models cannot handle, like ToOp distance thresholds (optional)
+  """
+
+  def __init__(self, dataset = None, sampler = None):
+    self.dataset = dataset
+    self.sampler = sampler
+    self._estimates: typing.Dict[int, typing.Tuple[Expr, PlanEstimate]] = dict()
+
+  def estimate(self, node: Expr) -> PlanEstimate:
+    key = id(node)
+    if key not in self._estimates:
+      # keeps a reference to the node, so that its id cannot be reused by another node
+      self._estimates[key] = (node, self._estimate(node))
+    return self._estimates[key][1]
+
+  def rows(self, node: Expr) -> float:
+    """Returns the estimated number of output rows of the given plan node"""
+    return self.estimate(node).rows
+
+  def _estimate(self, node: Expr) -> PlanEstimate:
+    if isinstance(node, Relation):
+      return self.estimateRelation(node)
+    estimate_func = CARDINALITY_MODELS.get(type(node))
+    if estimate_func is not None:
+      return estimate_func(self, node)
+    for op_class, estimate_func in CARDINALITY_MODELS.items():
+      if isinstance(node, op_class):
+        return estimate_func(self, node)
+    # extended operators without a cardinality model:
+    #   passes the (first) input through and applies the selectivity of its predicate, if any
+    children = getChildren(node)
+    ERROR_IF_FALSE(len(children) > 0, "cannot estimate the cardinality of {}".format(getClassNameOfInstance(node)))
+    child = self.estimate(children[0])
+    if hasattr(node, 'bool_op'):
+      rows = self.sampledRows(node)
+      if rows is None:
+        rows = child.rows * self.selectivity(node.bool_op, children[0].schema, child.columns)
+      return PlanEstimate(rows, child.columns)
+    return child
+
+  def estimateRelation(self, relation: Relation) -> PlanEstimate:
+    num_fields = len(relation.schema.fields)
+    stats: TableStatistics = None
+    if relation.adapter is not None:
+      stats = relation.adapter.statistics(relation.name)
+    if stats is not None:
+      return PlanEstimate(
+        float(stats.row_count),
+        [stats.get(f.name) for f in relation.schema.fields]
+      )
+    rows = DEFAULT_ROW_COUNT
+    table = relation.adapter.get_relation(relation.name) if relation.adapter is not None else None
+    if table is not None and hasattr(table, 'size'):
+      try:
+        rows = float(table.size())
+      except NotImplementedError:
+        pass
+    return PlanEstimate(rows, [None] * num_fields)
+
+  def numProcessedRows(self, node: Expr) -> float:
+    """
+    Returns the estimated number of rows processed by the given relational operator,
+      following the same rules as compilers.local.computeCost
+      (e.g., the processed rows of a join are the product of the rows of its two inputs).
+    """
+    if isinstance(node, (LoadOp, Relation, SliceOp)):
+      return 0.0
+    if isinstance(node, JoinOp):
+      return self.rows(node.left) * self.rows(node.right)
+    if isinstance(node, GroupByOp) and len(node.exprs) == 0:
+      # aggregating the whole table consumes the input without sorting it
+      return 0.0
+    return sum(self.rows(child) for child in getChildren(node))
+
+  def column(self, expr: Expr, schema, columns: List[ColumnStatistics]) -> ColumnStatistics:
+    """Returns the statistics of the column referred by 'expr', or None if unknown"""
+    if not isinstance(expr, Var) or schema is None:
+      return None
+    try:
+      return columns[schema.field_position(expr.path)]
+    except (FieldNotFoundError, AmbigousFieldError, IndexError):
+      return None
+
+  def isModeled(self, bool_op: Expr, schema = None, columns: List[ColumnStatistics] = None) -> bool:
+    """
+    Returns True if the selectivity of every (sub-)predicate in 'bool_op' can be estimated from statistics,
+      where the distances to the vectors of a column (ToOp) are modeled
+      if the distance distribution of the column is known from 'schema' and 'columns'.
+    """
+    nodes = [bool_op]
+    while len(nodes) > 0:
+      node = nodes.pop()
+      if isInstanceByClassName(node, 'ToOp') and distance_distribution(self, node, schema, columns)[0] is not None:
+        continue
+      if type(node) not in MODELED_PREDICATE_OPS:
+        return False
+      nodes.extend(getChildren(node))
+    return True
+
+  def sampledRows(self, operation: Expr) -> float:
+    """
+    Estimates the output rows of an operator with a predicate ('bool_op') by sampling,
+      if a sampler is given and the predicate cannot be handled by the selectivity models.
+    Otherwise returns None.
+    """
+    bool_op = operation.bool_op
+    if self.sampler is None or bool_op is None:
+      return None
+    if isinstance(operation, JoinOp):
+      schema, columns = operation.schema, self.estimate(operation.left).columns + self.estimate(operation.right).columns
+    else:
+      child = getChildren(operation)[0]
+      schema, columns = child.schema, self.estimate(child).columns
+    if self.isModeled(bool_op, schema, columns):
+      return None
+    if any(isinstance(node, ParamGetterOp) for node in traverse(bool_op)):
+      # the values of the parameters are unknown until the query is executed
+      return None
+    try:
+      return self.sampler.estimate(operation).rows
+    except Exception as e:
+      logger.debug("failed to estimate the cardinality of {} by sampling: {}".format(str(operation), e))
+      return None
+
+  def selectivity(self, bool_op: Expr, schema, columns: List[ColumnStatistics]) -> float:
+    """
+    Estimates the fraction of the input rows satisfying the predicate 'bool_op',
+      where 'schema' and 'columns' describe the input rows of the predicate.
+    """
+    if bool_op is None:
+      return 1.0
+    model = SELECTIVITY_MODELS.get(type(bool_op))
+    if model is None:
+      return DEFAULT_SELECTIVITY
+    try:
+      selectivity = model(self, bool_op, schema, columns)
+    except TypeError:
+      # e.g., comparing a constant with column statistics of another type
+      return DEFAULT_SELECTIVITY
+    return min(max(selectivity, 0.0), 1.0)
+
+
+def const_value(expr: Expr) -> typing.Tuple[bool, typing.Any]:
+  """Returns (True, value) if 'expr' is a constant with known value, otherwise (False, None)"""
+  if isinstance(expr, (NumberConst, StringConst, BoolConst, NullConst)):
+    return True, expr.const
+  return False, None
+
+def not_null_fraction(column: ColumnStatistics) -> float:
+  return 1.0 - column.null_fraction()
+
+def distinct_count(column: ColumnStatistics) -> float:
+  ndv = column.distinct_count
+  return max(ndv, 1.0) if ndv is not None else None
+
+MIRRORED_COMPARISONS = {
+  LtOp: GtOp,
+  LeOp: GeOp,
+  GtOp: LtOp,
+  GeOp: LeOp,
+  EqOp: EqOp,
+  NeOp: NeOp,
+}
+
+def equality_selectivity(column: ColumnStatistics, value) -> float:
+  if column is None or column.count == 0:
+    return DEFAULT_EQ_SELECTIVITY if column is None else 0.0
+  if column.min is not None and (value < column.min or value > column.max):
+    return 0.0
+  ndv = distinct_count(column)
+  if ndv is None:
+    return DEFAULT_EQ_SELECTIVITY
+  return not_null_fraction(column) / ndv
+
+def range_selectivity(column: ColumnStatistics, op_class, value) -> float:
+  if column is None or column.histogram is None:
+    return DEFAULT_RANGE_SELECTIVITY
+  histogram = column.histogram
+  if op_class in (LtOp, LeOp):
+    fraction = histogram.rangeFraction(high=value, high_inclusive=(op_class == LeOp))
+  else:
+    fraction = histogram.rangeFraction(low=value, low_inclusive=(op_class == GeOp))
+  return not_null_fraction(column) * fraction
+
+def column_range_selectivity(column: ColumnStatistics, column_range) -> float:
+  """Selectivity of the values of the column within the range (see storage.ranges.ColumnRange)"""
+  if column_range.isEmpty():
+    return 0.0
+  if column_range.isPoint():
+    return equality_selectivity(column, column_range.low)
+  if column is None or column.histogram is None:
+    return DEFAULT_RANGE_SELECTIVITY
+  fraction = column.histogram.rangeFraction(
+    column_range.low, column_range.high, column_range.low_inclusive, column_range.high_inclusive
+  )
+  return not_null_fraction(column) * fraction
+
+def column_pair_equality_selectivity(lhs: ColumnStatistics, rhs: ColumnStatistics) -> float:
+  """
+  Selectivity of 'lhs = rhs' where both sides are columns, e.g., equi-join conditions,
+    assuming the values of the side with fewer distinct values are all contained by the other side.
+  """
+  if lhs is None or rhs is None:
+    return DEFAULT_EQ_SELECTIVITY
+  ndv_lhs, ndv_rhs = distinct_count(lhs), distinct_count(rhs)
+  if ndv_lhs is None or ndv_rhs is None:
+    return DEFAULT_EQ_SELECTIVITY
+  return not_null_fraction(lhs) * not_null_fraction(rhs) / max(ndv_lhs, ndv_rhs)
+
+def distance_distribution(
+  estimator: CardinalityEstimator, distance: Expr, schema, columns
+) -> typing.Tuple[DistanceDistribution, ColumnStatistics, Expr]:
+  """
+  Returns the distance distribution and the statistics of the vector column of 'column TO q' (or 'q TO column'),
+    and the expression of the query vector q, where the distribution is None if unknown.
+  """
+  column, query = distance.lhs, distance.rhs
+  if not isinstance(column, Var):
+    column, query = query, column
+  stats = estimator.column(column, schema, columns)
+  if stats is None or isinstance(query, Var):
+    return None, stats, query
+  return stats.distance_distribution, stats, query
+
+def distance_selectivity(estimator: CardinalityEstimator, distance: Expr, op_class, radius, schema, columns) -> float:
+  """Selectivity of 'column TO q op radius', estimated from the distance distribution of the column"""
+  distribution, stats, query = distance_distribution(estimator, distance, schema, columns)
+  if distribution is None or not isinstance(radius, Number):
+    return DEFAULT_EQ_SELECTIVITY if op_class == EqOp else DEFAULT_RANGE_SELECTIVITY
+  # the query vector is unknown if it is not a constant, e.g., a parameter
+  query_vector = query.const if isInstanceByClassName(query, 'Vector') else None
+  if op_class in (LtOp, LeOp):
+    fraction = distribution.fraction(radius, query_vector, inclusive=(op_class == LeOp))
+  elif op_class in (GtOp, GeOp):
+    fraction = 1.0 - distribution.fraction(radius, query_vector, inclusive=(op_class == GtOp))
+  elif op_class == EqOp:
+    fraction = DEFAULT_EQ_SELECTIVITY
+  else:
+    fraction = 1.0 - DEFAULT_EQ_SELECTIVITY
+  return not_null_fraction(stats) * fraction
+
+def comparison_selectivity(estimator: CardinalityEstimator, bool_op: BinaryOp, schema, columns) -> float:
+  op_class = type(bool_op)
+  lhs, rhs = bool_op.lhs, bool_op.rhs
+  if (not isinstance(lhs, Var) and isinstance(rhs, Var)) or isInstanceByClassName(rhs, 'ToOp'):
+    # normalizes 'const op column' into 'column op const'
+    lhs, rhs, op_class = rhs, lhs, MIRRORED_COMPARISONS[op_class]
+  if isInstanceByClassName(lhs, 'ToOp'):
+    is_const, radius = const_value(rhs)
+    return distance_selectivity(estimator, lhs, op_class, radius if is_const else None, schema, columns)
+  column = estimator.column(lhs, schema, columns)
+  is_const, value = const_value(rhs)
+  if isinstance(lhs, Var) and isinstance(rhs, Var):
+    other = estimator.column(rhs, schema, columns)
+    if op_class == EqOp:
+      return column_pair_equality_selectivity(column, other)
+    if op_class == NeOp:
+      return 1.0 - column_pair_equality_selectivity(column, other)
+    return DEFAULT_RANGE_SELECTIVITY
+  if not isinstance(lhs, Var) or not is_const or value is None:
+    return DEFAULT_EQ_SELECTIVITY if op_class == EqOp else DEFAULT_SELECTIVITY
+  if op_class == EqOp:
+    return equality_selectivity(column, value)
+  if op_class == NeOp:
+    if column is None:
+      return 1.0 - DEFAULT_EQ_SELECTIVITY
+    return not_null_fraction(column) - equality_selectivity(column, value)
+  return range_selectivity(column, op_class, value)
+
+def between_selectivity(estimator: CardinalityEstimator, bool_op: BetweenOp, schema, columns) -> float:
+  column = estimator.column(bool_op.expr, schema, columns)
+  (is_low_const, low), (is_high_const, high) = const_value(bool_op.lhs), const_value(bool_op.rhs)
+  if column is None or column.histogram is None or not (is_low_const and is_high_const):
+    return DEFAULT_RANGE_SELECTIVITY
+  return not_null_fraction(column) * column.histogram.rangeFraction(low, high)
+
+def in_selectivity(estimator: CardinalityEstimator, bool_op: InOp, schema, columns) -> float:
+  if not isinstance(bool_op.rhs, Tuple):
+    return DEFAULT_SELECTIVITY
+  column = estimator.column(bool_op.lhs, schema, columns)
+  selectivity = 0.0
+  for expr in set_of_const_exprs(bool_op.rhs.exprs):
+    is_const, value = const_value(expr)
+    if is_const and value is not None:
+      selectivity += equality_selectivity(column, value)
+    else:
+      selectivity += DEFAULT_EQ_SELECTIVITY
+  return selectivity
+
+def set_of_const_exprs(exprs) -> List[Expr]:
+  """Removes the duplicated constants in the list of an IN predicate"""
+  seen, unique_exprs = set(), []
+  for expr in exprs:
+    is_const, value = const_value(expr)
+    key = (type(expr), value) if is_const else id(expr)
+    if key not in seen:
+      seen.add(key)
+      unique_exprs.append(expr)
+  return unique_exprs
+
+def is_null_selectivity(estimator: CardinalityEstimator, bool_op: BinaryOp, schema, columns) -> float:
+  if not isinstance(bool_op.rhs, NullConst):
+    return DEFAULT_SELECTIVITY
+  column = estimator.column(bool_op.lhs, schema, columns)
+  null_fraction = column.null_fraction() if column is not None else DEFAULT_EQ_SELECTIVITY
+  return null_fraction if isinstance(bool_op, IsOp) else 1.0 - null_fraction
+
+def and_selectivity(estimator: CardinalityEstimator, bool_op: And, schema, columns) -> float:
+  # assumes the conjuncts are independent
+  return estimator.selectivity(bool_op.lhs, schema, columns) * estimator.selectivity(bool_op.rhs, schema, columns)
+
+def or_selectivity(estimator: CardinalityEstimator, bool_op: Or, schema, columns) -> float:
+  lhs = estimator.selectivity(bool_op.lhs, schema, columns)
+  rhs = estimator.selectivity(bool_op.rhs, schema, columns)
+  return lhs + rhs - lhs * rhs
+
+def not_selectivity(estimator: CardinalityEstimator, bool_op: NotOp, schema, columns) -> float:
+  return 1.0 - estimator.selectivity(bool_op.expr, schema, columns)
+
+SELECTIVITY_MODELS: typing.Dict[typing.Type[Expr], Callable] = {
+  EqOp: comparison_selectivity,
+  NeOp: comparison_selectivity,
+  LtOp: comparison_selectivity,
+  LeOp: comparison_selectivity,
+  GtOp: comparison_selectivity,
+  GeOp: comparison_selectivity,
+  BetweenOp: between_selectivity,
+  InOp: in_selectivity,
+  IsOp: is_null_selectivity,
+  IsNotOp: is_null_selectivity,
+  LikeOp: lambda estimator, bool_op, schema, columns: DEFAULT_MATCH_SELECTIVITY,
+  RLikeOp: lambda estimator, bool_op, schema, columns: DEFAULT_MATCH_SELECTIVITY,
+  RegExpOp: lambda estimator, bool_op, schema, columns: DEFAULT_MATCH_SELECTIVITY,
+  NotLikeOp: lambda estimator, bool_op, schema, columns: 1.0 - DEFAULT_MATCH_SELECTIVITY,
+  NotRLikeOp: lambda estimator, bool_op, schema, columns: 1.0 - DEFAULT_MATCH_SELECTIVITY,
+  And: and_selectivity,
+  Or: or_selectivity,
+  NotOp: not_selectivity,
+  TrueConst: lambda estimator, bool_op, schema, columns: 1.0,
+  FalseConst: lambda estimator, bool_op, schema, columns: 0.0,
+}
+"""
+SELECTIVITY_MODELS stores the mapping: predicate operator -> the function estimating its selectivity,
+  where the function is called as 'func(estimator, bool_op, schema, columns)'.
+Extended predicate operators can register their own models by 'addSelectivityModels'.
+"""
+
+MODELED_PREDICATE_OPS = set(SELECTIVITY_MODELS.keys()) | set([Var, NumberConst, StringConst, NullConst, Tuple])
+"""Types of the nodes that can appear in the predicates handled by the selectivity models"""
+
+def addSelectivityModels(models: typing.Dict[typing.Type[Expr], Callable]) -> None:
+  global SELECTIVITY_MODELS
+  SELECTIVITY_MODELS.update(models)
+  MODELED_PREDICATE_OPS.update(models.keys())
+
+def removeSelectivityModels(models: typing.Dict[typing.Type[Expr], Callable]) -> None:
+  global SELECTIVITY_MODELS
+  for op_class, model in models.items():
+    if SELECTIVITY_MODELS.get(op_class) is model:
+      del SELECTIVITY_MODELS[op_class]
+      MODELED_PREDICATE_OPS.discard(op_class)
+
+
+def selection_cardinality(estimator: CardinalityEstimator, operation: SelectionOp) -> PlanEstimate:
+  child = estimator.estimate(operation.relation)
+  rows = estimator.sampledRows(operation)
+  if rows is None:
+    rows = child.rows * estimator.selectivity(operation.bool_op, operation.relation.schema, child.columns)
+  return PlanEstimate(rows, child.columns)
+
+def projection_cardinality(estimator: CardinalityEstimator, operation: ProjectionOp) -> PlanEstimate:
+  child = estimator.estimate(operation.relation)
+  schema = operation.relation.schema
+  dataset = estimator.dataset
+  if dataset is not None and all(
+    isinstance(getattr(expr, 'expr', expr), Function) and getattr(expr, 'expr', expr).name in dataset.aggregates
+    for expr in operation.exprs
+  ):
+    # aggregates over the whole input, see compilers.local.ensure_group_op_when_ags
+    return PlanEstimate(min(child.rows, 1.0), [None] * len(operation.exprs))
+  columns = []
+  for expr in operation.exprs:
+    if isinstance(expr, SelectAllExpr):
+      columns.extend(
+        column
+        for f, column in zip(schema.fields, child.columns)
+        if expr.table is None or f.schema_name == expr.table
+      )
+    else:
+      if isinstance(expr, RenameOp):
+        expr = expr.expr
+      columns.append(estimator.column(expr, schema, child.columns))
+  if operation.schema is not None and len(columns) != len(operation.schema.fields):
+    columns = [None] * len(operation.schema.fields)
+  return PlanEstimate(child.rows, columns)
+
+def join_cardinality(estimator: CardinalityEstimator, operation: JoinOp) -> PlanEstimate:
+  left, right = estimator.estimate(operation.left), estimator.estimate(operation.right)
+  columns = left.columns + right.columns
+  rows = estimator.sampledRows(operation)
+  if rows is None:
+    rows = left.rows * right.rows * estimator.selectivity(operation.bool_op, operation.schema, columns)
+  if isinstance(operation, LeftJoinOp):
+    # each row of the left input is output at least once
+    rows = max(rows, left.rows)
+  return PlanEstimate(rows, columns)
+
+def union_all_cardinality(estimator: CardinalityEstimator, operation: UnionAllOp) -> PlanEstimate:
+  left, right = estimator.estimate(operation.left), estimator.estimate(operation.right)
+  return PlanEstimate(left.rows + right.rows, [None] * len(left.columns))
+
+def group_by_cardinality(estimator: CardinalityEstimator, operation: GroupByOp) -> PlanEstimate:
+  child = estimator.estimate(operation.relation)
+  schema = operation.relation.schema
+  if len(operation.exprs) == 0:
+    return PlanEstimate(min(child.rows, 1.0), child.columns)
+  num_groups = 1.0
+  for expr in operation.exprs:
+    column = estimator.column(expr, schema, child.columns)
+    ndv = distinct_count(column) if column is not None else None
+    num_groups *= ndv if ndv is not None else DEFAULT_NUM_GROUPS
+  return PlanEstimate(min(num_groups, child.rows), child.columns)
+
+def slice_cardinality(estimator: CardinalityEstimator, operation: SliceOp) -> PlanEstimate:
+  child = estimator.estimate(operation.relation)
+  start = operation.start or 0
+  rows = max(child.rows - start, 0.0)
+  if operation.stop is not None:
+    rows = min(rows, max(operation.stop - start, 0))
+  return PlanEstimate(float(rows), child.columns)
+
+def pass_through_cardinality(estimator: CardinalityEstimator, operation: RelationalOp) -> PlanEstimate:
+  return estimator.estimate(operation.relation)
+
+CARDINALITY_MODELS: typing.Dict[typing.Type[Expr], Callable] = {
+  SelectionOp: selection_cardinality,
+  ProjectionOp: projection_cardinality,
+  JoinOp: join_cardinality,
+  UnionAllOp: union_all_cardinality,
+  GroupByOp: group_by_cardinality,
+  SliceOp: slice_cardinality,
+  AliasOp: pass_through_cardinality,
+  OrderByOp: pass_through_cardinality,
+}
+"""
+CARDINALITY_MODELS stores the mapping: relational operator -> the function estimating its output,
+  where the function is called as 'func(estimator, operation)' and returns a PlanEstimate.
+The operators are matched by isinstance,
+  e.g., SimSelectionOp is estimated as a SelectionOp unless it registers its own model.
+"""
@@ -1,7 +1,17 @@
+from enum import Enum
+
 from ...ast import *
 from ...compilers import local as main_compiler
 from ...dataset import DataSet
 from ...query import Query
+from .cardinality import CardinalityEstimator
+from .sampling import SamplingEstimator
+
+class CostMode(Enum):
+  ESTIMATE = 1
+  """Estimates the number of processed rows from the statistics of the input relations"""
+  CALIBRATE = 2
+  """Executes the plan and counts the actual number of processed rows"""
 
 class LogicalCost(object):
   """
@@ -72,7 +82,7 @@ class LogicalCost(object):
     
 
   @classmethod
-  def getCost(cls, plan: Expr, dataset: DataSet) -> 'LogicalCost':
+  def getCost(cls, plan: Expr, dataset: DataSet = None, mode: CostMode = CostMode.ESTIMATE) -> 'LogicalCost':
     """
     Computes and returns the logical cost of the given plan.
     Formula:
@@ -89,11 +99,37 @@ class LogicalCost(object):
         (1) for union, its number_of_processed_rows is the summation of the #rows output by two children;
         (2) for join, instead of summation, the number_of_processed_rows is the multiplication of the #rows output by two children
       etc.
+
+    Parameters
+    ------------
+    plan: the resolved plan
+    dataset: the dataset providing the relations in the plan, required by CostMode.CALIBRATE 
+    mode: with CostMode.ESTIMATE (default), the numbers of processed rows are estimated 
+            from the statistics of the relations without executing the plan (see planners.cost.cardinality),
+            except that, if the dataset is given, the predicates that cannot be modeled by statistics
+            are estimated over samples of the relations (see planners.cost.sampling);
+          with CostMode.CALIBRATE, the plan is executed and the actual numbers of processed rows are counted,
+            which is exact but as expensive as running the query.
     """
     ERROR_IF_FALSE(
       plan.isResolved(), 
       "requires a resolved plan (unresolved plan received)"
     )
+    if mode == CostMode.CALIBRATE:
+      return cls.getCalibratedCost(plan, dataset)
+    sampler = SamplingEstimator(dataset) if dataset is not None else None
+    estimator = CardinalityEstimator(dataset, sampler)
+    cost = 0.0
+    for node in traverse(plan):
+      cost_factor = node.getCostFactor()
+      if cost_factor is not None:
+        cost += estimator.numProcessedRows(node) * cost_factor
+    return cls(cost)
+
+  @classmethod
+  def getCalibratedCost(cls, plan: Expr, dataset: DataSet) -> 'LogicalCost':
+    """Computes the logical cost of the given plan by executing it"""
+    ERROR_IF_NONE(dataset, "requires the dataset to execute the plan for calibrating its cost")
     ctx = {
       'dataset': dataset
     }
@@ -104,4 +140,3 @@ class LogicalCost(object):
     for num_processed_rows, cost_factor in ctx[stat_info_field][cost_info_field]:
       cost += num_processed_rows * cost_factor
     return cls(cost)
-  
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+Sampling-based cardinality estimation.
+
+Plan fragments are executed against a Bernoulli sample of each base relation,
+  and the number of output rows is scaled up by the sampling rates.
+Unlike the estimation from statistics (see planners.cost.cardinality),
+  it works for any predicate that can be executed,
+  e.g., distance thresholds over vectors (ToOp) and spatial containment (InsideOp),
+  at the cost of executing the fragment over the samples.
+
+The samples are drawn with a fixed seed, so the estimates are reproducible,
+  and cached per relation, so each base relation is scanned only once.
+"""
+import math
+import typing
+import weakref
+from itertools import islice
+from statistics import NormalDist
+from typing import List
+
+import numpy as np
+
+from ...ast import *
+from ...query import Query
+from ...utils import *
+
+class Sample(object):
+  """A Bernoulli sample of a base relation"""
+  __slots__ = ('rows', 'num_total_rows')
+
+  def __init__(self, rows: List[typing.Tuple], num_total_rows: int):
+    self.rows = rows
+    self.num_total_rows = num_total_rows
+
+  @property
+  def rate(self) -> float:
+    """The effective sampling rate"""
+    if self.num_total_rows == 0:
+      return 1.0
+    return len(self.rows) / self.num_total_rows
+
+class SampleEstimate(object):
+  """
+  The estimated number of output rows of a plan fragment
+    and its confidence interval [low, high] at the given confidence level.
+  """
+  __slots__ = ('rows', 'low', 'high', 'confidence', 'num_sample_rows')
+
+  def __init__(self, rows: float, low: float, high: float, confidence: float, num_sample_rows: int):
+    self.rows = rows
+    self.low = low
+    self.high = high
+    self.confidence = confidence
+    self.num_sample_rows = num_sample_rows
+    """Number of output rows of the fragment over the samples"""
+
+  def __repr__(self):
+    return "SampleEstimate(rows={:.1f}, {:.0%} CI=[{:.1f}, {:.1f}])"\
+      .format(self.rows, self.confidence, self.low, self.high)
+
+def wilson_interval(num_successes: int, num_trials: float, confidence: float) -> typing.Tuple[float, float]:
+  """Wilson score interval of the success probability of a binomial distribution"""
+  if num_trials <= 0:
+    return 0.0, 1.0
+  z = NormalDist().inv_cdf(0.5 + confidence / 2)
+  p = min(num_successes / num_trials, 1.0)
+  denominator = 1 + z * z / num_trials
+  center = (p + z * z / (2 * num_trials)) / denominator
+  margin = z * math.sqrt(p * (1 - p) / num_trials + z * z / (4 * num_trials * num_trials)) / denominator
+  return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+class SamplingEstimator(object):
+  """
+  Estimates the cardinalities of plan fragments over samples of the base relations.
+
+  Parameters
+  ------------
+  dataset: the dataset used to execute the plan fragments
+  fraction: the sampling rate of each base relation
+  min_sample_size: the expected minimum number of rows in a sample,
+                    i.e., relations with less than 'min_sample_size / fraction' rows are sampled at a higher rate
+                    (and relations with less than 'min_sample_size' rows are fully copied into the sample).
+  seed: seed of the random generator drawing the samples
+  confidence: the confidence level of the reported intervals
+  """
+  _samples = weakref.WeakKeyDictionary()
+  """Cache of the samples shared by all estimators: adapter -> dict((relation name, table version, fraction, min_sample_size, seed) -> Sample)"""
+  scan_batch_size = 4096
+
+  def __init__(
+    self, dataset, fraction: float = 0.01, min_sample_size: int = 100,
+    seed: int = 0, confidence: float = 0.95
+  ):
+    ERROR_IF_FALSE(0 < fraction <= 1, "the sampling fraction must be in (0, 1] ({} received)".format(fraction))
+    ERROR_IF_FALSE(0 < confidence < 1, "the confidence level must be in (0, 1) ({} received)".format(confidence))
+    self.dataset = dataset
+    self.fraction = fraction
+    self.min_sample_size = min_sample_size
+    self.seed = seed
+    self.confidence = confidence
+
+  @classmethod
+  def clearCache(cls) -> None:
+    cls._samples = weakref.WeakKeyDictionary()
+
+  def sample(self, relation: Relation) -> Sample:
+    """Returns the (cached) sample of the given base relation"""
+    table = relation.adapter.get_relation(relation.name) if relation.adapter is not None else None
+    # the sample is redrawn once rows are appended to the table
+    version = getattr(table, 'version', None)
+    key = (relation.name, version, self.fraction, self.min_sample_size, self.seed)
+    samples = self._samples.setdefault(relation.adapter, dict()) if relation.adapter is not None else dict()
+    if key not in samples:
+      for stale_key in [k for k in samples if k[0] == relation.name and k[1] != version]:
+        del samples[stale_key]
+      samples[key] = self._drawSample(relation)
+    return samples[key]
+
+  def _drawSample(self, relation: Relation) -> Sample:
+    rate = self.fraction
+    table = relation.adapter.get_relation(relation.name) if relation.adapter is not None else None
+    if table is not None and hasattr(table, 'size'):
+      # raises the rate for small relations
+      num_rows = table.size()
+      if num_rows > 0:
+        rate = max(rate, min(1.0, self.min_sample_size / num_rows))
+    random = np.random.default_rng(self.seed)
+    records = iter(relation.records({'dataset': self.dataset, 'params': ()}))
+    rows, num_total_rows = [], 0
+    while True:
+      batch = list(islice(records, self.scan_batch_size))
+      if not batch:
+        break
+      num_total_rows += len(batch)
+      if rate >= 1.0:
+        rows.extend(batch)
+      else:
+        rows.extend(batch[i] for i in np.flatnonzero(random.random(len(batch)) < rate))
+    return Sample(rows, num_total_rows)
+
+  def sampledPlan(self, plan: Expr) -> typing.Tuple[Expr, List[Sample]]:
+    """
+    Returns a copy of the given plan whose base relations are replaced by their samples,
+      together with the samples in the plan.
+    """
+    plan = deepCopyAST(plan)
+    samples = []
+    for node, parent, child_idx in list(traverseWithParent(plan)):
+      if not isinstance(node, Relation):
+        continue
+      sample = self.sample(node)
+      samples.append(sample)
+      # the sampled relation has no adapter, so that it is never pushed down to the adapter
+      sampled_relation = Relation(None, node.name, node.schema, lambda ctx, rows=sample.rows: iter(rows))
+      if parent is None:
+        plan = sampled_relation
+      else:
+        children = getChildren(parent)
+        children[child_idx] = sampled_relation
+        setChildren(parent, children, list(range(len(children))))
+    return plan, samples
+
+  def estimate(self, plan: Expr) -> SampleEstimate:
+    """
+    Estimates the number of output rows of the given resolved plan fragment.
+
+    The fragment is expected to consist of operators whose output scales with their inputs,
+      like selections, projections and joins,
+      e.g., the number of groups output by an aggregation cannot be scaled up from a sample.
+
+    For a fragment over a single relation with N rows sampled into n rows,
+      of which k satisfy the fragment, the estimate is N * k / n
+      and the interval is the Wilson score interval of k / n scaled by N.
+    For joins, n and N are the products of the sample sizes and the relation sizes respectively,
+      so the interval is only an approximation as the pairs of sampled rows are not independent.
+    """
+    ERROR_IF_FALSE(plan.isResolved(), "requires a resolved plan (unresolved plan received)")
+    sampled_plan, samples = self.sampledPlan(plan)
+    num_sample_rows = sum(1 for _ in Query(self.dataset, sampled_plan, resolve_op_schema=False))
+    num_trials, num_total = 1.0, 1.0
+    for sample in samples:
+      num_trials *= len(sample.rows)
+      num_total *= sample.num_total_rows
+    if num_trials == 0:
+      return SampleEstimate(0.0, 0.0, num_total, self.confidence, num_sample_rows)
+    selectivity = num_sample_rows / num_trials
+    low, high = wilson_interval(num_sample_rows, num_trials, self.confidence)
+    return SampleEstimate(
+      selectivity * num_total, low * num_total, high * num_total,
+      self.confidence, num_sample_rows
+    )
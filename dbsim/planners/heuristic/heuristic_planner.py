@@ -22,11 +22,19 @@ class PlanMatchOrder(Enum):
   #ReversedTopoOrder = 3
 
 class HeuristicPlanner(Planner):
-  """The rule-based heuristic optimizer"""
-  __slots__ = ("match_order", "rule_seq", "max_num_applications")
+  """
+  The rule-based heuristic optimizer
 
-  def __init__(self, match_order: PlanMatchOrder = PlanMatchOrder.DepthFirstOrder, max_limit: int = 100) -> None:
+  Parameters
+  ------------
+  dataset: the dataset providing the relations of the plans (optional), 
+            used to estimate the costs of the equivalent plans more accurately by sampling the relations
+  """
+  __slots__ = ("match_order", "rule_seq", "max_num_applications", "dataset")
+
+  def __init__(self, match_order: PlanMatchOrder = PlanMatchOrder.DepthFirstOrder, max_limit: int = 100, dataset = None) -> None:
     super().__init__()
+    self.dataset = dataset
     self.match_order: PlanMatchOrder = match_order
     self.rule_seq: List[Rule] = list()
     ERROR_IF_FALSE(max_limit > 0, 
@@ -106,7 +114,7 @@ class HeuristicPlanner(Planner):
       lowest_cost = float('Inf')
       for plan in equiv_plans:
         LogicalCost.refineCostFactors(plan, False)
-        cur_cost = LogicalCost.getCost(plan).toNumeric()
+        cur_cost = LogicalCost.getCost(plan, self.dataset).toNumeric()
         if cur_cost < lowest_cost:
           best_plan = plan
           lowest_cost = cur_cost
@@ -172,11 +172,11 @@ class ParsersBundle:
         continue
     ERROR_IF_NONE(res, "could not parse tokens {} by any parser of level {}".format(tokens, self.predicate_level), SQLSyntaxError)
     # make tokens the same as tokens_copy
-    #   such that the next parsers can continue from the latest status of tokens
-    if self.predicate_level in (PredExprLevel.FUNC, PredExprLevel.VAR):
-      parser(name, tokens)
-    else:
-      parser(tokens)
+    #   such that the next parsers can continue from the latest status of tokens.
+    # The consumed tokens are copied back instead of parsing the tokens again,
+    #   as parsing again at every level would double the work per level of nested expressions, 
+    #   e.g., the arguments of function calls.
+    tokens[:] = tokens_copy
     return res
 
   def add(self, syntax_name: str, parser: Callable[[TokenList], Expr], block_error: bool = not BLOCK_ERROR):
@@ -347,7 +347,9 @@ def value_exp(tokens):
   elif token[0] in ("'",'"'):
     return StringConst(token[1:-1])
   elif token == '(':
-    return parse_tuple(tokens)
+    expr = parse_tuple(tokens)
+    # a single parenthesized expression, e.g., '(a or b) and c', only groups the expression
+    return expr.exprs[0] if len(expr.exprs) == 1 else expr
   elif token.lower() == 'case':
     return case_when_core_exp(tokens)
   elif token.lower() == 'cast':
@@ -654,9 +656,10 @@ def where_core_expr(tokens, relation):
 def order_by_core_expr(tokens):
   columns = []
 
-  parse_value = predicate_parsers[PredExprLevel.VALUE]
+  # the columns may be expressions, e.g., the distances to a vector like 'embedding TO [1, 2]'
+  parse_additive = predicate_parsers[PredExprLevel.ADD]
   while tokens and tokens[0] not in terminators:
-    col = parse_value(tokens)
+    col = parse_additive(tokens)
     if tokens: 
       if tokens[0].lower() == "desc":
         col = Desc(col)
@@ -810,6 +813,7 @@ def select_stmt(
     stop = parse_value(tokens).const
 
   if tokens and tokens[0] == 'offset':
+    tokens.pop(0)
     start = parse_value(tokens).const
     if stop is not None:
       stop += start
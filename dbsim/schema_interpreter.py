@@ -4,7 +4,7 @@ Module used to interpret the AST into a schema based on a given relation.
 import typing
 
 from dbsim.utils import ERROR_IF_NOT_INSTANCE_OF, getClassNameOfClass
-from dbsim.utils.exceptions import ExtensionInternalError
+from dbsim.utils.exceptions import ExtensionInternalError, FieldNotFoundError, AmbigousFieldError
 
 from . import Relation
 from .schema import Schema,JoinSchema
@@ -13,8 +13,8 @@ from .operations import walk, visit_with, is_not
 from .field import Field, FieldType
 from .ast import (
   Expr, ProjectionOp, SelectionOp, GroupByOp, RenameOp, LoadOp,
-  JoinOp, LeftJoinOp, SuperRelationalOp, UnionAllOp,
-  Var, Function, 
+  JoinOp, LeftJoinOp, SuperRelationalOp, UnionAllOp, OrderByOp, SliceOp,
+  Var, Function, traverse,
   Const, UnaryOp, BinaryOp, AliasOp, SelectAllExpr,
   NumberConst, StringConst, BoolConst, NullConst, ParamGetterOp
 )
@@ -181,6 +181,58 @@ def schema_from_union_all(operation, dataset):
 
   return l_schema
 
+def resolve_order_by_op(operation, dataset):
+  """
+  Resolves the schema of an ORDER BY, which is moved under the projection it is over (see orderable_below)
+    if it orders by columns of the input of the projection that are not projected, 
+    e.g., 'select item_id from items order by embedding to [1, 2] limit 10'.
+  """
+  projection = operation.relation
+  if isinstance(projection, ProjectionOp) and orderable_below(projection, operation.exprs, dataset):
+    order_by = operation.new(relation=projection.relation, schema=projection.relation.schema)
+    return projection.new(relation=order_by)
+  return replace_schema(operation, projection.schema)
+
+def resolve_slice_op(operation, dataset):
+  """
+  Resolves the schema of a LIMIT, which is moved under the projection it is over 
+    when the projection is over an ORDER BY moved by resolve_order_by_op, 
+    so that the LIMIT stays right above the ORDER BY.
+  """
+  projection = operation.relation
+  if isinstance(projection, ProjectionOp) and isinstance(projection.relation, OrderByOp) \
+      and not has_aggregates(projection, dataset):
+    limit = operation.new(relation=projection.relation, schema=projection.relation.schema)
+    return projection.new(relation=limit)
+  return replace_schema(operation, projection.schema)
+
+def orderable_below(projection, exprs, dataset) -> bool:
+  """
+  Checks whether ordering by the expressions under the projection gives the same result, 
+    i.e., the projection keeps the rows one by one, the expressions are over the columns of its input, 
+    and they either refer to columns which are not projected or the projection only selects columns as they are.
+  """
+  if has_aggregates(projection, dataset) or not all(resolvable(expr, projection.relation.schema) for expr in exprs):
+    return False
+  return not all(resolvable(expr, projection.schema) for expr in exprs) or \
+    all(isinstance(expr, (Var, SelectAllExpr)) for expr in projection.exprs)
+
+def has_aggregates(projection, dataset) -> bool:
+  return any(
+    isinstance(expr, Function) and expr.name in dataset.aggregates
+    for expr in (e.expr if isinstance(e, RenameOp) else e for e in projection.exprs)
+  )
+
+def resolvable(expr, schema) -> bool:
+  """Checks whether all the columns in the expression are fields of the schema"""
+  for node in traverse(expr):
+    if isinstance(node, Var):
+      try:
+        schema.field_position(node.path)
+      except (FieldNotFoundError, AmbigousFieldError):
+        return False
+  return True
+
 def schema_from_join_op(join_op, dataset):
   left  =  join_op.left.schema
   right =  join_op.right.schema
@@ -317,6 +369,8 @@ op_type_to_update_schema_func = {
   UnionAllOp: update_op_schema(schema_from_union_all),
   JoinOp: update_op_schema(schema_from_join_op),
   LeftJoinOp: update_op_schema(schema_from_join_op),
+  OrderByOp: resolve_order_by_op,
+  SliceOp: resolve_slice_op,
 
   Function: schema_from_function_op,
 }
@@ -0,0 +1,388 @@
+"""
+Table statistics used for estimating the cardinalities of plans without executing them.
+
+The statistics of a table consist of its row count and, for each column,
+  the null count, min/max, a distinct-count sketch and an equi-depth histogram,
+  or, for a vector column, the distribution of the distances between its vectors.
+All of them can be updated incrementally as new rows arrive,
+  while the histograms are rebuilt lazily from a reservoir sample of the column.
+"""
+import hashlib
+import math
+import typing
+from bisect import bisect_left, bisect_right
+from numbers import Number
+from typing import List, Dict, Sequence
+
+import numpy as np
+
+from .field import Field
+from .utils import *
+
+ORDERABLE_TYPES = set(['INTEGER', 'FLOAT', 'STRING', 'BOOLEAN', 'DATE', 'DATETIME', 'TIME'])
+"""Names of the field types whose values can be ordered, i.e., have min/max and histograms"""
+
+VECTOR_TYPES = set(['VECTOR'])
+"""Names of the field types whose values are vectors, i.e., have distance distributions"""
+
+def isOrderableField(f: Field) -> bool:
+  type_name = f.type.name if hasattr(f.type, 'name') else str(f.type)
+  return f.mode != 'REPEATED' and type_name in ORDERABLE_TYPES
+
+def isVectorField(f: Field) -> bool:
+  type_name = f.type.name if hasattr(f.type, 'name') else str(f.type)
+  return f.mode != 'REPEATED' and type_name in VECTOR_TYPES
+
+def isNull(value) -> bool:
+  return value is None or (isinstance(value, float) and math.isnan(value))
+
+def toPythonValue(value):
+  """Converts NumPy scalars into the equivalent Python objects"""
+  return value.item() if isinstance(value, np.generic) else value
+
+def splitmix64(values: np.ndarray) -> np.ndarray:
+  """Mixes the bits of uint64 hash values, so that the hashes of consecutive integers look uniformly random"""
+  with np.errstate(over='ignore'):
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def stableHash(value) -> int:
+  """
+  Returns the int64 hash of a value that is the same in every process, raising TypeError for unhashable values.
+
+  The built-in hash() of numbers is not randomized and is kept,
+    while the hashes of strings, bytes, dates etc. are salted per process and are replaced with a digest of their bytes.
+  """
+  if isinstance(value, (bool, int, float)):
+    return hash(value)
+  if isinstance(value, str):
+    data = value.encode('utf-8', 'surrogatepass')
+  elif isinstance(value, bytes):
+    data = value
+  else:
+    hash(value)
+    data = repr(value).encode('utf-8', 'surrogatepass')
+  return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+def hashValues(values: Sequence) -> np.ndarray:
+  """Returns the uint64 hash of each value, which is stable across processes, raising TypeError for unhashable values"""
+  if isinstance(values, np.ndarray) and values.dtype.kind in 'iub':
+    hashes = values.astype(np.int64).view(np.uint64)
+  elif isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+    hashes = values.astype(np.float64).view(np.uint64)
+  else:
+    hashes = np.fromiter((stableHash(v) for v in values), dtype=np.int64, count=len(values)).view(np.uint64)
+  return splitmix64(hashes)
+
+
+class DistinctCountSketch(object):
+  """
+  K-minimum-values sketch for estimating the number of distinct values (NDV) of a column.
+
+  The sketch keeps the k smallest distinct hash values seen so far.
+  When fewer than k distinct hashes have been seen, the count is exact (modulo hash collisions);
+    otherwise the NDV is estimated as (k - 1) / (the k-th smallest hash normalized into [0, 1)).
+  Sketches are updated incrementally and can be merged.
+  """
+  __slots__ = ('k', 'mins')
+
+  def __init__(self, k: int = 1024):
+    self.k = k
+    self.mins = np.empty(0, dtype=np.uint64)
+
+  def update(self, values: Sequence) -> None:
+    if len(values) == 0:
+      return
+    self.updateHashes(hashValues(values))
+
+  def updateHashes(self, hashes: np.ndarray) -> None:
+    # np.union1d returns the sorted unique values
+    self.mins = np.union1d(self.mins, np.unique(hashes)[:self.k])[:self.k]
+
+  def merge(self, other: 'DistinctCountSketch') -> 'DistinctCountSketch':
+    merged = DistinctCountSketch(min(self.k, other.k))
+    merged.updateHashes(np.union1d(self.mins, other.mins))
+    return merged
+
+  def estimate(self) -> float:
+    if len(self.mins) < self.k:
+      return float(len(self.mins))
+    kth_min = float(self.mins[self.k - 1]) / 2.0 ** 64
+    return (self.k - 1) / kth_min
+
+
+class Histogram(object):
+  """
+  Equi-depth histogram, i.e., each bucket holds about the same number of values.
+
+  The buckets are delimited by 'boundaries' (num_buckets + 1 sorted values),
+    where the first and last boundaries are the smallest and largest values.
+  """
+  __slots__ = ('boundaries', 'num_buckets', 'is_numeric')
+
+  def __init__(self, boundaries: List):
+    ERROR_IF_FALSE(len(boundaries) >= 2, "a histogram requires at least 2 boundaries ({} received)".format(len(boundaries)))
+    self.boundaries = boundaries
+    self.num_buckets = len(boundaries) - 1
+    self.is_numeric = all(isinstance(b, Number) for b in boundaries)
+
+  @classmethod
+  def fromValues(cls, values: List, num_buckets: int = 64) -> 'Histogram':
+    """Builds the histogram from (a sample of) non-null values, returns None if no values given"""
+    if len(values) == 0:
+      return None
+    values = sorted(values)
+    num_buckets = max(1, min(num_buckets, len(values) - 1))
+    boundaries = [
+      values[min(len(values) - 1, round(i * (len(values) - 1) / num_buckets))]
+      for i in range(num_buckets + 1)
+    ]
+    return cls(boundaries)
+
+  def cdf(self, value, inclusive: bool = True) -> float:
+    """Estimates the fraction of values that are less than (or equal to, if inclusive) the given value"""
+    boundaries = self.boundaries
+    if value < boundaries[0] or (not inclusive and value == boundaries[0]):
+      return 0.0
+    if value > boundaries[-1] or (inclusive and value == boundaries[-1]):
+      return 1.0
+    if inclusive:
+      bucket = bisect_right(boundaries, value) - 1
+    else:
+      bucket = bisect_left(boundaries, value) - 1
+    bucket = min(max(bucket, 0), self.num_buckets - 1)
+    low, high = boundaries[bucket], boundaries[bucket + 1]
+    if self.is_numeric and isinstance(value, Number) and high > low:
+      # assumes the values are uniformly distributed inside a bucket
+      within = (value - low) / (high - low)
+    else:
+      within = 0.5
+    return (bucket + min(max(within, 0.0), 1.0)) / self.num_buckets
+
+  def rangeFraction(self, low = None, high = None, low_inclusive: bool = True, high_inclusive: bool = True) -> float:
+    """Estimates the fraction of values in the range (None means unbounded)"""
+    upper = 1.0 if high is None else self.cdf(high, high_inclusive)
+    lower = 0.0 if low is None else self.cdf(low, not low_inclusive)
+    return max(upper - lower, 0.0)
+
+
+class DistanceDistribution(object):
+  """
+  Distribution of the Euclidean distances between the vectors of a column, built from a sample of its vectors,
+    for estimating the selectivity of the distance thresholds like 'column TO q < r'.
+
+  With a known query vector q, the selectivity is the fraction of the sampled vectors within distance r of q.
+  Otherwise, e.g., q is a parameter, q is assumed to be distributed like the vectors of the column,
+    and the selectivity is estimated from the histogram of the distances between random pairs of the sampled vectors.
+  """
+  __slots__ = ('vectors', 'pairwise')
+
+  num_pairs = 8192
+  """Maximum number of random pairs of vectors that the pairwise histogram is built from"""
+
+  def __init__(self, vectors: np.ndarray, pairwise: Histogram):
+    self.vectors = vectors
+    self.pairwise = pairwise
+
+  @classmethod
+  def fromVectors(cls, vectors: List, num_buckets: int = 64, seed: int = 0) -> 'DistanceDistribution':
+    """Builds the distribution from (a sample of) non-null vectors of the same size, returns None if no vectors given"""
+    if len(vectors) == 0:
+      return None
+    vectors = np.asarray(vectors, dtype=np.float64).reshape(len(vectors), -1)
+    if len(vectors) < 2:
+      return cls(vectors, Histogram([0.0, 0.0]))
+    random = np.random.default_rng(seed)
+    num_pairs = min(cls.num_pairs, len(vectors) * (len(vectors) - 1) // 2)
+    first = random.integers(0, len(vectors), size=num_pairs)
+    # the second vector of each pair is any other vector
+    second = (first + random.integers(1, len(vectors), size=num_pairs)) % len(vectors)
+    diff = vectors[first] - vectors[second]
+    distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    return cls(vectors, Histogram.fromValues(distances.tolist(), num_buckets))
+
+  def fraction(self, radius: float, query: np.ndarray = None, inclusive: bool = True) -> float:
+    """
+    Estimates the fraction of the vectors whose distances to the query vector
+      are less than (or equal to, if inclusive) the radius, where None means an unknown query vector.
+    """
+    if query is None:
+      return self.pairwise.cdf(radius, inclusive)
+    query = np.asarray(query, dtype=np.float64).reshape(-1)
+    if query.shape[0] != self.vectors.shape[1]:
+      return self.pairwise.cdf(radius, inclusive)
+    diff = self.vectors - query
+    distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    within = distances <= radius if inclusive else distances < radius
+    return np.count_nonzero(within) / len(distances)
+
+
+class ColumnStatistics(object):
+  """
+  Statistics of a single column.
+
+  min/max and the histogram are only maintained for orderable columns,
+    the distinct count is only maintained for columns with hashable values,
+    and the distance distribution is only maintained for vector columns.
+  """
+  sample_size = 1024
+  """Size of the reservoir sample that the histogram is built from"""
+  num_buckets = 64
+
+  def __init__(self, f: Field, seed: int = 0):
+    self.field = f
+    self.orderable = isOrderableField(f)
+    self.hashable = self.orderable
+    self.is_vector = isVectorField(f)
+    self.count = 0
+    """Number of non-null values"""
+    self.null_count = 0
+    self.min = None
+    self.max = None
+    self.sketch = DistinctCountSketch()
+    self._sample = []
+    self._num_sampled = 0
+    self._random = np.random.default_rng(seed)
+    self._histogram = None
+    self._distance_distribution = None
+
+  def update(self, values: Sequence) -> None:
+    """Incrementally updates the statistics with new values of the column"""
+    values = self._dropNulls(values)
+    self.count += len(values)
+    if len(values) > 0 and self.is_vector:
+      self._updateSample(values)
+    if len(values) == 0 or not self.orderable:
+      return
+    try:
+      if isinstance(values, np.ndarray) and values.dtype.kind in 'iufbmM':
+        low, high = toPythonValue(values.min()), toPythonValue(values.max())
+      else:
+        low, high = toPythonValue(min(values)), toPythonValue(max(values))
+      self.min = low if self.min is None else min(self.min, low)
+      self.max = high if self.max is None else max(self.max, high)
+    except TypeError:
+      # values of mixed types that cannot be compared
+      self.orderable = False
+      return
+    if self.hashable:
+      try:
+        self.sketch.update(values)
+      except TypeError:
+        self.hashable = False
+    self._updateSample(values)
+
+  def _dropNulls(self, values: Sequence) -> Sequence:
+    if isinstance(values, np.ndarray) and values.dtype.kind != 'O':
+      if values.ndim > 1:
+        # e.g., a vector column stored as a 2-D matrix, whose rows are never null
+        non_nulls = values
+      elif values.dtype.kind == 'f':
+        non_nulls = values[~np.isnan(values)]
+      elif values.dtype.kind in 'mM':
+        non_nulls = values[~np.isnat(values)]
+      else:
+        non_nulls = values
+    else:
+      non_nulls = [v for v in values if not isNull(v)]
+    self.null_count += len(values) - len(non_nulls)
+    return non_nulls
+
+  def _updateSample(self, values: Sequence) -> None:
+    """Reservoir sampling (Algorithm R) over all the non-null values seen so far"""
+    if isinstance(values, np.ndarray) and values.ndim == 1 and values.dtype.kind != 'O':
+      values = values.tolist()
+    # the sampled vectors are copied, as views of the rows of a matrix of vectors would keep alive the whole matrix,
+    #   e.g., every buffer a vector store has outgrown
+    sampled = lambda value: np.array(value, copy=True) if isinstance(value, np.ndarray) else value
+    num_free = self.sample_size - len(self._sample)
+    self._sample.extend(sampled(value) for value in values[:num_free])
+    self._num_sampled += min(num_free, len(values))
+    rest = values[num_free:] if num_free > 0 else values
+    if len(rest) > 0:
+      # the j-th remaining value replaces a random slot with probability sample_size / (num_sampled + j + 1)
+      positions = self._random.integers(0, self._num_sampled + np.arange(1, len(rest) + 1))
+      for j in np.flatnonzero(positions < self.sample_size):
+        self._sample[positions[j]] = sampled(rest[j])
+      self._num_sampled += len(rest)
+    self._histogram = None
+    self._distance_distribution = None
+
+  @property
+  def sample(self) -> List:
+    return self._sample
+
+  @property
+  def histogram(self) -> Histogram:
+    """Equi-depth histogram of the column, or None if the column is not orderable or has no values"""
+    if not self.orderable:
+      return None
+    if self._histogram is None:
+      self._histogram = Histogram.fromValues(self._sample, self.num_buckets)
+    return self._histogram
+
+  @property
+  def distance_distribution(self) -> DistanceDistribution:
+    """Distribution of the distances between the vectors of the column, or None if not a vector column or it has no vectors"""
+    if not self.is_vector:
+      return None
+    if self._distance_distribution is None:
+      try:
+        self._distance_distribution = DistanceDistribution.fromVectors(self._sample, self.num_buckets)
+      except ValueError:
+        # vectors of different sizes
+        self.is_vector = False
+        return None
+    return self._distance_distribution
+
+  @property
+  def distinct_count(self) -> float:
+    """Estimated number of distinct non-null values, or None if unknown"""
+    if not self.hashable:
+      return None
+    return self.sketch.estimate()
+
+  def null_fraction(self) -> float:
+    total = self.count + self.null_count
+    return self.null_count / total if total > 0 else 0.0
+
+
+class TableStatistics(object):
+  """Statistics of a table: the row count and the statistics of each column"""
+
+  def __init__(self, schema):
+    self.schema = schema
+    self.row_count = 0
+    self.columns: Dict[str, ColumnStatistics] = {
+      f.name: ColumnStatistics(f, seed=pos) for pos, f in enumerate(schema.fields)
+    }
+
+  @classmethod
+  def fromColumns(cls, schema, columns: List[Sequence]) -> 'TableStatistics':
+    stats = cls(schema)
+    stats.update(columns)
+    return stats
+
+  def update(self, columns: List[Sequence]) -> None:
+    """
+    Incrementally updates the statistics with new rows,
+      given as one sequence of values per field (in the order of the schema fields).
+    """
+    ERROR_IF_FALSE(
+      len(columns) == len(self.schema.fields),
+      "requires one sequence of values per field ({} fields, {} sequences received)"\
+        .format(len(self.schema.fields), len(columns))
+    )
+    if len(columns) == 0:
+      return
+    self.row_count += len(columns[0])
+    for f, values in zip(self.schema.fields, columns):
+      self.columns[f.name].update(values)
+
+  def __getitem__(self, column_name: str) -> ColumnStatistics:
+    return self.columns[column_name]
+
+  def get(self, column_name: str) -> ColumnStatistics:
+    return self.columns.get(column_name)
@@ -0,0 +1,4 @@
+"""
+Physical storage structures of the in-memory tables,
+  like zone maps, which let table scans skip the rows that cannot satisfy a predicate.
+"""
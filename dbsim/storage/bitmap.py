@@ -0,0 +1,218 @@
+"""
+Compressed bitmaps of rows, and the evaluation of selection predicates into bitmaps.
+
+A bitmap index (see storage.index.BitmapIndex) keeps one bitmap per distinct value of a column,
+  so that conjunctions and disjunctions of equality and IN predicates over indexed columns
+  are resolved by ANDing and ORing bitmaps before any tuple is built.
+"""
+import typing
+
+import numpy as np
+
+from ..ast import *
+from ..utils.exceptions import *
+
+class Bitmap(object):
+  """
+  Bitmap of 'num_rows' rows, split into chunks of 'chunk_size' rows.
+
+  Like Roaring bitmaps, each chunk is stored in the cheapest form for its content:
+    - None: no bit set, which takes no space;
+    - True: all the bits set;
+    - otherwise, the bits packed into an array of bytes (8 rows per byte).
+  So the bitmaps of values that are rare in (or missing from) large parts of the table stay small,
+    and AND/OR skip the empty and full chunks.
+  """
+  __slots__ = ('num_rows', 'chunks')
+  chunk_size = 1 << 16
+
+  def __init__(self, num_rows: int = 0, chunks: typing.List = None):
+    self.num_rows = num_rows
+    self.chunks = chunks if chunks is not None else [None] * self.numChunks(num_rows)
+
+  @classmethod
+  def numChunks(cls, num_rows: int) -> int:
+    return (num_rows + cls.chunk_size - 1) // cls.chunk_size
+
+  @classmethod
+  def fromBools(cls, bools: np.ndarray) -> 'Bitmap':
+    bitmap = cls()
+    bitmap.append(bools)
+    return bitmap
+
+  @staticmethod
+  def _compress(bits: np.ndarray, num_rows: int):
+    """Returns the chunk of the given bits (as bools)"""
+    if not bits.any():
+      return None
+    if len(bits) == num_rows and bits.all():
+      return True
+    return np.packbits(bits)
+
+  def _chunkBits(self, chunk: int) -> np.ndarray:
+    """Returns the bits of the chunk as bools"""
+    start, stop = chunk * self.chunk_size, min((chunk + 1) * self.chunk_size, self.num_rows)
+    content = self.chunks[chunk]
+    if content is None:
+      return np.zeros(stop - start, dtype=bool)
+    if content is True:
+      return np.ones(stop - start, dtype=bool)
+    return np.unpackbits(content, count=stop - start).astype(bool)
+
+  def append(self, bools: np.ndarray) -> None:
+    """Appends the bits of new rows"""
+    bools = np.asarray(bools, dtype=bool)
+    num_free = (self.chunk_size - self.num_rows % self.chunk_size) % self.chunk_size
+    if num_free > 0 and len(bools) > 0:
+      # fills the last partial chunk
+      bits = np.concatenate([self._chunkBits(len(self.chunks) - 1), bools[:num_free]])
+      self.chunks[-1] = self._compress(bits, len(bits))
+    for start in range(min(num_free, len(bools)), len(bools), self.chunk_size):
+      bits = bools[start:start + self.chunk_size]
+      self.chunks.append(self._compress(bits, len(bits)))
+    self.num_rows += len(bools)
+
+  def appendRowIds(self, row_ids: np.ndarray, num_rows: int) -> None:
+    """Appends 'num_rows' new rows, whose bits are set at the given ascending row ids (relative to the first new row)"""
+    start = self.num_rows
+    self.appendZeros(num_rows)
+    row_ids = np.asarray(row_ids, dtype=np.int64) + start
+    # only the chunks holding the set bits are rebuilt
+    chunks = row_ids // self.chunk_size
+    bounds = np.flatnonzero(np.diff(chunks)) + 1
+    for positions in np.split(row_ids, bounds) if len(row_ids) > 0 else []:
+      chunk = int(positions[0] // self.chunk_size)
+      bits = self._chunkBits(chunk)
+      bits[positions - chunk * self.chunk_size] = True
+      self.chunks[chunk] = self._compress(bits, len(bits))
+
+  def appendZeros(self, num_rows: int) -> None:
+    """Appends new rows whose bits are not set"""
+    num_free = (self.chunk_size - self.num_rows % self.chunk_size) % self.chunk_size
+    if num_free > 0 and self.chunks[-1] is True and num_rows > 0:
+      # a full chunk is no longer full
+      self.chunks[-1] = np.packbits(self._chunkBits(len(self.chunks) - 1))
+    self.num_rows += num_rows
+    self.chunks.extend([None] * (self.numChunks(self.num_rows) - len(self.chunks)))
+
+  def __and__(self, other: 'Bitmap') -> 'Bitmap':
+    ERROR_IF_FALSE(self.num_rows == other.num_rows, "cannot AND bitmaps of {} and {} rows".format(self.num_rows, other.num_rows))
+    chunks = []
+    for lhs, rhs in zip(self.chunks, other.chunks):
+      if lhs is None or rhs is None:
+        chunks.append(None)
+      elif lhs is True:
+        chunks.append(rhs)
+      elif rhs is True:
+        chunks.append(lhs)
+      else:
+        bits = np.bitwise_and(lhs, rhs)
+        chunks.append(bits if bits.any() else None)
+    return Bitmap(self.num_rows, chunks)
+
+  def __or__(self, other: 'Bitmap') -> 'Bitmap':
+    ERROR_IF_FALSE(self.num_rows == other.num_rows, "cannot OR bitmaps of {} and {} rows".format(self.num_rows, other.num_rows))
+    chunks = []
+    for lhs, rhs in zip(self.chunks, other.chunks):
+      if lhs is True or rhs is True:
+        chunks.append(True)
+      elif lhs is None:
+        chunks.append(rhs)
+      elif rhs is None:
+        chunks.append(lhs)
+      else:
+        chunks.append(np.bitwise_or(lhs, rhs))
+    return Bitmap(self.num_rows, chunks)
+
+  def count(self) -> int:
+    """Returns the number of set bits"""
+    total = 0
+    for chunk, content in enumerate(self.chunks):
+      if content is True:
+        total += min(self.chunk_size, self.num_rows - chunk * self.chunk_size)
+      elif content is not None:
+        total += int(np.unpackbits(content).sum())
+    return total
+
+  def rowIds(self) -> np.ndarray:
+    """Returns the ids of the rows whose bits are set in ascending order"""
+    row_ids = [
+      np.flatnonzero(self._chunkBits(chunk)) + chunk * self.chunk_size
+      for chunk, content in enumerate(self.chunks)
+      if content is not None
+    ]
+    return np.concatenate(row_ids).astype(np.int64) if row_ids else np.empty(0, dtype=np.int64)
+
+
+def constantValue(expr: Expr):
+  """Returns the value of a (non-null) constant, or raises ValueError for any other expression"""
+  if isinstance(expr, Const) and not isinstance(expr, NullConst):
+    return expr.const
+  raise ValueError("not a constant: {}".format(type(expr).__name__))
+
+def predicateBitmap(bool_op: Expr, schema, bitmap_of: typing.Callable[[int, typing.Any], Bitmap]) -> Bitmap:
+  """
+  Evaluates the predicate into the bitmap of a superset of the rows satisfying it,
+    or returns None if the predicate cannot be evaluated by bitmaps.
+
+  Equality and IN predicates between a column and constants are looked up by 'bitmap_of',
+    which returns the bitmap of the rows where the column (by field position) equals the value,
+    or None if the column has no bitmap index.
+  For a conjunction, the conjuncts that cannot be evaluated are skipped,
+    while a disjunction can only be evaluated if all the disjuncts can.
+  """
+  return _combinePredicate(bool_op, schema, bitmap_of, lambda lhs, rhs: lhs & rhs, lambda lhs, rhs: lhs | rhs)
+
+def predicateFraction(bool_op: Expr, schema, fraction_of: typing.Callable[[int, typing.Any], float]) -> float:
+  """
+  Estimates the fraction of the rows set in the bitmap that predicateBitmap would evaluate the predicate into,
+    without evaluating it, or returns None if the predicate cannot be evaluated by bitmaps.
+
+  'fraction_of' returns the estimated fraction of the rows where the column (by field position) equals the value,
+    or None if the column has no bitmap index, where the bitmaps combined are assumed independent.
+  """
+  return _combinePredicate(bool_op, schema, fraction_of, lambda lhs, rhs: lhs * rhs, lambda lhs, rhs: min(lhs + rhs, 1.0))
+
+def _combinePredicate(bool_op: Expr, schema, value_of: typing.Callable, and_of: typing.Callable, or_of: typing.Callable):
+  """
+  Combines the results of 'value_of' for the equality and IN predicates in 'bool_op' by 'and_of' and 'or_of' 
+    like predicateBitmap does, or returns None if the predicate cannot be evaluated by bitmaps.
+  """
+  if isinstance(bool_op, And):
+    lhs = _combinePredicate(bool_op.lhs, schema, value_of, and_of, or_of)
+    rhs = _combinePredicate(bool_op.rhs, schema, value_of, and_of, or_of)
+    if lhs is None or rhs is None:
+      return lhs if rhs is None else rhs
+    return and_of(lhs, rhs)
+  if isinstance(bool_op, Or):
+    lhs = _combinePredicate(bool_op.lhs, schema, value_of, and_of, or_of)
+    rhs = _combinePredicate(bool_op.rhs, schema, value_of, and_of, or_of)
+    if lhs is None or rhs is None:
+      return None
+    return or_of(lhs, rhs)
+  if isinstance(bool_op, InOp) and isinstance(bool_op.lhs, Var) and isinstance(bool_op.rhs, Tuple):
+    try:
+      pos = schema.field_position(bool_op.lhs.path)
+      values = [constantValue(expr) for expr in bool_op.rhs.exprs]
+    except (FieldNotFoundError, AmbigousFieldError, ValueError):
+      return None
+    results = [value_of(pos, value) for value in values]
+    if len(results) == 0 or any(result is None for result in results):
+      return None
+    combined = results[0]
+    for result in results[1:]:
+      combined = or_of(combined, result)
+    return combined
+  if type(bool_op) is EqOp:
+    lhs, rhs = bool_op.lhs, bool_op.rhs
+    if not isinstance(lhs, Var):
+      lhs, rhs = rhs, lhs
+    if not isinstance(lhs, Var):
+      return None
+    try:
+      pos = schema.field_position(lhs.path)
+      value = constantValue(rhs)
+    except (FieldNotFoundError, AmbigousFieldError, ValueError):
+      return None
+    return value_of(pos, value)
+  return None
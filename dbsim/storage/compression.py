@@ -0,0 +1,326 @@
+"""
+Lightweight compression of the columns of the in-memory tables (see adapters.compressed_table).
+
+A column is split into blocks of consecutive rows (aligned with the blocks of the zone map),
+  and each block is stored in the smallest of the following encodings:
+  - plain: the values as a NumPy array;
+  - run-length encoding (RLE): the value and the end of each run of equal values,
+      for sorted or clustered columns;
+  - frame of reference (FOR): the difference of each value from the minimum of the block,
+      bit-packed into as few bits as the largest difference needs, for integers.
+String (and other hashable) columns with few distinct values are dictionary-encoded,
+  i.e., their blocks store the integer codes of the values (see storage.dictionary).
+
+Range and equality predicates are evaluated on the compressed representation:
+  on the runs of RLE blocks, on the differences of FOR blocks (with the bounds shifted by the minimum),
+  and on the distinct values of the dictionary, whose matching codes are then looked up for each row.
+"""
+import typing
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ..utils import *
+from .dictionary import Dictionary
+from .ranges import ColumnRange
+
+def rangeMask(values: np.ndarray, column_range: ColumnRange, shift = 0) -> np.ndarray:
+  """
+  Returns whether each value (plus 'shift') is within the range,
+    where the comparisons are evaluated on the values as they are by shifting the bounds instead.
+  """
+  mask = np.ones(len(values), dtype=bool)
+  if column_range.low is not None:
+    low = column_range.low - shift
+    mask &= (values >= low) if column_range.low_inclusive else (values > low)
+  if column_range.high is not None:
+    high = column_range.high - shift
+    mask &= (values <= high) if column_range.high_inclusive else (values < high)
+  return mask
+
+
+class EncodedBlock(object):
+  """Base class of the encodings of a block of values"""
+  __slots__ = ('num_rows',)
+
+  def decode(self) -> np.ndarray:
+    raise NotImplementedError
+
+  def take(self, offsets: np.ndarray) -> np.ndarray:
+    """Returns the values at the given offsets within the block"""
+    return self.decode()[offsets]
+
+  def mask(self, predicate: typing.Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    """Returns the result of the vectorized predicate for each row of the block"""
+    return predicate(self.decode())
+
+  def maskRange(self, column_range: ColumnRange) -> np.ndarray:
+    return self.mask(lambda values: rangeMask(values, column_range))
+
+  @property
+  def nbytes(self) -> int:
+    raise NotImplementedError
+
+
+class PlainBlock(EncodedBlock):
+  __slots__ = ('values',)
+
+  def __init__(self, values: np.ndarray):
+    self.values = values
+    self.num_rows = len(values)
+
+  @property
+  def dtype(self) -> np.dtype:
+    return self.values.dtype
+
+  def decode(self) -> np.ndarray:
+    return self.values
+
+  def take(self, offsets: np.ndarray) -> np.ndarray:
+    return self.values[offsets]
+
+  @property
+  def nbytes(self) -> int:
+    return self.values.nbytes
+
+
+class RunLengthBlock(EncodedBlock):
+  __slots__ = ('run_values', 'run_ends')
+
+  def __init__(self, run_values: np.ndarray, run_ends: np.ndarray):
+    self.run_values = run_values
+    self.run_ends = run_ends
+    """The offset after the last row of each run"""
+    self.num_rows = int(run_ends[-1]) if len(run_ends) > 0 else 0
+
+  @classmethod
+  def fromValues(cls, values: np.ndarray, run_starts: np.ndarray) -> 'RunLengthBlock':
+    return cls(values[run_starts], np.append(run_starts[1:], len(values)).astype(np.int32))
+
+  @property
+  def dtype(self) -> np.dtype:
+    return self.run_values.dtype
+
+  def _runLengths(self) -> np.ndarray:
+    return np.diff(self.run_ends, prepend=0)
+
+  def decode(self) -> np.ndarray:
+    return np.repeat(self.run_values, self._runLengths())
+
+  def take(self, offsets: np.ndarray) -> np.ndarray:
+    return self.run_values[np.searchsorted(self.run_ends, offsets, side='right')]
+
+  def mask(self, predicate: typing.Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    # evaluated once per run
+    return np.repeat(predicate(self.run_values), self._runLengths())
+
+  @property
+  def nbytes(self) -> int:
+    return self.run_values.nbytes + self.run_ends.nbytes
+
+
+class FrameOfReferenceBlock(EncodedBlock):
+  __slots__ = ('base', 'bit_width', 'packed', 'dtype')
+  max_bit_width = 56
+  """Bit width up to which a value and its offset within a byte fit in a 64-bit word"""
+
+  def __init__(self, values: np.ndarray):
+    self.num_rows = len(values)
+    self.dtype = values.dtype
+    self.base = int(values.min())
+    deltas = (values.astype(np.int64) - self.base).astype(np.uint64)
+    self.bit_width = int(deltas.max()).bit_length()
+    # the bits of each delta (most significant first) are laid out contiguously
+    shifts = np.arange(self.bit_width - 1, -1, -1, dtype=np.uint64)
+    bits = ((deltas[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+    # padded so that reading 8 bytes from the byte of any delta stays within the array
+    self.packed = np.concatenate([np.packbits(bits.reshape(-1)), np.zeros(8, dtype=np.uint8)])
+
+  @classmethod
+  def bitWidth(cls, values: np.ndarray) -> int:
+    return (int(values.max()) - int(values.min())).bit_length()
+
+  def deltas(self, offsets: np.ndarray) -> np.ndarray:
+    """Returns the differences from the base of the values at the given offsets"""
+    if self.bit_width == 0:
+      return np.zeros(len(offsets), dtype=np.int64)
+    positions = offsets.astype(np.uint64) * np.uint64(self.bit_width)
+    first_bytes = (positions >> np.uint64(3)).astype(np.int64)
+    # reads the 64-bit big-endian word starting at the first byte of each delta
+    words = np.zeros(len(offsets), dtype=np.uint64)
+    for i in range(8):
+      words = (words << np.uint64(8)) | self.packed[first_bytes + i].astype(np.uint64)
+    shifts = np.uint64(64 - self.bit_width) - (positions & np.uint64(7))
+    mask = np.uint64((1 << self.bit_width) - 1)
+    return ((words >> shifts) & mask).astype(np.int64)
+
+  def decode(self) -> np.ndarray:
+    return self.take(np.arange(self.num_rows))
+
+  def take(self, offsets: np.ndarray) -> np.ndarray:
+    return (self.deltas(np.asarray(offsets)) + self.base).astype(self.dtype)
+
+  def maskRange(self, column_range: ColumnRange) -> np.ndarray:
+    # compares the deltas with the bounds shifted by the base instead of decoding the values
+    return rangeMask(self.deltas(np.arange(self.num_rows)), column_range, shift=self.base)
+
+  @property
+  def nbytes(self) -> int:
+    return self.packed.nbytes
+
+
+def encodeBlock(values: np.ndarray) -> EncodedBlock:
+  """Returns the smallest encoding of the values"""
+  candidates = [PlainBlock(values)]
+  if len(values) > 0 and values.dtype.kind in 'iufb':
+    run_starts = np.concatenate([[0], np.flatnonzero(values[1:] != values[:-1]) + 1])
+    if len(run_starts) * (values.itemsize + 4) < values.nbytes:
+      candidates.append(RunLengthBlock.fromValues(values, run_starts))
+  if len(values) > 0 and values.dtype.kind in 'iu' and \
+      FrameOfReferenceBlock.bitWidth(values) <= FrameOfReferenceBlock.max_bit_width:
+    candidates.append(FrameOfReferenceBlock(values))
+  return min(candidates, key=lambda block: block.nbytes)
+
+
+class CompressedColumn(object):
+  """
+  A column stored as a list of encoded blocks of 'block_size' rows,
+    where the values of dictionary-encoded columns are replaced by their codes (-1 for nulls).
+  """
+  dictionary_max_distinct_ratio = 0.5
+  """Maximum ratio of distinct values to rows of a dictionary-encoded column"""
+
+  def __init__(self, name: str, block_size: int):
+    self.name = name
+    self.block_size = block_size
+    self.blocks: typing.List[EncodedBlock] = []
+    self.num_rows = 0
+    self.dictionary: Dictionary = None
+    self._decoder: np.ndarray = None
+    """code -> value, where the last entry is None for the code -1"""
+    self._encoded: bool = None
+
+  @staticmethod
+  def _toArray(values: Sequence) -> np.ndarray:
+    if isinstance(values, pd.Series):
+      values = values.to_numpy()
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'mM':
+      # kept as pandas Timestamps, like the values scanned from a DataFrame
+      return pd.Series(values).astype(object).to_numpy()
+    if isinstance(values, np.ndarray) and values.dtype.kind not in 'US':
+      return values
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    if len(array) > 0 and all(isinstance(v, (bool, np.bool_)) for v in array):
+      return array.astype(bool)
+    if len(array) > 0 and all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in array):
+      return array.astype(np.int64)
+    if len(array) > 0 and all(isinstance(v, (float, np.floating)) for v in array):
+      return array.astype(np.float64)
+    return array
+
+  def _encodeValues(self, values: np.ndarray) -> np.ndarray:
+    """Replaces the values by their codes if the column is dictionary-encoded"""
+    if self._encoded is None:
+      # decided by the first values
+      self._encoded = False
+      if values.dtype == object and len(values) > 0:
+        try:
+          dictionary = Dictionary(self.name)
+          codes = dictionary.encode(values)
+        except (TypeError, ValueError):
+          return values
+        if len(dictionary.values) <= self.dictionary_max_distinct_ratio * len(values):
+          self._encoded, self.dictionary = True, dictionary
+          return codes
+      return values
+    if self._encoded:
+      return self.dictionary.encode(values)
+    return values
+
+  def append(self, values: Sequence) -> None:
+    values = self._encodeValues(self._toArray(values))
+    if len(values) == 0:
+      return
+    num_free = (self.block_size - self.num_rows % self.block_size) % self.block_size
+    if num_free > 0:
+      # re-encodes the last partial block with the new values
+      last = self.blocks.pop().decode()
+      values = np.concatenate([last, values]) if last.dtype == values.dtype \
+        else np.concatenate([last.astype(object), values.astype(object)])
+      self.num_rows -= len(last)
+    for start in range(0, len(values), self.block_size):
+      self.blocks.append(encodeBlock(values[start:start + self.block_size]))
+    self.num_rows += len(values)
+
+  def _decodeValues(self, values: np.ndarray) -> np.ndarray:
+    if not self._encoded:
+      return values
+    if self._decoder is None or len(self._decoder) != len(self.dictionary.values) + 1:
+      self._decoder = np.empty(len(self.dictionary.values) + 1, dtype=object)
+      self._decoder[:-1] = self.dictionary.values
+    return self._decoder[values]
+
+  def decode(self, start: int = 0, stop: int = None) -> np.ndarray:
+    """Returns the values of rows [start, stop)"""
+    stop = self.num_rows if stop is None else min(stop, self.num_rows)
+    if start >= stop:
+      return np.empty(0, dtype=object)
+    first, last = start // self.block_size, (stop - 1) // self.block_size
+    parts = [self.blocks[block].decode() for block in range(first, last + 1)]
+    values = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    offset = first * self.block_size
+    return self._decodeValues(values[start - offset:stop - offset])
+
+  def take(self, row_ids: np.ndarray) -> np.ndarray:
+    """Returns the values of the given rows (in the given order)"""
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    block_ids = row_ids // self.block_size
+    parts, positions = [], []
+    for block in np.unique(block_ids).tolist():
+      selected = np.flatnonzero(block_ids == block)
+      parts.append(self.blocks[block].take(row_ids[selected] - block * self.block_size))
+      positions.append(selected)
+    if len(parts) == 0:
+      return np.empty(0, dtype=object)
+    values = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    result = np.empty_like(values)
+    result[np.concatenate(positions)] = values
+    return self._decodeValues(result)
+
+  def selectRange(self, column_range: ColumnRange, blocks: Sequence[int]) -> np.ndarray:
+    """
+    Returns the ids of the rows (in the given blocks) within the range in ascending order,
+      or None if the range cannot be evaluated on the column.
+    """
+    if self._encoded:
+      # the range is evaluated once for each distinct value
+      allowed = np.zeros(len(self.dictionary.values) + 1, dtype=bool)
+      try:
+        allowed[:-1] = [column_range.contains(value) for value in self.dictionary.values]
+      except TypeError:
+        # the bounds are not comparable with the values
+        return None
+    row_ids = []
+    for block in blocks:
+      encoded_block = self.blocks[block]
+      try:
+        if self._encoded:
+          mask = encoded_block.mask(lambda codes: allowed[codes])
+        elif encoded_block.dtype.kind in 'iufb':
+          mask = encoded_block.maskRange(column_range)
+        else:
+          mask = np.array([column_range.contains(value) for value in encoded_block.decode()], dtype=bool)
+      except TypeError:
+        return None
+      row_ids.append(np.flatnonzero(mask) + block * self.block_size)
+    return np.concatenate(row_ids).astype(np.int64) if row_ids else np.empty(0, dtype=np.int64)
+
+  @property
+  def nbytes(self) -> int:
+    """Number of bytes taken by the encoded blocks and the dictionary (excluding the dictionary values themselves)"""
+    total = sum(block.nbytes for block in self.blocks)
+    if self._encoded:
+      total += 8 * len(self.dictionary.values)
+    return total
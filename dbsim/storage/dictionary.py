@@ -0,0 +1,112 @@
+"""
+Dictionary encoding of the string columns of the in-memory tables.
+
+Each distinct value of an encoded column is stored once in the dictionary,
+  and the column is represented by the integer codes of its values, i.e., their positions in the dictionary.
+The rows of an encoded column share the string objects of the dictionary,
+  so hashing them (cached by the string objects) and comparing them (by identity first)
+  in hash joins and GROUP BY is as cheap as working on the codes.
+An equality predicate is answered by translating the constant into its code once
+  and returning the rows with that code, e.g., no rows at all if the constant is not in the dictionary.
+"""
+import typing
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ..statistics import isNull
+from ..utils import *
+from .index import Index
+from .ranges import ColumnRange
+
+class Dictionary(Index):
+  """
+  Dictionary of an encoded column, which also serves equality lookups like a hash index.
+
+  Null values are encoded as -1.
+  The codes are kept in a buffer whose capacity doubles as rows are appended,
+    so appending is amortized O(1) per row.
+  """
+  null_code = -1
+
+  def __init__(self, column_name: str, values: Sequence = ()):
+    super().__init__(column_name)
+    self.values: typing.List[str] = []
+    """code -> value"""
+    self.code_of: typing.Dict[str, int] = dict()
+    """value -> code"""
+    self._codes = np.empty(0, dtype=np.int32)
+    self._categories: pd.Index = None
+    self._row_ids: typing.Tuple[np.ndarray, np.ndarray] = None
+    """(row ids sorted by their codes, start position of each code in them), built on the first lookup"""
+    self.update(values)
+
+  @property
+  def codes(self) -> np.ndarray:
+    """The codes of the rows"""
+    return self._codes[:self.num_rows]
+
+  def categories(self) -> pd.Index:
+    """The values as a pandas Index, e.g., for the categories of a pandas Categorical"""
+    if self._categories is None or len(self._categories) != len(self.values):
+      self._categories = pd.Index(self.values, dtype=object)
+    return self._categories
+
+  def encode(self, values: Sequence) -> np.ndarray:
+    """Returns the codes of the values, where the values that are not in the dictionary are added to it"""
+    values = values if isinstance(values, (np.ndarray, pd.Series)) else np.array(values, dtype=object)
+    local_codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    code_of, dict_values = self.code_of, self.values
+    mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+    for i, value in enumerate(uniques):
+      code = code_of.get(value)
+      if code is None:
+        code = code_of[value] = len(dict_values)
+        dict_values.append(value)
+      mapping[i] = code
+    # the sentinel of nulls (-1) is mapped to the last entry
+    mapping[-1] = self.null_code
+    return mapping[local_codes]
+
+  def update(self, values: Sequence) -> None:
+    codes = self.encode(values)
+    num_rows = self.num_rows + len(codes)
+    if num_rows > len(self._codes):
+      buffer = np.empty(max(num_rows, 2 * len(self._codes)), dtype=np.int32)
+      buffer[:self.num_rows] = self.codes
+      self._codes = buffer
+    self._codes[self.num_rows:num_rows] = codes
+    self.num_rows = num_rows
+    self._row_ids = None
+
+  def code(self, value) -> int:
+    """Returns the code of the value, or -1 if the value is null or not in the dictionary"""
+    if isNull(value):
+      return self.null_code
+    try:
+      return self.code_of.get(value, self.null_code)
+    except TypeError:
+      # unhashable
+      return self.null_code
+
+  def decode(self, codes: Sequence[int]) -> list:
+    values = self.values
+    return [values[code] if code >= 0 else None for code in codes]
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    return column_range.isPoint()
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    ERROR_IF_FALSE(self.supports(column_range), "dictionary only supports equality lookups")
+    code = self.code(column_range.low)
+    if code == self.null_code:
+      return np.empty(0, dtype=np.int64)
+    if self._row_ids is None:
+      codes = self.codes
+      # stable, so the row ids of each code stay in ascending order
+      order = np.argsort(codes, kind='stable')
+      starts = np.searchsorted(codes[order], np.arange(len(self.values) + 1))
+      self._row_ids = (order.astype(np.int64), starts)
+    order, starts = self._row_ids
+    return order[starts[code]:starts[code + 1]]
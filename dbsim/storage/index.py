@@ -0,0 +1,221 @@
+"""
+Secondary indexes over the columns of the in-memory tables.
+
+  - SortedIndex: the (value, row id) pairs sorted by value, looked up by binary search,
+      which serves both range and equality predicates;
+  - HashIndex: the mapping from each value to its row ids, which only serves equality predicates;
+  - BitmapIndex: the bitmap of the rows of each value, for columns with few distinct values,
+      which serves equality predicates and their conjunctions and disjunctions (see storage.bitmap);
+  - IVFFlatIndex: the inverted file over a vector column, which serves similarity predicates
+      (defined and registered in INDEX_TYPES by storage.vector_index).
+
+Null values are not indexed, since they never satisfy a comparison.
+All the indexes are maintained incrementally as rows are appended to the table.
+"""
+import typing
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from enum import Enum
+from heapq import merge
+from numbers import Number
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ..statistics import isNull, toPythonValue
+from ..utils import *
+from .bitmap import Bitmap
+from .ranges import ColumnRange
+
+class IndexType(Enum):
+  SORTED = 1
+  HASH = 2
+  BITMAP = 3
+  IVF_FLAT = 4
+
+def indexableValues(values: Sequence) -> typing.Tuple[typing.Union[np.ndarray, list], np.ndarray]:
+  """
+  Returns the non-null values and their row ids (relative to the start of 'values'),
+    where numeric values are kept as a NumPy array and other values as a list of Python objects.
+  """
+  if isinstance(values, np.ndarray) and values.dtype.kind in 'iufb':
+    if values.dtype.kind == 'f':
+      row_ids = np.flatnonzero(~np.isnan(values))
+      return values[row_ids], row_ids
+    return values, np.arange(len(values))
+  if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+    # converted into datetime.datetime instead of integers
+    values = values.astype('datetime64[us]').astype(object)
+  row_ids = [i for i, v in enumerate(values) if not isNull(v)]
+  return [toPythonValue(values[i]) for i in row_ids], np.array(row_ids, dtype=np.int64)
+
+
+class Index(object):
+  """Base class of the indexes over a column of a table"""
+  index_type: IndexType = None
+
+  def __init__(self, column_name: str):
+    self.column_name = column_name
+    self.num_rows = 0
+    """Number of rows (including those with null values) covered by the index"""
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    """Returns True if the index can look up the rows within the range"""
+    raise NotImplementedError
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    """Returns the ids of the rows within the range in ascending order"""
+    raise NotImplementedError
+
+  def lookupValue(self, value) -> np.ndarray:
+    """Returns the ids of the rows equal to the value in ascending order"""
+    return self.lookup(ColumnRange(value, value))
+
+  def update(self, values: Sequence) -> None:
+    """Indexes the values of the rows appended to the table"""
+    raise NotImplementedError
+
+
+class SortedIndex(Index):
+  index_type = IndexType.SORTED
+
+  def __init__(self, column_name: str, values: Sequence = ()):
+    super().__init__(column_name)
+    self.keys: typing.Union[np.ndarray, list] = []
+    self.row_ids = np.empty(0, dtype=np.int64)
+    self.is_numeric = None
+    self.update(values)
+
+  def update(self, values: Sequence) -> None:
+    keys, row_ids = indexableValues(values)
+    row_ids = row_ids + self.num_rows
+    self.num_rows += len(values)
+    if len(keys) == 0:
+      return
+    is_numeric = isinstance(keys, np.ndarray)
+    if self.is_numeric is None:
+      self.is_numeric = is_numeric
+    ERROR_IF_FALSE(
+      self.is_numeric == is_numeric,
+      "cannot index numeric and non-numeric values of column '{}' together".format(self.column_name)
+    )
+    # the appended rows are sorted on their own and merged into the existing entries,
+    #   after those with equal keys, so the row ids of equal keys stay in ascending order
+    if self.is_numeric:
+      order = np.argsort(keys, kind='stable')
+      keys, row_ids = keys[order], row_ids[order]
+      if len(self.keys) == 0:
+        self.keys, self.row_ids = keys, row_ids
+      else:
+        positions = np.searchsorted(self.keys, keys, side='right')
+        self.keys = np.insert(self.keys, positions, keys)
+        self.row_ids = np.insert(self.row_ids, positions, row_ids)
+    else:
+      new_pairs = sorted(zip(keys, row_ids.tolist()), key=lambda pair: pair[0])
+      pairs = list(merge(zip(self.keys, self.row_ids.tolist()), new_pairs, key=lambda pair: pair[0]))
+      self.keys = [key for key, _ in pairs]
+      self.row_ids = np.array([row_id for _, row_id in pairs], dtype=np.int64)
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    if self.is_numeric:
+      return all(
+        bound is None or isinstance(bound, Number)
+        for bound in (column_range.low, column_range.high)
+      )
+    return True
+
+  def _position(self, value, right: bool) -> int:
+    if self.is_numeric:
+      return int(np.searchsorted(self.keys, value, side='right' if right else 'left'))
+    return bisect_right(self.keys, value) if right else bisect_left(self.keys, value)
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    start, stop = 0, len(self.keys)
+    if column_range.low is not None:
+      start = self._position(column_range.low, right=not column_range.low_inclusive)
+    if column_range.high is not None:
+      stop = self._position(column_range.high, right=column_range.high_inclusive)
+    return np.sort(self.row_ids[start:max(start, stop)])
+
+
+class HashIndex(Index):
+  index_type = IndexType.HASH
+
+  def __init__(self, column_name: str, values: Sequence = ()):
+    super().__init__(column_name)
+    self.buckets: typing.Dict[typing.Any, list] = defaultdict(list)
+    self.update(values)
+
+  def update(self, values: Sequence) -> None:
+    keys, row_ids = indexableValues(values)
+    if isinstance(keys, np.ndarray):
+      keys = keys.tolist()
+    # the row ids are appended in ascending order
+    for key, row_id in zip(keys, (row_ids + self.num_rows).tolist()):
+      self.buckets[key].append(row_id)
+    self.num_rows += len(values)
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    return column_range.isPoint()
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    ERROR_IF_FALSE(self.supports(column_range), "hash index only supports equality lookups")
+    return np.array(self.buckets.get(column_range.low, ()), dtype=np.int64)
+
+
+class BitmapIndex(Index):
+  """
+  One compressed bitmap per distinct value of the column.
+
+  Each bitmap takes up to one bit per row, so the index is meant for boolean and enum-like columns.
+  """
+  index_type = IndexType.BITMAP
+
+  def __init__(self, column_name: str, values: Sequence = ()):
+    super().__init__(column_name)
+    self.bitmaps: typing.Dict[typing.Any, Bitmap] = dict()
+    self.update(values)
+
+  def update(self, values: Sequence) -> None:
+    keys, row_ids = indexableValues(values)
+    num_new_rows = len(values)
+    codes, uniques = pd.factorize(keys if isinstance(keys, np.ndarray) else np.array(keys, dtype=object))
+    # the rows of each value are contiguous in 'order'
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    appended = set()
+    for code, value in enumerate(uniques):
+      value = toPythonValue(value)
+      if value not in self.bitmaps:
+        self.bitmaps[value] = Bitmap(self.num_rows)
+      # the rows of the value in ascending order, as the sort is stable
+      self.bitmaps[value].appendRowIds(row_ids[order[starts[code]:starts[code + 1]]], num_new_rows)
+      appended.add(value)
+    for value, bitmap in self.bitmaps.items():
+      if value not in appended:
+        bitmap.appendZeros(num_new_rows)
+    self.num_rows += num_new_rows
+
+  def bitmap(self, value) -> Bitmap:
+    """Returns the bitmap of the rows equal to the value"""
+    try:
+      bitmap = self.bitmaps.get(value) if not isNull(value) else None
+    except TypeError:
+      # unhashable
+      bitmap = None
+    return bitmap if bitmap is not None else Bitmap(self.num_rows)
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    return column_range.isPoint()
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    ERROR_IF_FALSE(self.supports(column_range), "bitmap index only supports equality lookups")
+    return self.bitmap(column_range.low).rowIds()
+
+
+INDEX_TYPES = {
+  IndexType.SORTED: SortedIndex,
+  IndexType.HASH: HashIndex,
+  IndexType.BITMAP: BitmapIndex,
+}
@@ -0,0 +1,337 @@
+"""
+Product quantization (PQ) of vector columns, which keeps a vector in a few bytes instead of 4 bytes per element.
+
+The dimensions are split into 'num_subspaces' contiguous subspaces,
+  and the sub-vectors of each subspace are clustered by k-means into (at most) 256 centroids (the codebook),
+  so that a vector is stored as the uint8 codes of the nearest centroid of each of its sub-vectors,
+  e.g., 16 bytes instead of 512 for 128-dimensional float32 vectors (32x smaller).
+
+The distances between a query vector and the encoded vectors are computed asymmetrically (ADC):
+  the squared distances from each query sub-vector to the centroids of its subspace are computed once,
+  then the distance to an encoded vector is the square root of the sum of the table entries of its codes,
+  which is the exact distance between the query and the reconstruction of the vector (see ProductQuantizer.decode).
+"""
+import os
+import typing
+from typing import Sequence, List
+
+import numpy as np
+
+from ..utils import *
+from .vector_index import kmeans, nearestCentroids
+from .vector_store import VectorStore
+
+class ProductQuantizer(object):
+  """The codebooks of the subspaces, trained by k-means over a sample of vectors"""
+
+  def __init__(self, num_subspaces: int = 8, num_centroids: int = 256, num_iterations: int = 10, seed: int = 0):
+    ERROR_IF_FALSE(0 < num_centroids <= 256, "the codes are uint8, so there are at most 256 centroids ({} received)".format(num_centroids))
+    self.num_subspaces = num_subspaces
+    self.num_centroids = num_centroids
+    self.num_iterations = num_iterations
+    self.seed = seed
+    self.bounds: List[typing.Tuple[int, int]] = None
+    """(first, last + 1) dimension of each subspace"""
+    self.codebooks: List[np.ndarray] = None
+    """The (num_centroids, subspace size) float32 centroids of each subspace"""
+
+  @property
+  def is_trained(self) -> bool:
+    return self.codebooks is not None
+
+  def train(self, vectors: np.ndarray) -> None:
+    dim = vectors.shape[1]
+    num_subspaces = min(self.num_subspaces, dim)
+    ends = np.cumsum([len(dims) for dims in np.array_split(np.arange(dim), num_subspaces)]).tolist()
+    self.bounds = list(zip([0] + ends[:-1], ends))
+    num_centroids = min(self.num_centroids, len(vectors))
+    self.codebooks = [
+      kmeans(np.ascontiguousarray(vectors[:, a:b], dtype=np.float32), num_centroids, self.num_iterations, self.seed + i)
+      for i, (a, b) in enumerate(self.bounds)
+    ]
+
+  def encode(self, vectors: np.ndarray) -> np.ndarray:
+    """Returns the (n, num_subspaces) uint8 codes of the vectors"""
+    codes = np.empty((len(vectors), len(self.bounds)), dtype=np.uint8)
+    for i, ((a, b), codebook) in enumerate(zip(self.bounds, self.codebooks)):
+      codes[:, i] = nearestCentroids(np.ascontiguousarray(vectors[:, a:b], dtype=np.float32), codebook)
+    return codes
+
+  def decode(self, codes: np.ndarray) -> np.ndarray:
+    """Returns the (n, dim) float32 reconstructions of the encoded vectors"""
+    return np.concatenate([codebook[codes[:, i]] for i, codebook in enumerate(self.codebooks)], axis=1)
+
+  def distanceTables(self, query: np.ndarray) -> np.ndarray:
+    """Returns the (num_subspaces, num_centroids) squared distances from the query sub-vectors to the centroids"""
+    query = np.asarray(query, dtype=np.float32)
+    tables = np.empty((len(self.bounds), len(self.codebooks[0])), dtype=np.float32)
+    for i, ((a, b), codebook) in enumerate(zip(self.bounds, self.codebooks)):
+      diff = codebook - query[a:b]
+      tables[i] = np.einsum('ij,ij->i', diff, diff)
+    return tables
+
+  def adcDistances(self, codes: np.ndarray, tables: np.ndarray) -> np.ndarray:
+    """Returns the distances between the query of the distance tables and the reconstructions of the encoded vectors"""
+    return np.sqrt(tables[np.arange(len(tables)), codes].sum(axis=1, dtype=np.float64))
+
+
+class QuantizedVectorStore(VectorStore):
+  """
+  The vectors of a column as their PQ codes (see ProductQuantizer) instead of a float matrix.
+
+  The quantizer is trained on (a sample of) the first non-null vectors appended once there are at least
+    'num_centroids' of them, and the later vectors are encoded with the same codebooks.
+  Until then, the vectors are kept as they are (as a float32 matrix) and searched exactly,
+    as codebooks trained on fewer vectors would not tell the later vectors apart.
+  So the store takes the uncompressed size of the vectors (4 * dim bytes each) until the training,
+    i.e., of at most 'num_centroids' vectors when they are appended in small batches,
+    but of all the vectors of the batch completing them, e.g., the vectors the store is created with,
+    which peaks at about twice their float32 size with their stacked batch,
+    while the training (on a sample) and the encoding go through blocks of rows.
+  Besides its codes, the store keeps the reconstruction error of each vector, i.e., its distance to its reconstruction,
+    so that by the triangle inequality a vector may only be within distance r of a query
+    if the ADC distance minus the error is at most r.
+
+  The exact vectors are optionally kept in a file ('exact_path') memory-mapped as a (n, dim) float32 matrix,
+    which is only read for the candidate rows found by the ADC distances,
+    so the range and k-NN searches give the exact results (see QuantizedVectorStore.knnSearch),
+    and the rows carry the exact vectors.
+  Otherwise, the rows carry the reconstructed vectors, and the searches are over them.
+  """
+  max_training_size = 1 << 16
+  """Maximum number of vectors sampled to train the quantizer"""
+  rerank_factor = 4
+  """The k-NN searches re-rank the rows of the k * rerank_factor smallest ADC distances by their exact distances first"""
+
+  def __init__(
+    self, values: Sequence = (), num_subspaces: int = 8, num_centroids: int = 256,
+    exact_path: str = None, num_iterations: int = 10, seed: int = 0
+  ):
+    self.quantizer = ProductQuantizer(num_subspaces, num_centroids, num_iterations, seed)
+    self.exact_path = exact_path
+    self._exact: np.ndarray = None
+    """The memory-mapped exact vectors"""
+    self._codes = np.zeros((0, 0), dtype=np.uint8)
+    self._errors = np.zeros(0, dtype=np.float32)
+    self._raw: np.ndarray = None
+    """The vectors kept as they are until the quantizer is trained"""
+    self._dim = 0
+    if exact_path is not None:
+      # the file is rewritten from scratch
+      open(exact_path, 'wb').close()
+    super().__init__(values, dtype=np.float32)
+
+  @property
+  def dim(self) -> int:
+    return self._dim
+
+  @property
+  def codes(self) -> np.ndarray:
+    return self._codes[:self._num_rows]
+
+  @property
+  def nbytes(self) -> int:
+    """Number of bytes taken in memory (the memory-mapped exact vectors excluded)"""
+    raw_nbytes = self._raw[:self._num_rows].nbytes if self._raw is not None else 0
+    return self.codes.nbytes + self._errors[:self._num_rows].nbytes + self.valid.nbytes + raw_nbytes
+
+  @property
+  def matrix(self) -> np.ndarray:
+    """The (n, dim) matrix of the exact vectors (memory-mapped), or of the reconstructed vectors if there are none"""
+    if self._exact is not None:
+      return self._exact[:self._num_rows]
+    if self._raw is not None:
+      return self._raw[:self._num_rows]
+    if not self.quantizer.is_trained:
+      return np.zeros((self._num_rows, 0), dtype=np.float32)
+    return self.quantizer.decode(self.codes)
+
+  def _reserve(self, num_rows: int) -> None:
+    capacity = len(self._valid)
+    if num_rows <= capacity:
+      return
+    capacity = max(num_rows, 2 * capacity)
+    codes = np.zeros((capacity, len(self.quantizer.bounds or ())), dtype=np.uint8)
+    codes[:self._num_rows] = self._codes[:self._num_rows]
+    errors = np.zeros(capacity, dtype=np.float32)
+    errors[:self._num_rows] = self._errors[:self._num_rows]
+    valid = np.zeros(capacity, dtype=bool)
+    valid[:self._num_rows] = self._valid[:self._num_rows]
+    self._codes, self._errors, self._valid = codes, errors, valid
+    if self._raw is not None:
+      raw = np.zeros((capacity, self._dim), dtype=np.float32)
+      raw[:self._num_rows] = self._raw[:self._num_rows]
+      self._raw = raw
+
+  def _train(self) -> None:
+    """Trains the quantizer on the vectors kept so far, and encodes them"""
+    raw = self._raw[:self._num_rows]
+    row_ids = np.flatnonzero(self.valid)
+    if len(row_ids) > self.max_training_size:
+      sample = np.random.default_rng(self.quantizer.seed).choice(row_ids, size=self.max_training_size, replace=False)
+      self.quantizer.train(raw[np.sort(sample)])
+    else:
+      self.quantizer.train(raw[row_ids])
+    self._codes = np.zeros((len(self._valid), len(self.quantizer.bounds)), dtype=np.uint8)
+    for start in range(0, len(row_ids), self.batch_size):
+      block_row_ids = row_ids[start:start + self.batch_size]
+      self._encode(block_row_ids, raw[block_row_ids])
+    # the exact vectors of the null rows are zeros
+    self._appendExact(raw)
+    self._raw = None
+
+  def _encode(self, row_ids: np.ndarray, vectors: np.ndarray) -> None:
+    for start in range(0, len(row_ids), self.batch_size):
+      block = vectors[start:start + self.batch_size]
+      codes = self.quantizer.encode(block)
+      diff = block - self.quantizer.decode(codes)
+      self._codes[row_ids[start:start + self.batch_size]] = codes
+      self._errors[row_ids[start:start + self.batch_size]] = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+  def _appendExact(self, vectors: np.ndarray) -> None:
+    if self.exact_path is None:
+      return
+    with open(self.exact_path, 'ab') as file:
+      np.ascontiguousarray(vectors, dtype=np.float32).tofile(file)
+    num_rows = os.path.getsize(self.exact_path) // (4 * self._dim)
+    self._exact = np.memmap(self.exact_path, dtype=np.float32, mode='r', shape=(num_rows, self._dim)) if num_rows > 0 else None
+
+  def append(self, values: Sequence) -> None:
+    start, num_values = self._num_rows, len(values)
+    if num_values == 0:
+      return
+    if isinstance(values, np.ndarray) and values.ndim == 2:
+      positions, vectors = np.arange(num_values), np.asarray(values, dtype=np.float32)
+    else:
+      positions = np.array([i for i, v in enumerate(values) if v is not None], dtype=np.int64)
+      vectors = np.stack([np.asarray(values[i], dtype=np.float32) for i in positions]) if len(positions) > 0 else None
+    if vectors is not None:
+      if self._dim == 0:
+        self._dim = vectors.shape[1]
+        self._raw = np.zeros((len(self._valid), self._dim), dtype=np.float32)
+      ERROR_IF_NOT_EQ(vectors.shape[1], self._dim, "cannot store vectors of size {} with vectors of size {}".format(vectors.shape[1], self._dim))
+    self._reserve(start + num_values)
+    if vectors is not None:
+      self._valid[start + positions] = True
+    if not self.quantizer.is_trained:
+      if vectors is not None:
+        self._raw[start + positions] = vectors
+      self._num_rows += num_values
+      if self._raw is not None and np.count_nonzero(self.valid) >= self.quantizer.num_centroids:
+        self._train()
+      return
+    if vectors is not None:
+      self._encode(start + positions, vectors)
+    exact = np.zeros((num_values, self._dim), dtype=np.float32)
+    if vectors is not None:
+      exact[positions] = vectors
+    self._appendExact(exact)
+    self._num_rows += num_values
+
+  def row(self, row_id: int) -> np.ndarray:
+    row_id = int(row_id)
+    if not self._valid[row_id]:
+      return None
+    if self._exact is not None:
+      return self._exact[row_id]
+    if self._raw is not None:
+      return self._raw[row_id]
+    return self.quantizer.decode(self._codes[row_id:row_id + 1])[0]
+
+  def vectors(self, row_ids: Sequence[int]) -> np.ndarray:
+    """Returns the exact (or reconstructed) vectors of the rows, decoding only those rows"""
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if self._exact is not None:
+      return self._exact[row_ids]
+    if self._raw is not None:
+      return self._raw[row_ids]
+    if not self.quantizer.is_trained:
+      return np.zeros((len(row_ids), 0), dtype=np.float32)
+    return self.quantizer.decode(self._codes[row_ids])
+
+  def rows(self, row_ids: Sequence[int]) -> np.ndarray:
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    vectors = np.empty(len(row_ids), dtype=object)
+    valid = self._valid[row_ids]
+    if not valid.any():
+      return vectors
+    matrix = self.vectors(row_ids)
+    for i in np.flatnonzero(valid).tolist():
+      vectors[i] = matrix[i]
+    return vectors
+
+  def adcDistances(self, query: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    Returns the ADC distances between the query vector and the vectors of rows [start, stop) (NaN for the null vectors),
+      which are the exact distances while the quantizer is not trained.
+    """
+    stop = self._num_rows if stop is None else min(stop, self._num_rows)
+    if self._dim == 0 or start >= stop:
+      return np.full(max(stop - start, 0), np.nan)
+    ERROR_IF_NOT_EQ(
+      np.shape(query)[-1], self._dim,
+      "could not compute the distances between vectors of sizes {} and {}".format(np.shape(query)[-1], self._dim)
+    )
+    distances = np.empty(stop - start, dtype=np.float64)
+    if self._raw is not None:
+      for batch_start in range(start, stop, self.batch_size):
+        batch_stop = min(batch_start + self.batch_size, stop)
+        diff = self._raw[batch_start:batch_stop] - np.asarray(query, dtype=np.float32)
+        distances[batch_start - start:batch_stop - start] = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    else:
+      tables = self.quantizer.distanceTables(query)
+      for batch_start in range(start, stop, self.batch_size):
+        batch_stop = min(batch_start + self.batch_size, stop)
+        distances[batch_start - start:batch_stop - start] = self.quantizer.adcDistances(self._codes[batch_start:batch_stop], tables)
+    distances[~self._valid[start:stop]] = np.nan
+    return distances
+
+  def exactDistances(self, query: np.ndarray, row_ids: np.ndarray) -> np.ndarray:
+    """Returns the distances between the query vector and the exact vectors of the given (non-null) rows"""
+    diff = self._exact[row_ids] - np.asarray(query, dtype=np.float32)
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff)).astype(np.float64)
+
+  def distances(self, query: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+    """Returns the exact distances if the exact vectors are kept, otherwise the ADC distances"""
+    distances = self.adcDistances(query, start, stop)
+    if self._exact is None:
+      return distances
+    row_ids = np.flatnonzero(~np.isnan(distances))
+    distances[row_ids] = self.exactDistances(query, start + row_ids)
+    return distances
+
+  def rangeSearch(self, query: np.ndarray, radius: float) -> np.ndarray:
+    radius = radius * (1 + 1e-5) + 1e-6
+    distances = self.adcDistances(query)
+    if self._exact is None:
+      return np.flatnonzero(distances <= radius)
+    candidates = np.flatnonzero(distances - self._errors[:self._num_rows] <= radius)
+    return candidates[self.exactDistances(query, candidates) <= radius]
+
+  def knnSearch(self, query: np.ndarray, k: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids of the k nearest (non-null) rows to the query vector and their distances,
+      ordered by the distance (and by the row id for equal distances).
+
+    Without the exact vectors, the search is over the reconstructed vectors.
+    Otherwise, the rows of the k * rerank_factor smallest ADC distances are re-ranked by their exact distances,
+      and so are the other rows which may still be closer than the k-th of them by their reconstruction errors,
+      so that the search is exact.
+    """
+    distances = self.adcDistances(query)
+    row_ids = np.flatnonzero(~np.isnan(distances))
+    if k <= 0 or len(row_ids) == 0:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    distances = distances[row_ids]
+    if self._exact is not None:
+      num_candidates = min(k * self.rerank_factor, len(row_ids))
+      candidates = np.argpartition(distances, num_candidates - 1)[:num_candidates]
+      exact = self.exactDistances(query, row_ids[candidates])
+      kth = np.partition(exact, min(k, len(exact)) - 1)[min(k, len(exact)) - 1]
+      lower_bounds = distances - self._errors[row_ids]
+      lower_bounds[candidates] = np.inf
+      others = np.flatnonzero(lower_bounds <= kth * (1 + 1e-5) + 1e-6)
+      candidates = np.concatenate([candidates, others])
+      row_ids, distances = row_ids[candidates], np.concatenate([exact, self.exactDistances(query, row_ids[others])])
+    order = np.lexsort((row_ids, distances))[:k]
+    return row_ids[order], distances[order]
@@ -0,0 +1,129 @@
+"""
+Extraction of per-column value ranges from selection predicates.
+
+Only the conjuncts like 'column op constant' (op in <, <=, =, >=, >) are extracted,
+  so the rows satisfying the predicate are always a subset of the rows within the ranges,
+  i.e., a scan restricted to the ranges is only a pre-filter,
+  and the full predicate still has to be applied to its results.
+"""
+import typing
+from typing import Dict
+
+from ..ast import *
+from ..utils.exceptions import *
+
+class ColumnRange(object):
+  """
+  The range of values, between 'low' and 'high' (None means unbounded),
+    that a column must fall into to satisfy a predicate.
+  """
+  __slots__ = ('low', 'high', 'low_inclusive', 'high_inclusive')
+
+  def __init__(self, low = None, high = None, low_inclusive: bool = True, high_inclusive: bool = True):
+    self.low = low
+    self.high = high
+    self.low_inclusive = low_inclusive
+    self.high_inclusive = high_inclusive
+
+  def isPoint(self) -> bool:
+    """Returns True if the range only contains a single value, i.e., an equality predicate"""
+    return self.low is not None and self.low_inclusive and self.high_inclusive and self.low == self.high
+
+  def intersect(self, other: 'ColumnRange') -> 'ColumnRange':
+    low, low_inclusive = self.low, self.low_inclusive
+    if other.low is not None and (low is None or other.low > low or (other.low == low and not other.low_inclusive)):
+      low, low_inclusive = other.low, other.low_inclusive
+    high, high_inclusive = self.high, self.high_inclusive
+    if other.high is not None and (high is None or other.high < high or (other.high == high and not other.high_inclusive)):
+      high, high_inclusive = other.high, other.high_inclusive
+    return ColumnRange(low, high, low_inclusive, high_inclusive)
+
+  def isEmpty(self) -> bool:
+    if self.low is None or self.high is None:
+      return False
+    return self.low > self.high or (self.low == self.high and not (self.low_inclusive and self.high_inclusive))
+
+  def contains(self, value) -> bool:
+    if value is None:
+      return False
+    if self.low is not None and (value < self.low or (value == self.low and not self.low_inclusive)):
+      return False
+    if self.high is not None and (value > self.high or (value == self.high and not self.high_inclusive)):
+      return False
+    return True
+
+  def overlaps(self, low, high) -> bool:
+    """Returns True if the range overlaps [low, high], e.g., the min and max values of a block of rows"""
+    if low is None or high is None:
+      # the block has no non-null values, which never satisfy a comparison
+      return False
+    if self.low is not None and (high < self.low or (high == self.low and not self.low_inclusive)):
+      return False
+    if self.high is not None and (low > self.high or (low == self.high and not self.high_inclusive)):
+      return False
+    return True
+
+  def __repr__(self):
+    return "{}{}, {}{}".format(
+      '[' if self.low_inclusive else '(', self.low, self.high, ']' if self.high_inclusive else ')'
+    )
+
+RANGE_COMPARISONS = {
+  LtOp: lambda value: ColumnRange(high=value, high_inclusive=False),
+  LeOp: lambda value: ColumnRange(high=value),
+  EqOp: lambda value: ColumnRange(value, value),
+  GeOp: lambda value: ColumnRange(low=value),
+  GtOp: lambda value: ColumnRange(low=value, low_inclusive=False),
+}
+
+MIRRORED_RANGE_COMPARISONS = {
+  LtOp: GtOp,
+  LeOp: GeOp,
+  EqOp: EqOp,
+  GeOp: LeOp,
+  GtOp: LtOp,
+}
+
+def comparedColumn(bool_op: Expr, schema) -> typing.Tuple[int, typing.Type[Expr], typing.Any]:
+  """
+  Returns (field position, comparison type, constant) if 'bool_op' compares a column with a constant,
+    with the column normalized to the left-hand side, otherwise returns None.
+  """
+  if type(bool_op) not in RANGE_COMPARISONS:
+    return None
+  op_class, lhs, rhs = type(bool_op), bool_op.lhs, bool_op.rhs
+  if not isinstance(lhs, Var) and isinstance(rhs, Var):
+    op_class, lhs, rhs = MIRRORED_RANGE_COMPARISONS[op_class], rhs, lhs
+  if not isinstance(lhs, Var) or not isinstance(rhs, (NumberConst, StringConst)):
+    return None
+  try:
+    pos = schema.field_position(lhs.path)
+  except (FieldNotFoundError, AmbigousFieldError):
+    return None
+  return pos, op_class, rhs.const
+
+def conjuncts(bool_op: Expr) -> typing.List[Expr]:
+  if isinstance(bool_op, And):
+    return conjuncts(bool_op.lhs) + conjuncts(bool_op.rhs)
+  return [bool_op]
+
+def columnRanges(bool_op: Expr, schema) -> Dict[int, ColumnRange]:
+  """
+  Extracts the ranges of the columns (keyed by field position)
+    implied by the conjunctive comparisons between columns and constants in 'bool_op'.
+  """
+  ranges: Dict[int, ColumnRange] = dict()
+  if bool_op is None:
+    return ranges
+  for conjunct in conjuncts(bool_op):
+    compared = comparedColumn(conjunct, schema)
+    if compared is None:
+      continue
+    pos, op_class, value = compared
+    column_range = RANGE_COMPARISONS[op_class](value)
+    try:
+      ranges[pos] = ranges[pos].intersect(column_range) if pos in ranges else column_range
+    except TypeError:
+      # constants of different types compared with the same column, keeps the first range
+      pass
+  return ranges
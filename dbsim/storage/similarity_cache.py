@@ -0,0 +1,141 @@
+"""
+Cache of the results of the similarity range searches like 'column TO q < r'.
+
+The result of a search is kept as the rows within the radius sorted by their distances to the query vector,
+  keyed by (column, hash of the query vector, metric),
+  so repeating the search with the same query vector and a radius at most the cached one
+  is answered by the prefix of the cached rows within the new radius, without computing any distance.
+With a larger radius, the distances are only computed for the rows found by the search
+  that are not already cached (the ring between the two radii), and the cached result is extended with them,
+  unless the search has computed the distances itself, e.g., over all the contiguous vectors of a column,
+  in which case they are reused.
+
+The tables only grow by appending rows, so a cached result stays valid for the rows it was computed from,
+  and is brought up to date by computing the distances of the appended rows only.
+"""
+import typing
+from collections import OrderedDict
+
+import numpy as np
+
+from ..utils import *
+
+def toleratedRadius(radius: float) -> float:
+  """The radius with a small slack for the rounding errors of the distances, as the predicates are applied to the results"""
+  return radius * (1 + 1e-5) + 1e-6
+
+class CachedSearch(object):
+  """
+  The result of the similarity range searches with a query vector over the first 'num_rows' rows of a table:
+    the ids of the rows within distance 'radius' of the query vector and their distances, in ascending order of the distances.
+  """
+  __slots__ = ('query', 'radius', 'num_rows', 'distances', 'row_ids')
+
+  def __init__(self, query: np.ndarray):
+    self.query = query
+    self.radius = -np.inf
+    self.num_rows = 0
+    self.distances = np.empty(0, dtype=np.float64)
+    self.row_ids = np.empty(0, dtype=np.int64)
+
+  def rowIds(self, radius: float) -> np.ndarray:
+    """Returns the ids (in ascending order) of the cached rows within distance 'radius' (with the slack)"""
+    stop = np.searchsorted(self.distances, toleratedRadius(radius), side='right')
+    return np.sort(self.row_ids[:stop])
+
+  def add(self, row_ids: np.ndarray, distances: np.ndarray) -> None:
+    """Adds the rows (not cached yet) within the radius (with the slack), where the distances of null vectors are NaN"""
+    within = distances <= toleratedRadius(self.radius)
+    distances = np.concatenate([self.distances, distances[within]])
+    row_ids = np.concatenate([self.row_ids, np.asarray(row_ids, dtype=np.int64)[within]])
+    order = np.lexsort((row_ids, distances))
+    self.distances, self.row_ids = distances[order], row_ids[order]
+
+class SimilarityCache(object):
+  """
+  Least-recently-used cache of the results of the similarity range searches over the vector columns of a table.
+
+  Parameters
+  ------------
+  max_entries: maximum number of cached (column, query vector, metric) results
+  max_rows: maximum total number of rows in the cached results, each taking 16 bytes (its id and its distance),
+              beyond which the least recently used results are evicted, including a new result larger than it
+  """
+  def __init__(self, max_entries: int = 64, max_rows: int = 1 << 22):
+    self.max_entries = max_entries
+    self.max_rows = max_rows
+    self._entries: typing.Dict[typing.Tuple, CachedSearch] = OrderedDict()
+    self.num_hits = 0
+    """Number of searches answered by the cached results without computing any distance"""
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def clear(self) -> None:
+    self._entries.clear()
+
+  def numCachedRows(self) -> int:
+    return sum(len(entry.row_ids) for entry in self._entries.values())
+
+  def _evict(self) -> None:
+    """Evicts the least recently used results until the cache is within its bounds"""
+    num_rows = self.numCachedRows()
+    while len(self._entries) > 0 and (len(self._entries) > self.max_entries or num_rows > self.max_rows):
+      _, entry = self._entries.popitem(last=False)
+      num_rows -= len(entry.row_ids)
+
+  def _entry(self, column_name: str, query: np.ndarray, metric: str, create: bool = False) -> CachedSearch:
+    key = (column_name, query.shape, hash(query.tobytes()), metric)
+    entry = self._entries.get(key)
+    if entry is not None and not np.array_equal(entry.query, query):
+      # hash collision
+      entry = None
+    if entry is None and create:
+      entry = self._entries[key] = CachedSearch(query)
+    if entry is not None:
+      self._entries.move_to_end(key)
+    return entry
+
+  def covers(self, column_name: str, query: np.ndarray, radius: float, num_rows: int, metric: str = 'EUC') -> bool:
+    """Returns True if the search is answered by a cached result without computing any distance"""
+    entry = self._entry(column_name, np.asarray(query, dtype=np.float64), metric)
+    return entry is not None and entry.radius >= radius and entry.num_rows == num_rows
+
+  def rangeSearch(
+    self, column_name: str, query: np.ndarray, radius: float, num_rows: int,
+    search: typing.Callable, distances: typing.Callable, metric: str = 'EUC'
+  ) -> np.ndarray:
+    """
+    Returns the ids (in ascending order) of the rows whose distances to the query vector are at most 'radius',
+      with a small slack for the rounding errors of the distances, among the first 'num_rows' rows of the table.
+
+    Parameters
+    ------------
+    search: the function ((query vector, radius) -> (ids of the rows, their distances or None))
+              returning a superset of the rows within the radius, e.g., by VectorIndex.rangeSearch,
+              and their distances if it has computed them, e.g., over the contiguous vectors of the column
+    distances: the function ((query vector, row ids) -> distances) computing the distances of the rows
+                which the search has not computed, where the distances of the null vectors are NaN
+    """
+    query = np.asarray(query, dtype=np.float64)
+    entry = self._entry(column_name, query, metric, create=True)
+    if entry.radius >= radius and entry.num_rows == num_rows:
+      self.num_hits += 1
+      return entry.rowIds(radius)
+    if entry.num_rows < num_rows and entry.radius >= 0:
+      # the appended rows
+      row_ids = np.arange(entry.num_rows, num_rows)
+      entry.add(row_ids, distances(query, row_ids))
+    entry.num_rows = num_rows
+    if radius > entry.radius:
+      # the ring between the cached radius and the new one
+      row_ids, row_distances = search(query, radius)
+      row_ids = np.asarray(row_ids, dtype=np.int64)
+      ring = ~np.isin(row_ids, entry.row_ids, assume_unique=True)
+      row_ids = row_ids[ring]
+      row_distances = row_distances[ring] if row_distances is not None else distances(query, row_ids)
+      entry.radius = radius
+      entry.add(row_ids, row_distances)
+    result = entry.rowIds(radius)
+    self._evict()
+    return result
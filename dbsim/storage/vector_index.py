@@ -0,0 +1,299 @@
+"""
+Vector indexes over the vector columns of the in-memory tables,
+  which answer similarity predicates like 'embedding TO [..] < r'
+  and k-nearest-neighbour searches without computing the distance to every row.
+
+  - IVFFlatIndex: the vectors partitioned into lists by k-means (an inverted file),
+      where only the lists whose centroids are close enough to the query vector are searched.
+
+The distances are Euclidean, like the distances computed by the 'TO' operator.
+Null vectors are not indexed.
+"""
+import typing
+from typing import Sequence, List
+
+import numpy as np
+
+from ..utils import *
+from ..utils.exceptions import *
+from .index import Index, IndexType, INDEX_TYPES
+from .vector_store import VectorStore
+from .ranges import ColumnRange, conjuncts, MIRRORED_RANGE_COMPARISONS
+from ..ast import *
+
+def indexableVectors(values: Sequence) -> typing.Tuple[np.ndarray, np.ndarray]:
+  """
+  Returns the non-null vectors as a (n, dim) float32 matrix and their row ids (relative to the start of 'values'),
+    which are either a sequence of vectors (or None), a (n, dim) matrix, or a VectorStore.
+  """
+  if isinstance(values, VectorStore):
+    row_ids = np.flatnonzero(values.valid)
+    matrix = values.matrix if len(row_ids) == len(values) else values.vectors(row_ids)
+    return np.ascontiguousarray(matrix, dtype=np.float32), row_ids
+  if isinstance(values, np.ndarray) and values.ndim == 2:
+    return np.ascontiguousarray(values, dtype=np.float32), np.arange(len(values))
+  row_ids = np.array([i for i, v in enumerate(values) if v is not None], dtype=np.int64)
+  if len(row_ids) == 0:
+    return np.empty((0, 0), dtype=np.float32), row_ids
+  return np.stack([np.asarray(values[i], dtype=np.float32) for i in row_ids]), row_ids
+
+def squaredDistances(vectors: np.ndarray, centroids: np.ndarray, centroid_norms: np.ndarray = None) -> np.ndarray:
+  """Returns the (n, k) matrix of the squared Euclidean distances between the vectors and the centroids"""
+  if centroid_norms is None:
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+  vector_norms = np.einsum('ij,ij->i', vectors, vectors)
+  return np.maximum(vector_norms[:, None] - 2 * (vectors @ centroids.T) + centroid_norms[None, :], 0)
+
+def nearestCentroids(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 1 << 14) -> np.ndarray:
+  """Returns the position of the nearest centroid of each vector"""
+  centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+  assignment = np.empty(len(vectors), dtype=np.int64)
+  for start in range(0, len(vectors), batch_size):
+    batch = vectors[start:start + batch_size]
+    assignment[start:start + batch_size] = np.argmin(squaredDistances(batch, centroids, centroid_norms), axis=1)
+  return assignment
+
+def kmeans(vectors: np.ndarray, k: int, num_iterations: int = 10, seed: int = 0) -> np.ndarray:
+  """
+  Returns the k centroids of the vectors found by Lloyd's algorithm,
+    starting from k distinct vectors chosen at random.
+  """
+  random = np.random.default_rng(seed)
+  centroids = vectors[random.choice(len(vectors), size=k, replace=False)].astype(np.float64)
+  for _ in range(num_iterations):
+    assignment = nearestCentroids(vectors, centroids)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assignment, vectors)
+    counts = np.bincount(assignment, minlength=k)
+    non_empty = counts > 0
+    # the centroids of empty clusters are kept
+    centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+  return centroids.astype(np.float32)
+
+
+class VectorIndex(Index):
+  """
+  Base class of the indexes over a vector column,
+    which do not serve the range predicates on scalar values (see Index.supports)
+    but similarity predicates (see VectorIndex.rangeSearch and VectorIndex.knnSearch).
+  """
+
+  def supports(self, column_range: ColumnRange) -> bool:
+    return False
+
+  def lookup(self, column_range: ColumnRange) -> np.ndarray:
+    raise NotImplementedError("vector indexes do not support lookups by value ranges")
+
+  def rangeSearch(self, query: np.ndarray, radius: float) -> np.ndarray:
+    """
+    Returns the ids (in ascending order) of a superset of the rows
+      whose distances to the query vector are at most 'radius'.
+    """
+    raise NotImplementedError
+
+  def knnSearch(self, query: np.ndarray, k: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids of the (approximate) k nearest rows to the query vector and their distances,
+      ordered by the distance.
+    """
+    raise NotImplementedError
+
+  def rangeSearchCost(self, query: np.ndarray, radius: float) -> float:
+    """Estimated number of vectors whose distances are computed by rangeSearch, used to plan the scans"""
+    return float(self.num_rows)
+
+  def knnSearchCost(self, k: int) -> float:
+    """Estimated number of vectors whose distances are computed by knnSearch, used to plan the scans"""
+    return float(self.num_rows)
+
+
+class IVFFlatIndex(VectorIndex):
+  """
+  Inverted file index with uncompressed ('flat') vectors.
+
+  The vectors are clustered by k-means into 'num_lists' lists (sqrt(n) by default),
+    each of which keeps its vectors contiguously with their row ids,
+    and the distance from its centroid to its farthest vector (its radius).
+
+  By the triangle inequality, a list may only contain vectors within distance r of the query
+    if the distance from the query to its centroid minus its radius is at most r,
+    so range searches only compute the distances to the vectors of such lists and are exact.
+  k-NN searches compute the distances to the vectors of the 'nprobe' lists with the nearest centroids
+    (more if those lists are unlikely to hold k vectors, and all of them if they do not),
+    which trades recall for speed: the larger 'nprobe', the higher the recall,
+    and the search is exact when 'nprobe' is 'num_lists'.
+
+  The centroids are trained on the vectors the index is built with (a sample of them for large columns),
+    and the vectors of the appended rows are added to the lists of their nearest centroids.
+  """
+  index_type = IndexType.IVF_FLAT
+  max_training_size_per_list = 256
+  """Maximum number of vectors per list sampled to train the centroids"""
+
+  def __init__(
+    self, column_name: str, values: Sequence = (),
+    num_lists: int = None, nprobe: int = 8, num_iterations: int = 10, seed: int = 0
+  ):
+    super().__init__(column_name)
+    self.num_lists = num_lists
+    self.nprobe = nprobe
+    """Number of lists searched by k-NN searches"""
+    self.num_iterations = num_iterations
+    self.seed = seed
+    self.centroids: np.ndarray = None
+    self._list_vectors: List[np.ndarray] = []
+    self._list_row_ids: List[np.ndarray] = []
+    self._radii: np.ndarray = None
+    self.update(values)
+
+  def _train(self, vectors: np.ndarray) -> None:
+    if self.num_lists is None:
+      self.num_lists = max(1, int(np.sqrt(len(vectors))))
+    self.num_lists = min(self.num_lists, len(vectors))
+    training_size = self.num_lists * self.max_training_size_per_list
+    if len(vectors) > training_size:
+      sample = np.random.default_rng(self.seed).choice(len(vectors), size=training_size, replace=False)
+      vectors = vectors[sample]
+    self.centroids = kmeans(vectors, self.num_lists, self.num_iterations, self.seed)
+    dim = self.centroids.shape[1]
+    self._list_vectors = [np.empty((0, dim), dtype=np.float32) for _ in range(self.num_lists)]
+    self._list_row_ids = [np.empty(0, dtype=np.int64) for _ in range(self.num_lists)]
+    self._radii = np.zeros(self.num_lists, dtype=np.float64)
+
+  def update(self, values: Sequence) -> None:
+    vectors, row_ids = indexableVectors(values)
+    row_ids = row_ids + self.num_rows
+    self.num_rows += len(values)
+    if len(vectors) == 0:
+      return
+    if self.centroids is None:
+      self._train(vectors)
+    ERROR_IF_NOT_EQ(
+      vectors.shape[1], self.centroids.shape[1],
+      "cannot index vectors of size {} with vectors of size {}".format(vectors.shape[1], self.centroids.shape[1])
+    )
+    assignment = nearestCentroids(vectors, self.centroids)
+    order = np.argsort(assignment, kind='stable')
+    starts = np.searchsorted(assignment[order], np.arange(self.num_lists + 1))
+    for i in np.flatnonzero(np.diff(starts)).tolist():
+      members = order[starts[i]:starts[i + 1]]
+      self._list_vectors[i] = np.concatenate([self._list_vectors[i], vectors[members]])
+      self._list_row_ids[i] = np.concatenate([self._list_row_ids[i], row_ids[members]])
+      diff = vectors[members] - self.centroids[i]
+      self._radii[i] = max(self._radii[i], float(np.sqrt(np.einsum('ij,ij->i', diff, diff).max())))
+
+  def listSizes(self) -> np.ndarray:
+    return np.array([len(row_ids) for row_ids in self._list_row_ids], dtype=np.int64)
+
+  def _centroidDistances(self, query: np.ndarray) -> np.ndarray:
+    diff = self.centroids - np.asarray(query, dtype=np.float32)
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+  def _listDistances(self, lists: Sequence[int], query: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns the row ids of the vectors in the given lists and their distances to the query vector"""
+    if len(lists) == 0:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    vectors = np.concatenate([self._list_vectors[i] for i in lists])
+    row_ids = np.concatenate([self._list_row_ids[i] for i in lists])
+    diff = vectors - np.asarray(query, dtype=np.float32)
+    return row_ids, np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+  def rangeSearch(self, query: np.ndarray, radius: float) -> np.ndarray:
+    if self.centroids is None:
+      return np.empty(0, dtype=np.int64)
+    # a relative slack covers the rounding errors of the float32 vectors,
+    #   as the exact predicate is applied to the returned rows anyway
+    radius = radius * (1 + 1e-5) + 1e-6
+    lists = np.flatnonzero(self._centroidDistances(query) - self._radii <= radius)
+    row_ids, distances = self._listDistances(lists.tolist(), query)
+    return np.sort(row_ids[distances <= radius])
+
+  def _numProbes(self, k: int, nprobe: int = None) -> int:
+    """
+    Returns the number of lists probed by a k-NN search:
+      'nprobe', or more if the lists of that many centroids are unlikely to hold k vectors (e.g., for over-fetching)
+    """
+    num_indexed = max(int(self.listSizes().sum()), 1)
+    nprobe = max(nprobe or self.nprobe, int(np.ceil(k * self.num_lists / num_indexed)))
+    return min(nprobe, self.num_lists)
+
+  def rangeSearchCost(self, query: np.ndarray, radius: float) -> float:
+    if self.centroids is None:
+      return 0.0
+    lists = np.flatnonzero(self._centroidDistances(query) - self._radii <= radius * (1 + 1e-5) + 1e-6)
+    return float(self.num_lists + self.listSizes()[lists].sum())
+
+  def knnSearchCost(self, k: int) -> float:
+    if self.centroids is None:
+      return 0.0
+    return float(self.num_lists + self.listSizes().sum() * self._numProbes(k) / self.num_lists)
+
+  def knnSearch(self, query: np.ndarray, k: int, nprobe: int = None) -> typing.Tuple[np.ndarray, np.ndarray]:
+    if self.centroids is None or k <= 0:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    nprobe = self._numProbes(k, nprobe)
+    centroid_distances = self._centroidDistances(query)
+    lists = np.argpartition(centroid_distances, nprobe - 1)[:nprobe] if nprobe < self.num_lists else np.arange(self.num_lists)
+    row_ids, distances = self._listDistances(lists.tolist(), query)
+    if len(distances) < k and len(lists) < self.num_lists:
+      # the probed lists hold fewer than k vectors: all the lists are searched
+      row_ids, distances = self._listDistances(list(range(self.num_lists)), query)
+    if k < len(distances):
+      nearest = np.argpartition(distances, k - 1)[:k]
+      row_ids, distances = row_ids[nearest], distances[nearest]
+    order = np.lexsort((row_ids, distances))
+    return row_ids[order], distances[order].astype(np.float64)
+
+
+INDEX_TYPES[IndexType.IVF_FLAT] = IVFFlatIndex
+
+
+def similarityRanges(bool_op: Expr, schema) -> List[typing.Tuple[int, np.ndarray, float]]:
+  """
+  Extracts the conjuncts like 'column TO vector < r' (or <=, or mirrored) from the predicate
+    as (field position of the vector column, query vector, r).
+  """
+  ranges = []
+  if bool_op is None:
+    return ranges
+  for conjunct in conjuncts(bool_op):
+    op_class = type(conjunct)
+    if op_class not in MIRRORED_RANGE_COMPARISONS:
+      continue
+    lhs, rhs = conjunct.lhs, conjunct.rhs
+    if isinstance(lhs, NumberConst):
+      op_class, lhs, rhs = MIRRORED_RANGE_COMPARISONS[op_class], rhs, lhs
+    if op_class not in (LtOp, LeOp) or not isinstance(rhs, NumberConst) or not isInstanceByClassName(lhs, 'ToOp'):
+      continue
+    column, vector = lhs.lhs, lhs.rhs
+    if isinstance(column, Const):
+      column, vector = vector, column
+    if not isinstance(column, Var) or not isinstance(vector, Const) or not isinstance(vector.const, np.ndarray):
+      continue
+    try:
+      pos = schema.field_position(column.path)
+    except (FieldNotFoundError, AmbigousFieldError):
+      continue
+    ranges.append((pos, vector.const, rhs.const))
+  return ranges
+
+def nearestNeighbourQuery(exprs: Sequence[Expr], schema) -> typing.Tuple[int, np.ndarray]:
+  """
+  Extracts the k-NN search from the expressions of an ORDER BY,
+    which must be the single (ascending) expression 'column TO vector' (or 'vector TO column'),
+    as (field position of the vector column, query vector), or returns None for any other ordering.
+  """
+  if len(exprs) != 1:
+    return None
+  expr = exprs[0].expr if isinstance(exprs[0], Asc) else exprs[0]
+  if not isInstanceByClassName(expr, 'ToOp'):
+    return None
+  column, vector = expr.lhs, expr.rhs
+  if isinstance(column, Const):
+    column, vector = vector, column
+  if not isinstance(column, Var) or not isinstance(vector, Const) or not isinstance(vector.const, np.ndarray):
+    return None
+  try:
+    return schema.field_position(column.path), vector.const
+  except (FieldNotFoundError, AmbigousFieldError):
+    return None
@@ -0,0 +1,178 @@
+"""
+Contiguous storage of a vector column:
+  the vectors of all the rows are the rows of a single (n, dim) float32 (or float16) matrix,
+  instead of one NumPy array allocated per cell of an object column.
+
+The rows of the tables refer to the vectors by views of the matrix rows (see VectorStore.row),
+  and the distances to a query vector are computed over slices of the matrix (see VectorStore.distances)
+  without gathering the vectors of the rows first.
+"""
+import typing
+from typing import Sequence
+
+import numpy as np
+
+from ..utils import *
+
+class VectorStore(object):
+  """
+  The vectors of a column as the rows of a contiguous matrix, whose row i is the vector of row i of the table.
+
+  A null vector takes a row of zeros, marked as invalid (see VectorStore.valid).
+  The matrix grows by doubling its capacity when rows are appended,
+    so the views of the rows given out before keep referring to the vectors they were taken from.
+  """
+  batch_size = 1 << 14
+  """Number of rows whose distances are computed at a time, which bounds the size of the temporary arrays"""
+
+  def __init__(self, values: Sequence = (), dtype=np.float32):
+    ERROR_IF_FALSE(
+      np.dtype(dtype) in (np.dtype(np.float32), np.dtype(np.float16)),
+      "vectors can only be stored as float32 or float16 ({} received)".format(np.dtype(dtype))
+    )
+    self.dtype = np.dtype(dtype)
+    self._matrix: np.ndarray = None
+    self._valid = np.zeros(0, dtype=bool)
+    self._num_rows = 0
+    self.append(values)
+
+  def __len__(self) -> int:
+    return self._num_rows
+
+  @property
+  def dim(self) -> int:
+    return self._matrix.shape[1] if self._matrix is not None else 0
+
+  @property
+  def matrix(self) -> np.ndarray:
+    """The (n, dim) matrix of the vectors (a view, not a copy)"""
+    if self._matrix is None:
+      return np.zeros((self._num_rows, 0), dtype=self.dtype)
+    return self._matrix[:self._num_rows]
+
+  @property
+  def nbytes(self) -> int:
+    """Number of bytes taken by the vectors (the unused capacity excluded)"""
+    return self.matrix.nbytes + self.valid.nbytes
+
+  @property
+  def valid(self) -> np.ndarray:
+    """The mask of the rows whose vectors are not null"""
+    return self._valid[:self._num_rows]
+
+  def _reserve(self, num_rows: int, dim: int) -> None:
+    capacity = len(self._valid)
+    if self._matrix is None:
+      self._matrix = np.zeros((capacity, dim), dtype=self.dtype)
+    ERROR_IF_NOT_EQ(dim, self.dim, "cannot store vectors of size {} with vectors of size {}".format(dim, self.dim))
+    if num_rows <= capacity:
+      return
+    capacity = max(num_rows, 2 * capacity)
+    matrix = np.zeros((capacity, dim), dtype=self.dtype)
+    matrix[:self._num_rows] = self._matrix[:self._num_rows]
+    valid = np.zeros(capacity, dtype=bool)
+    valid[:self._num_rows] = self._valid[:self._num_rows]
+    self._matrix, self._valid = matrix, valid
+
+  def append(self, values: Sequence) -> None:
+    """Appends the vectors (or None) of new rows, given as a sequence or as a (n, dim) matrix"""
+    start, num_values = self._num_rows, len(values)
+    if num_values == 0:
+      return
+    if isinstance(values, np.ndarray) and values.ndim == 2:
+      self._reserve(start + num_values, values.shape[1])
+      self._matrix[start:start + num_values] = values
+      self._valid[start:start + num_values] = True
+    else:
+      positions = [i for i, v in enumerate(values) if v is not None]
+      if len(positions) > 0:
+        vectors = np.stack([np.asarray(values[i]) for i in positions])
+        self._reserve(start + num_values, vectors.shape[1])
+        self._matrix[start + np.array(positions)] = vectors
+        self._valid[start + np.array(positions)] = True
+      elif self._matrix is not None:
+        self._reserve(start + num_values, self.dim)
+      elif start + num_values > len(self._valid):
+        # the size of the vectors is not known until the first non-null vector
+        self._valid = np.concatenate([self._valid, np.zeros(start + num_values - len(self._valid), dtype=bool)])
+    self._num_rows += num_values
+
+  def row(self, row_id: int) -> np.ndarray:
+    """Returns the vector of the row as a view of the matrix row, or None if it is null"""
+    row_id = int(row_id)
+    return self._matrix[row_id] if self._valid[row_id] else None
+
+  def rows(self, row_ids: Sequence[int]) -> np.ndarray:
+    """Returns the vectors of the rows (as views, or None) in an object array"""
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    vectors = np.empty(len(row_ids), dtype=object)
+    valid = self._valid[row_ids]
+    for i, row_id in enumerate(row_ids.tolist()):
+      if valid[i]:
+        vectors[i] = self._matrix[row_id]
+    return vectors
+
+  def vectors(self, row_ids: Sequence[int]) -> np.ndarray:
+    """Returns the (len(row_ids), dim) matrix of the vectors of the rows, where the null vectors are zeros"""
+    return self.matrix[np.asarray(row_ids, dtype=np.int64)]
+
+  def distances(self, query: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    Returns the Euclidean distances between the query vector and the vectors of rows [start, stop),
+      where the distances of the null vectors are NaN.
+    """
+    stop = self._num_rows if stop is None else min(stop, self._num_rows)
+    if self._matrix is None or start >= stop:
+      return np.full(max(stop - start, 0), np.nan)
+    query = np.asarray(query, dtype=np.float32)
+    ERROR_IF_NOT_EQ(
+      query.shape[-1], self.dim,
+      "could not compute the distances between vectors of sizes {} and {}".format(query.shape[-1], self.dim)
+    )
+    distances = np.empty(stop - start, dtype=np.float64)
+    for batch_start in range(start, stop, self.batch_size):
+      batch_stop = min(batch_start + self.batch_size, stop)
+      diff = self._matrix[batch_start:batch_stop].astype(np.float32, copy=False) - query
+      distances[batch_start - start:batch_stop - start] = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    distances[~self._valid[start:stop]] = np.nan
+    return distances
+
+  def rangeSearch(self, query: np.ndarray, radius: float) -> np.ndarray:
+    """
+    Returns the ids (in ascending order) of the rows whose distances to the query vector are at most 'radius',
+      with a small slack for the rounding errors of the stored vectors.
+    """
+    radius = radius * (1 + 1e-5) + 1e-6
+    row_ids = [
+      batch_start + np.flatnonzero(self.distances(query, batch_start, batch_start + self.batch_size) <= radius)
+      for batch_start in range(0, self._num_rows, self.batch_size)
+    ]
+    return np.concatenate(row_ids) if len(row_ids) > 0 else np.empty(0, dtype=np.int64)
+
+  def rangeSearchCost(self, query: np.ndarray, radius: float) -> float:
+    """Estimated number of vectors whose distances are computed by rangeSearch (all of them), used to plan the scans"""
+    return float(self._num_rows)
+
+  def knnSearchCost(self, k: int) -> float:
+    """Estimated number of vectors whose distances are computed by knnSearch (all of them), used to plan the scans"""
+    return float(self._num_rows)
+
+  def knnSearch(self, query: np.ndarray, k: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the ids of the k nearest (non-null) rows to the query vector and their distances,
+      ordered by the distance (and by the row id for equal distances).
+    The search is exact: only the k nearest rows so far are kept between the batches of rows.
+    """
+    best_row_ids, best_distances = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    if k <= 0:
+      return best_row_ids, best_distances
+    for batch_start in range(0, self._num_rows, self.batch_size):
+      distances = self.distances(query, batch_start, batch_start + self.batch_size)
+      row_ids = batch_start + np.flatnonzero(~np.isnan(distances))
+      best_row_ids = np.concatenate([best_row_ids, row_ids])
+      best_distances = np.concatenate([best_distances, distances[row_ids - batch_start]])
+      if len(best_distances) > k:
+        best = np.lexsort((best_row_ids, best_distances))[:k]
+        best_row_ids, best_distances = best_row_ids[best], best_distances[best]
+    order = np.lexsort((best_row_ids, best_distances))
+    return best_row_ids[order], best_distances[order]
@@ -0,0 +1,133 @@
+"""
+Zone maps, i.e., the min/max values of each block of consecutive rows of the orderable columns.
+
+A scan with a range (or equality) predicate on a column only has to read the blocks
+  whose [min, max] overlaps the range.
+This works best when the rows are (roughly) sorted by the column,
+  like event tables appended in time order and filtered by recent time ranges.
+"""
+import typing
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from ..statistics import isOrderableField, isNull, toPythonValue
+from ..utils import *
+from .ranges import ColumnRange
+
+class IncomparableValues(Exception):
+  """Informational exception raised when the values of a column cannot be ordered."""
+  pass
+
+def blockMinMax(values: Sequence) -> typing.Tuple[typing.Any, typing.Any]:
+  """Returns the min and max of the non-null values, or (None, None) if all the values are null"""
+  if isinstance(values, np.ndarray) and values.dtype.kind in 'iufbmM':
+    if values.dtype.kind == 'M':
+      # converted into datetime.datetime instead of integers when calling item()
+      values = values.astype('datetime64[us]')
+    if values.dtype.kind == 'f':
+      values = values[~np.isnan(values)]
+    elif values.dtype.kind in 'mM':
+      values = values[~np.isnat(values)]
+    if len(values) == 0:
+      return None, None
+    return toPythonValue(values.min()), toPythonValue(values.max())
+  non_nulls = [v for v in values if not isNull(v)]
+  if len(non_nulls) == 0:
+    return None, None
+  try:
+    return toPythonValue(min(non_nulls)), toPythonValue(max(non_nulls))
+  except TypeError:
+    raise IncomparableValues
+
+def mergeMinMax(old: typing.Tuple, new: typing.Tuple) -> typing.Tuple:
+  if old[0] is None:
+    return new
+  if new[0] is None:
+    return old
+  try:
+    return min(old[0], new[0]), max(old[1], new[1])
+  except TypeError:
+    raise IncomparableValues
+
+
+class ZoneMap(object):
+  """
+  Min/max values of each block of 'block_size' rows for the orderable columns of a table.
+
+  The zone map is maintained incrementally as rows are appended to the table,
+    i.e., only the last (partial) block and the new blocks are updated.
+  Columns whose values cannot be compared with each other are excluded.
+  """
+  default_block_size = 65536
+
+  def __init__(self, schema, block_size: int = None):
+    self.schema = schema
+    self.block_size = block_size or self.default_block_size
+    ERROR_IF_FALSE(self.block_size > 0, "the block size must be positive ({} received)".format(self.block_size))
+    self.num_rows = 0
+    self.columns: Dict[int, List[typing.Tuple]] = {
+      pos: []
+      for pos, f in enumerate(schema.fields)
+      if isOrderableField(f)
+    }
+    """field position -> list of (min, max) of each block"""
+
+  @classmethod
+  def fromColumns(cls, schema, columns: List[Sequence], block_size: int = None) -> 'ZoneMap':
+    zone_map = cls(schema, block_size)
+    zone_map.update(columns)
+    return zone_map
+
+  def update(self, columns: List[Sequence]) -> None:
+    """Updates the zone map with appended rows, given as one sequence of values per field"""
+    if len(columns) == 0:
+      return
+    num_new_rows = len(columns[0])
+    if num_new_rows == 0:
+      return
+    num_free = (self.block_size - self.num_rows % self.block_size) % self.block_size
+    for pos in list(self.columns.keys()):
+      values, blocks = columns[pos], self.columns[pos]
+      try:
+        if num_free > 0:
+          # fills the last partial block
+          blocks[-1] = mergeMinMax(blocks[-1], blockMinMax(values[:num_free]))
+        for start in range(num_free, num_new_rows, self.block_size):
+          blocks.append(blockMinMax(values[start:start + self.block_size]))
+      except IncomparableValues:
+        del self.columns[pos]
+    self.num_rows += num_new_rows
+
+  def numBlocks(self) -> int:
+    return (self.num_rows + self.block_size - 1) // self.block_size
+
+  def blockRange(self, block: int) -> typing.Tuple[int, int]:
+    """Returns the [start, stop) row ids of the block"""
+    start = block * self.block_size
+    return start, min(start + self.block_size, self.num_rows)
+
+  def candidateBlocks(self, ranges: Dict[int, ColumnRange]) -> List[int]:
+    """Returns the blocks that may contain rows within all the given column ranges (keyed by field position)"""
+    candidates = np.ones(self.numBlocks(), dtype=bool)
+    for pos, column_range in ranges.items():
+      if pos not in self.columns:
+        continue
+      try:
+        overlaps = [column_range.overlaps(low, high) for low, high in self.columns[pos]]
+      except TypeError:
+        # the constants in the predicate are not comparable with the column values
+        continue
+      candidates &= np.array(overlaps, dtype=bool)
+    return np.flatnonzero(candidates).tolist()
+
+  def candidateRowRanges(self, ranges: Dict[int, ColumnRange]) -> List[typing.Tuple[int, int]]:
+    """Returns the [start, stop) row ids of the candidate blocks, where consecutive blocks are merged"""
+    row_ranges = []
+    for block in self.candidateBlocks(ranges):
+      start, stop = self.blockRange(block)
+      if row_ranges and row_ranges[-1][1] == start:
+        row_ranges[-1] = (row_ranges[-1][0], stop)
+      else:
+        row_ranges.append((start, stop))
+    return row_ranges
@@ -0,0 +1,7 @@
+from dbsim.compilers import local
+
+def execute_with_stat(query):
+  """Executes the query, and returns its rows with the (number of processed rows, cost factor) of each operator"""
+  ctx = {'dataset': query.dataset, 'params': ()}
+  results = list(local.compile(query)(ctx))
+  return results, ctx[local.stat_field_in_ctx][local.num_input_rows_and_cost_factor_field]
@@ -0,0 +1,29 @@
+from dbsim import dataset as ds
+from dbsim.adapters.dataframe_adapter import DataFrameAdapter
+from pandas import DataFrame, Series
+from ...field import FieldType
+import numpy as np
+
+def items_adapter(vectors, columns: dict = None, **table_params) -> DataFrameAdapter:
+  """
+  DataFrameAdapter of the table 'items' (item_id, the given integer columns, embedding) over the vectors,
+    some of which may be None, where 'table_params' are the other parameters of the table, e.g., vector_compression
+  """
+  columns = columns or dict()
+  return DataFrameAdapter(items=dict(
+    schema=dict(fields=
+      [dict(name="item_id", type=FieldType.INTEGER)]
+      + [dict(name=name, type=FieldType.INTEGER) for name in columns]
+      + [dict(name="embedding", type=FieldType.VECTOR)]
+    ),
+    dataframe=DataFrame(dict(item_id=np.arange(len(vectors)), **columns, embedding=Series(list(vectors), dtype=object))),
+    **table_params
+  ))
+
+def items_dataset(vectors, columns: dict = None, **table_params) -> ds.DataSet:
+  dataset = ds.DataSet()
+  dataset.add_adapter(items_adapter(vectors, columns, **table_params))
+  return dataset
+
+def vector_literal(vector) -> str:
+  return '[' + ', '.join(str(x) for x in vector) + ']'
@@ -0,0 +1,41 @@
+from ..adapters import adapter_factory
+from ..adapters.adapter_factory import AdapterFactory
+from ..extensions.extended_syntax.sim_select_syntax import *
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+
+def write_files(dirpath):
+  for i in range(3):
+    (dirpath / "embeddings_{}.csv".format(i)).write_text(
+      'id,name,embedding\n' + ''.join('{},n{},"[{}, 2, 3]"\n'.format(j, j, i + j) for j in range(5))
+    )
+  (dirpath / "scores.tsv").write_text('id\tscore\n1\t0.5\n2\t1.5\n')
+  (dirpath / "notes.txt").write_text('not a dataset')
+
+def test_from_glob(tmp_path):
+  write_files(tmp_path)
+  adapters = AdapterFactory.fromGlob(str(tmp_path / "*"), max_workers=2)
+  names = [adapter.relations[0][0] for adapter in adapters]
+  assert names == ["embeddings_0", "embeddings_1", "embeddings_2", "scores"]
+  for name, adapter in zip(names, adapters):
+    expected = AdapterFactory.fromFile(str(next(tmp_path.glob(name + ".*"))))
+    assert [(f.name, f.type.name) for f in adapter.schema(name).fields] == \
+      [(f.name, f.type.name) for f in expected.schema(name).fields]
+    rows, expected_rows = list(adapter.get_relation(name)), list(expected.get_relation(name))
+    assert [row[:-1] for row in rows] == [row[:-1] for row in expected_rows]
+  assert adapters[1].schema("embeddings_1").get_field("embedding").type.name == "VECTOR"
+  assert list(adapters[1].get_relation("embeddings_1"))[2][2].tolist() == [3.0, 2.0, 3.0]
+
+def test_from_files_spawned_workers(tmp_path, monkeypatch):
+  # the workers started without the state of the parent process register the extended data types again
+  write_files(tmp_path)
+  monkeypatch.setattr(
+    adapter_factory, "ProcessPoolExecutor",
+    partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn"))
+  )
+  adapters = AdapterFactory.fromFiles(
+    [str(tmp_path / "embeddings_0.csv"), str(tmp_path / "embeddings_1.csv")], ds_names=["a", "b"], max_workers=2
+  )
+  assert [adapter.relations[0][0] for adapter in adapters] == ["a", "b"]
+  assert adapters[0].schema("a").get_field("embedding").type.name == "VECTOR"
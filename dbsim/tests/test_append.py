@@ -0,0 +1,90 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..field import FieldType
+from ..planners.cost.sampling import SamplingEstimator
+from ..storage.index import IndexType
+from pandas import DataFrame
+import numpy as np
+
+events_schema = dict(
+  fields=[
+    dict(name="event_id", type=FieldType.INTEGER),
+    dict(name="kind", type=FieldType.STRING),
+    dict(name="value", type=FieldType.FLOAT)
+  ]
+)
+
+def events(start, stop):
+  random = np.random.default_rng(start)
+  return [
+    dict(event_id=i, kind="abc"[i % 3], value=float(v))
+    for i, v in zip(range(start, stop), random.random(stop - start) * 100)
+  ]
+
+def events_data_sets():
+  dict_dataset = ds.DataSet()
+  dict_dataset.add_adapter(DictAdapter(events=dict(schema=events_schema, rows=events(0, 100), block_size=16)))
+  df_dataset = ds.DataSet()
+  df_dataset.add_adapter(DataFrameAdapter(events=dict(schema=events_schema, dataframe=DataFrame(events(0, 100)), block_size=16)))
+  return dict_dataset, df_dataset
+
+def query_rows(dataset, sql):
+  return sorted(tuple(row) for row in dataset.query(sql))
+
+def test_append_updates_access_structures():
+  for dataset in events_data_sets():
+    table = dataset.adapter_for("events").get_relation("events")
+    dataset.create_index("events", "value", IndexType.SORTED)
+    dataset.create_index("events", "kind", IndexType.HASH)
+    for start in range(100, 1000, 150):
+      assert dataset.append("events", events(start, start + 150)) == 150
+    assert table.version == 6
+    assert table.size() == 1000
+    assert table.statistics().row_count == 1000
+    assert table.statistics()["event_id"].max == 999
+    assert table.zone_map().numBlocks() == 1000 // 16 + 1
+    assert table.zone_map().blockRange(62) == (992, 1000)
+
+    all_rows = [(row["event_id"], row["kind"], row["value"]) for row in events(0, 100)]
+    for start in range(100, 1000, 150):
+      all_rows += [(row["event_id"], row["kind"], row["value"]) for row in events(start, start + 150)]
+    assert sorted(table) == sorted(all_rows)
+    # answered by the (incrementally updated) indexes and zone map
+    assert query_rows(dataset, "select * from events where value >= 10 and value < 12") == \
+      sorted(row for row in all_rows if 10 <= row[2] < 12)
+    assert query_rows(dataset, "select * from events where kind = 'b'") == \
+      sorted(row for row in all_rows if row[1] == 'b')
+    assert query_rows(dataset, "select * from events where event_id > 990") == \
+      sorted(row for row in all_rows if row[0] > 990)
+    # the rebuilt indexes agree with the incrementally updated ones
+    for column_name, index_type, values in [
+      ("value", IndexType.SORTED, [all_rows[5][2], all_rows[500][2], all_rows[999][2]]),
+      ("kind", IndexType.HASH, ["a", "b", "c"])
+    ]:
+      updated = table.indexes(column_name)[0]
+      rebuilt = table.create_index(column_name, index_type)
+      for value in values:
+        assert updated.lookupValue(value).tolist() == rebuilt.lookupValue(value).tolist()
+
+def test_dataframe_segments():
+  _, dataset = events_data_sets()
+  table = dataset.adapter_for("events").get_relation("events")
+  for start in range(100, 400, 10):
+    table.append(DataFrame(events(start, start + 10)))
+  # the segments are merged like a binary counter
+  assert len(table._segments) < 10
+  assert table.column("event_id").tolist() == list(range(400))
+  row_ids = [399, 0, 150, 151, 99, 100, 250]
+  assert [row[0] for row in table.rows_at(row_ids)] == row_ids
+  assert [row[0] for row in table.scan_range(95, 305)] == list(range(95, 305))
+  assert table.df()["event_id"].tolist() == list(range(400))
+  assert len(table._segments) == 1
+
+def test_append_invalidates_samples():
+  dataset, _ = events_data_sets()
+  relation = dataset.query("select * from events").getPlan()
+  estimator = SamplingEstimator(dataset, min_sample_size=1000)
+  assert estimator.sample(relation).num_total_rows == 100
+  dataset.append("events", events(100, 200))
+  assert estimator.sample(relation).num_total_rows == 200
@@ -0,0 +1,90 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..field import FieldType
+from ..storage.bitmap import Bitmap
+from ..storage.index import IndexType, BitmapIndex
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame
+import numpy as np
+
+def test_bitmap(monkeypatch):
+  monkeypatch.setattr(Bitmap, "chunk_size", 16)
+  random = np.random.default_rng(0)
+  lhs_bools, rhs_bools = random.random(100) < 0.3, random.random(100) < 0.5
+  lhs_bools[:40] = False
+  rhs_bools[48:64] = True
+  lhs = Bitmap.fromBools(lhs_bools[:10])
+  lhs.append(lhs_bools[10:37])
+  lhs.append(lhs_bools[37:])
+  rhs = Bitmap.fromBools(rhs_bools)
+  # empty and full chunks are not stored as bits
+  assert lhs.chunks[0] is None and lhs.chunks[1] is None and rhs.chunks[3] is True
+  assert lhs.rowIds().tolist() == np.flatnonzero(lhs_bools).tolist()
+  assert (lhs & rhs).rowIds().tolist() == np.flatnonzero(lhs_bools & rhs_bools).tolist()
+  assert (lhs | rhs).rowIds().tolist() == np.flatnonzero(lhs_bools | rhs_bools).tolist()
+  assert (lhs | rhs).count() == int((lhs_bools | rhs_bools).sum())
+  rhs.appendZeros(30)
+  assert rhs.num_rows == 130 and rhs.rowIds().tolist() == np.flatnonzero(rhs_bools).tolist()
+  # the bits of the new rows set by their row ids
+  bitmap = Bitmap.fromBools(lhs_bools[:10])
+  bitmap.appendRowIds(np.flatnonzero(lhs_bools[10:]), 90)
+  assert bitmap.num_rows == 100 and bitmap.rowIds().tolist() == np.flatnonzero(lhs_bools).tolist()
+  assert [chunk is None for chunk in bitmap.chunks] == [chunk is None for chunk in lhs.chunks]
+  bitmap.appendRowIds(np.arange(12, 28), 28)
+  assert bitmap.chunks[-1] is True and bitmap.count() == lhs.count() + 16
+
+def test_bitmap_index():
+  index = BitmapIndex("s", ["b", None, "a", "b"])
+  assert index.lookupValue("b").tolist() == [0, 3]
+  assert index.lookupValue("z").tolist() == []
+  index.update(["c", "a"])
+  assert index.lookupValue("a").tolist() == [2, 5]
+  assert index.lookupValue("b").tolist() == [0, 3]
+  assert (index.bitmap("a") | index.bitmap("c")).rowIds().tolist() == [2, 4, 5]
+
+num_accounts = 5000
+accounts_schema = dict(
+  fields=[
+    dict(name="account_id", type=FieldType.INTEGER),
+    dict(name="status", type=FieldType.STRING),
+    dict(name="region", type=FieldType.STRING),
+    dict(name="tier", type=FieldType.INTEGER),
+    dict(name="active", type=FieldType.BOOLEAN)
+  ]
+)
+random = np.random.default_rng(5)
+accounts_dataframe = DataFrame(dict(
+  account_id = np.arange(num_accounts),
+  status = random.choice(["open", "closed", "pending"], size=num_accounts),
+  region = random.choice(["us", "eu", "apac", "latam"], size=num_accounts),
+  tier = random.integers(1, 6, size=num_accounts),
+  active = random.random(num_accounts) < 0.8
+))
+
+def test_bitmap_selection():
+  for adapter in [
+    DataFrameAdapter(accounts=dict(schema=accounts_schema, dataframe=accounts_dataframe)),
+    DictAdapter(accounts=dict(schema=accounts_schema, rows=accounts_dataframe.to_dict('records')))
+  ]:
+    dataset = ds.DataSet()
+    dataset.add_adapter(adapter)
+    queries = [
+      dataset.query(sql) for sql in [
+        "select account_id from accounts where status = 'open' and region in ('eu', 'apac') and tier in (1, 2)",
+        "select account_id from accounts where (region = 'us' or region = 'latam') and active = 1 and status = 'pending'",
+        "select account_id from accounts where tier = 3 or status = 'closed'",
+      ]
+    ]
+    expected = [sorted(row[0] for row in execute_with_stat(query)[0]) for query in queries]
+    for column_name in ["status", "region", "tier", "active"]:
+      dataset.create_index("accounts", column_name, IndexType.BITMAP)
+    for query, expected_ids in zip(queries, expected):
+      results, stat = execute_with_stat(query)
+      assert sorted(row[0] for row in results) == expected_ids
+      # only the rows in the resulting bitmap are read
+      assert stat[0][0] == len(expected_ids)
+
+    # a disjunction with a column that is not bitmap-indexed scans all the rows
+    _, stat = execute_with_stat(dataset.query("select account_id from accounts where tier = 3 or account_id < 10"))
+    assert stat[0][0] == num_accounts
@@ -0,0 +1,79 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..field import FieldType
+from ..storage.compression import CompressedColumn, FrameOfReferenceBlock, PlainBlock, RunLengthBlock, encodeBlock
+from ..storage.ranges import ColumnRange
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame
+import numpy as np
+
+def test_encode_block():
+  random = np.random.default_rng(0)
+  sorted_values = np.repeat(np.arange(10), 100)
+  assert isinstance(encodeBlock(sorted_values), RunLengthBlock)
+  small_integers = random.integers(1000, 1016, size=1000)
+  block = encodeBlock(small_integers)
+  assert isinstance(block, FrameOfReferenceBlock) and block.bit_width == 4
+  assert block.decode().tolist() == small_integers.tolist()
+  assert block.take(np.array([999, 0, 500])).tolist() == small_integers[[999, 0, 500]].tolist()
+  assert np.flatnonzero(block.maskRange(ColumnRange(1003, 1008, high_inclusive=False))).tolist() == \
+    np.flatnonzero((small_integers >= 1003) & (small_integers < 1008)).tolist()
+  assert isinstance(encodeBlock(random.random(1000)), PlainBlock)
+
+def test_compressed_column():
+  values = np.array(["open", "closed", None, "open"] * 100, dtype=object)
+  column = CompressedColumn("status", block_size=64)
+  column.append(values[:10])
+  column.append(values[10:])
+  assert column.dictionary is not None and column.num_rows == 400
+  assert column.decode().tolist() == values.tolist()
+  assert column.decode(60, 70).tolist() == values[60:70].tolist()
+  assert column.take([399, 3, 64]).tolist() == values[[399, 3, 64]].tolist()
+  assert column.selectRange(ColumnRange("open", "open"), range(len(column.blocks))).tolist() == \
+    [i for i, value in enumerate(values) if value == "open"]
+
+num_events = 20000
+events_schema = dict(
+  fields=[
+    dict(name="event_time", type=FieldType.INTEGER),
+    dict(name="status", type=FieldType.STRING),
+    dict(name="user_id", type=FieldType.INTEGER),
+    dict(name="value", type=FieldType.FLOAT)
+  ]
+)
+random = np.random.default_rng(7)
+events_dataframe = DataFrame(dict(
+  event_time = np.sort(random.integers(1600000000, 1600100000, size=num_events)),
+  status = random.choice(["ok", "error", "retry"], size=num_events, p=[0.9, 0.05, 0.05]),
+  user_id = random.integers(0, 1000, size=num_events),
+  value = random.random(num_events)
+))
+
+def test_compressed_table():
+  plain = ds.DataSet()
+  plain.add_adapter(DataFrameAdapter(events=dict(schema=events_schema, dataframe=events_dataframe, block_size=4096)))
+  for adapter in [
+    DataFrameAdapter(events=dict(schema=events_schema, dataframe=events_dataframe, block_size=4096, compression=True)),
+    DictAdapter(events=dict(schema=events_schema, rows=events_dataframe.to_dict('records'), block_size=4096, compression=True))
+  ]:
+    dataset = ds.DataSet()
+    dataset.add_adapter(adapter)
+    table = adapter.get_relation("events")
+    assert table.nbytes() < events_dataframe.memory_usage(deep=True).sum() / 3
+    assert sorted(table) == sorted(plain.adapter_for("events").get_relation("events"))
+
+    for sql in [
+      "select event_time, user_id from events where status = 'error' and user_id < 100",
+      "select event_time, value from events where event_time >= 1600050000 and event_time < 1600051000",
+    ]:
+      results, stat = execute_with_stat(dataset.query(sql))
+      expected, _ = execute_with_stat(plain.query(sql))
+      assert sorted(results) == sorted(expected)
+      # the ranges are evaluated on the compressed columns, so only the matching rows are decoded
+      assert stat[0][0] == len(expected)
+
+    table.append(DataFrame(dict(event_time=[1600200000], status=["error"], user_id=[5], value=[0.5])) \
+      if isinstance(adapter, DataFrameAdapter) else [dict(event_time=1600200000, status="error", user_id=5, value=0.5)])
+    results, _ = execute_with_stat(dataset.query("select user_id from events where event_time > 1600100000"))
+    assert [tuple(row) for row in results] == [(5,)]
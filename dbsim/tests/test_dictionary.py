@@ -0,0 +1,94 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..field import FieldType
+from ..storage.dictionary import Dictionary
+from ..storage.ranges import ColumnRange
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame
+import numpy as np
+
+def test_dictionary():
+  dictionary = Dictionary("s", np.array(["b", None, "a", "b"], dtype=object))
+  assert dictionary.values == ["b", "a"]
+  assert dictionary.codes.tolist() == [0, -1, 1, 0]
+  assert dictionary.lookupValue("b").tolist() == [0, 3]
+  assert dictionary.lookupValue("z").tolist() == []
+  assert not dictionary.supports(ColumnRange(low="a"))
+  dictionary.update(["c", "a", None])
+  assert dictionary.codes.tolist() == [0, -1, 1, 0, 2, 1, -1]
+  assert dictionary.lookupValue("a").tolist() == [2, 5]
+  assert dictionary.decode(dictionary.codes) == ["b", None, "a", "b", "c", "a", None]
+
+num_products = 1000
+products_schema = dict(
+  fields=[
+    dict(name="product_id", type=FieldType.INTEGER),
+    dict(name="category", type=FieldType.STRING),
+    dict(name="name", type=FieldType.STRING)
+  ]
+)
+categories_schema = dict(
+  fields=[
+    dict(name="category_name", type=FieldType.STRING),
+    dict(name="department", type=FieldType.STRING)
+  ]
+)
+category_names = ["category{}".format(i) for i in range(20)]
+
+def products():
+  # new string objects for each row, as when read from a file
+  return [
+    dict(product_id=i, category="".join(["category", str(i % 20)]), name="product{}".format(i))
+    for i in range(num_products)
+  ]
+
+def dictionary_data_sets():
+  categories = [dict(category_name=name, department="dept{}".format(i % 3)) for i, name in enumerate(category_names)]
+  dict_dataset = ds.DataSet()
+  dict_dataset.add_adapter(DictAdapter(
+    products=dict(schema=products_schema, rows=products()),
+    categories=dict(schema=categories_schema, rows=categories)
+  ))
+  df_dataset = ds.DataSet()
+  df_dataset.add_adapter(DataFrameAdapter(
+    products=dict(schema=products_schema, dataframe=DataFrame(products())),
+    categories=dict(schema=categories_schema, dataframe=DataFrame(categories))
+  ))
+  return dict_dataset, df_dataset
+
+def test_dictionary_encoded_tables():
+  for dataset in dictionary_data_sets():
+    table = dataset.adapter_for("products").get_relation("products")
+    # unique names are not worth encoding
+    assert table.dictionary("name") is None
+    assert len(table.dictionary("category").values) == 20
+
+    # equality predicates are answered by the dictionary
+    results, stat = execute_with_stat(dataset.query("select product_id from products where category = 'category3'"))
+    assert sorted(row[0] for row in results) == list(range(3, num_products, 20))
+    assert stat[0][0] == num_products // 20
+    results, stat = execute_with_stat(dataset.query("select product_id from products where category = 'unknown'"))
+    assert results == [] and stat[0][0] == 0
+
+    # equi-joins probe the dictionary
+    results, _ = execute_with_stat(dataset.query(
+      "select categories.department, products.product_id from categories "
+      "join products on categories.category_name = products.category"
+    ))
+    assert sorted(tuple(row) for row in results) == sorted(
+      ("dept{}".format(i % 20 % 3), i) for i in range(num_products)
+    )
+
+    table.append([dict(product_id=num_products, category="category21", name="new")])
+    results, _ = execute_with_stat(dataset.query("select product_id from products where category = 'category21'"))
+    assert [row[0] for row in results] == [num_products]
+
+def test_dictionary_encoded_storage():
+  dict_dataset, df_dataset = dictionary_data_sets()
+  rows = dict_dataset.adapter_for("products").get_relation("products").rows()
+  # the rows share the string objects of the dictionary
+  assert rows[3]["category"] is rows[23]["category"]
+  df = df_dataset.adapter_for("products").get_relation("products").df()
+  assert df["category"].dtype.name == "category"
+  assert df["name"].dtype.name != "category"
@@ -2,12 +2,14 @@ from dbsim.query import Query
 from .. import dataset as ds
 from .fixtures.employee_adapter import EmployeeDataFrameAdapter, EmployeeVectorAdapter
 from .fixtures.spatial_adapter import SpatialAdapter
+from .fixtures.vector_items import items_dataset, vector_literal
 from ..query_parser import parse, parse_statement
 from ..ast import *
 from ..utils.visualizer import LogicalPlanViz 
 from ..planners import rules
 from ..extensions.extended_syntax.sim_select_syntax import *
 from ..extensions.extended_syntax.spatial_syntax import *
+from ..adapters.adapter_factory import AdapterFactory
 from scipy.spatial.distance import euclidean
 from datetime import date
 import numpy as np
@@ -253,4 +255,81 @@ def test_ExtendedSyntax_mixture():
     and isinstance(ast.relation.relation.left.relation, LoadOp) \
     and ast.relation.relation.left.relation.name == "employees_with_vectors" and ast.relation.relation.right.name == "points" 
   exec_sql(sql_22, [(4567, 4567)])
-  
\ No newline at end of file
+  
+def test_parse_vectors(tmp_path):
+  vectors = parseVectors(['[1, 2.5]', ' [-3e-1,4] ', '[0,\n1]'])
+  assert vectors.shape == (3, 2) and vectors.flags['C_CONTIGUOUS']
+  assert vectors.tolist() == [[1.0, 2.5], [-0.3, 4.0], [0.0, 1.0]]
+  assert np.array_equal(toVector('[1, 2, 3]'), np.array([1.0, 2.0, 3.0]))
+  for literals in [
+    ['[1, 2]', '[1]'], ['[1, 2]', '1, 2'], ['[1, x]'], ['[1, 2]', None], ['[1, ]'],
+    ['[__import__("os").getcwd(), 1]']
+  ]:
+    try:
+      parseVectors(literals)
+      assert False, literals
+    except ValueError:
+      pass
+  try:
+    parseVectors(['[1, 2]'], dim=3)
+    assert False
+  except ValueError:
+    pass
+
+  path = tmp_path / "embeddings.csv"
+  path.write_text('id,embedding\n1,"[1, 2, 3]"\n2,"[4, 5, 6]"\n')
+  adapter = AdapterFactory.fromFile(str(path))
+  assert adapter.schema("embeddings").get_field("embedding").type.name == "VECTOR"
+  column = adapter.get_relation("embeddings").column("embedding")
+  assert [v.tolist() for v in column] == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+
+def test_batch_vector_distances():
+  random = np.random.default_rng(11)
+  matrix = random.random((50, 16))
+  v = random.random(16)
+  norms = np.linalg.norm(matrix, axis=1)
+  for metric in Metric:
+    expected = [getVecDistance(row, v, metric) for row in matrix]
+    assert np.allclose(getVecDistances(matrix, v, metric), expected)
+    assert np.allclose(getVecDistances(matrix, v, metric, norms=norms), expected)
+  assert np.allclose(getVecDistances(matrix, matrix[::-1]), [getVecDistance(a, b) for a, b in zip(matrix, matrix[::-1])])
+
+  from ..compilers import local
+  vectors = list(random.random((5000, 16)))
+  vectors[7] = None
+  vectors_dataset = items_dataset(vectors)
+  query_vector = vector_literal(vectors[0].round(2))
+  parsed_query_vector = toVector(query_vector)
+  distances = [getVecDistance(vector, parsed_query_vector) if vector is not None else None for vector in vectors]
+  for sql, matches in [
+    ("select item_id from items where embedding to {} < 1.2".format(query_vector), 
+      lambda i, distance: distance < 1.2),
+    ("select item_id from items where item_id < 2500 and embedding to {} <= 1.3".format(query_vector), 
+      lambda i, distance: i < 2500 and distance <= 1.3),
+  ]:
+    query = vectors_dataset.query(sql)
+    selection = query.getPlan().relation
+    # the distances are computed for a batch of rows at once
+    assert local.batch_value_expr(selection.bool_op, selection.relation.schema, vectors_dataset) is not None
+    expected = [i for i, distance in enumerate(distances) if distance is not None and matches(i, distance)]
+    assert [row[0] for row in query.execute()] == expected
+
+def test_null_vector_comparisons(monkeypatch):
+  from ..compilers import local
+  vectors = [np.array([0.0, 1.0]), None, np.array([3.0, 4.0]), None, np.array([0.5, 1.0])]
+  assert getVecDistance(vectors[0], None) is None and getVecDistance(None, vectors[0]) is None
+  vectors_dataset = items_dataset(vectors)
+  cases = [
+    ("embedding to [0, 1] != 1", [0, 2, 4]),
+    ("embedding to [0, 1] < 1", [0, 4]),
+    ("embedding to [0, 1] >= 1", [2]),
+    # a comparison with the distance to a null vector is false, so its negation is true
+    ("not (embedding to [0, 1] < 1)", [1, 2, 3]),
+  ]
+  for batched in [True, False]:
+    if not batched:
+      # the distances are computed row by row
+      monkeypatch.setattr(local, "BATCH_VALUE_EXPR", dict())
+    for predicate, expected in cases:
+      query = vectors_dataset.query("select item_id from items where " + predicate)
+      assert [row[0] for row in query.execute()] == expected, (batched, predicate)
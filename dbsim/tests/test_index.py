@@ -0,0 +1,89 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..field import FieldType
+from ..storage.index import IndexType, SortedIndex, HashIndex
+from ..storage.ranges import ColumnRange
+from .fixtures.employee_adapter import EmployeeAdapter
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame
+import numpy as np
+
+def test_sorted_index():
+  index = SortedIndex("x", np.array([5.0, 1.0, np.nan, 3.0, 1.0]))
+  assert index.lookup(ColumnRange(1.0, 3.0)).tolist() == [1, 3, 4]
+  assert index.lookup(ColumnRange(1.0, 3.0, low_inclusive=False)).tolist() == [3]
+  assert index.lookupValue(1.0).tolist() == [1, 4]
+  index.update(np.array([2.0, 0.5]))
+  assert index.lookup(ColumnRange(high=2.0)).tolist() == [1, 4, 5, 6]
+  strings = SortedIndex("s", ["b", None, "a", "c"])
+  assert strings.lookup(ColumnRange(low="b")).tolist() == [0, 3]
+
+def test_hash_index():
+  index = HashIndex("s", ["b", None, "a", "b"])
+  assert index.lookupValue("b").tolist() == [0, 3]
+  assert index.lookupValue("z").tolist() == []
+  assert not index.supports(ColumnRange(low="a"))
+  index.update(["a"])
+  assert index.lookupValue("a").tolist() == [2, 4]
+
+num_orders = 1000
+orders_schema = dict(
+  fields=[
+    dict(name="order_id", type=FieldType.INTEGER),
+    dict(name="customer_id", type=FieldType.INTEGER),
+    dict(name="amount", type=FieldType.FLOAT)
+  ]
+)
+random = np.random.default_rng(3)
+orders_dataframe = DataFrame(dict(
+  order_id = np.arange(num_orders),
+  customer_id = random.integers(1000, 10000, size=num_orders),
+  amount = random.random(num_orders) * 100
+))
+
+def index_data_set():
+  dataset = ds.DataSet()
+  dataset.add_adapter(DataFrameAdapter(orders=dict(schema=orders_schema, dataframe=orders_dataframe)))
+  dataset.add_adapter(EmployeeAdapter())
+  return dataset
+
+def test_index_selection():
+  dataset = index_data_set()
+  sql = "select order_id from orders where amount >= 50 and amount < 51 and customer_id > 0"
+  expected, stat = execute_with_stat(dataset.query(sql))
+  assert stat[0][0] == num_orders
+  dataset.create_index("orders", "amount")
+  results, stat = execute_with_stat(dataset.query(sql))
+  assert results == expected
+  # only the rows found by the index are read
+  assert stat[0][0] == len(expected)
+
+  customer_id = int(orders_dataframe.customer_id[10])
+  sql = "select order_id from orders where customer_id = {}".format(customer_id)
+  expected, _ = execute_with_stat(dataset.query(sql))
+  dataset.create_index("orders", "customer_id", IndexType.HASH)
+  results, stat = execute_with_stat(dataset.query(sql))
+  assert results == expected and stat[0][0] == len(expected)
+  dataset.drop_index("orders", "customer_id")
+  _, stat = execute_with_stat(dataset.query(sql))
+  assert stat[0][0] == num_orders
+
+def test_index_nested_loop_join():
+  dataset = index_data_set()
+  sql = (
+    "select employees.full_name, orders.order_id from employees join orders "
+    "on employees.employee_id = orders.customer_id"
+  )
+  expected, _ = execute_with_stat(dataset.query(sql))
+  assert len(expected) > 0
+  dataset.create_index("orders", "customer_id", IndexType.HASH)
+  results, stat = execute_with_stat(dataset.query(sql))
+  assert sorted(results) == sorted(expected)
+  # the 3 employees probe the index instead of joining with all the orders
+  assert stat[0][0] == 3
+  # the index nested-loop join also preserves the unmatched rows of left joins
+  results, _ = execute_with_stat(dataset.query(sql.replace(" join ", " left join ")))
+  assert len(results) == len(expected) + len([
+    e for e in (1234, 4567, 8901) if e not in set(orders_dataframe.customer_id.tolist())
+  ])
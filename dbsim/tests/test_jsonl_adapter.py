@@ -0,0 +1,72 @@
+from .. import dataset as ds
+from ..adapters.jsonl_adapter import JsonlAdapter, JsonlTable
+from ..compilers import local
+from ..field import FieldType
+import gzip
+import json
+
+clicks = [
+  dict(
+    ts = 1600000000 + i,
+    user = dict(id = i % 7, country = "us" if i % 3 == 0 else "eu", device = dict(os = "ios", version = 14)),
+    page = "/item/{}".format(i % 5),
+    items = [dict(sku = "a{}".format(i), price = 1.5 * i)] if i % 2 == 0 else [],
+    score = i if i % 4 else i + 0.5
+  )
+  for i in range(100)
+]
+
+def write_clicks(filepath):
+  with gzip.open(filepath, 'wt') as file:
+    for click in clicks:
+      file.write(json.dumps(click) + '\n')
+
+def test_jsonl_schema_inference(tmp_path):
+  write_clicks(tmp_path / "clicks.jsonl.gz")
+  adapter = JsonlAdapter(clicks=dict(filepath=str(tmp_path / "clicks.jsonl.gz"), sample_size=10))
+  table = adapter.get_relation("clicks")
+  fields = {f.name: f for f in table.schema.fields}
+  assert list(fields) == ["ts", "user", "page", "items", "score"]
+  assert fields["ts"].type.name == FieldType.INTEGER.name
+  # integers and floats are merged into FLOAT
+  assert fields["score"].type.name == FieldType.FLOAT.name
+  assert fields["user"].type.name == FieldType.RECORD.name
+  assert [f.name for f in fields["user"].fields] == ["id", "country", "device"]
+  assert fields["user"].fields[2].fields[1].type.name == FieldType.INTEGER.name
+  assert fields["items"].mode == "REPEATED" and [f.name for f in fields["items"].fields] == ["sku", "price"]
+  rows = list(table)
+  assert len(rows) == len(clicks)
+  assert rows[2] == tuple(clicks[2].values())
+
+def test_jsonl_projected_paths(tmp_path):
+  write_clicks(tmp_path / "clicks.jsonl.gz")
+  adapter = JsonlAdapter(clicks=dict(
+    filepath=str(tmp_path / "clicks.jsonl.gz"),
+    paths=["items.price", "ts", "user.device.os", "user.id"]
+  ))
+  table = adapter.get_relation("clicks")
+  assert [f.name for f in table.schema.fields] == ["ts", "user", "items"]
+  assert [f.name for f in table.schema.fields[1].fields] == ["id", "device"]
+  assert list(table)[0] == (1600000000, dict(id=0, device=dict(os="ios")), [dict(price=0.0)])
+
+def test_jsonl_query(tmp_path, monkeypatch):
+  write_clicks(tmp_path / "clicks.jsonl.gz")
+  dataset = ds.DataSet()
+  dataset.add_adapter(JsonlAdapter(clicks=str(tmp_path / "clicks.jsonl.gz")))
+  res = dataset.query("select ts, page from clicks where score > 95").get_pretty_results()
+  assert sorted(res) == [(clicks[i]["ts"], clicks[i]["page"]) for i in range(96, 100)]
+
+  # a projection over the table is evaluated while parsing
+  scanned_extractors = []
+  scan = JsonlTable.scan
+  def recording_scan(self, extractors):
+    scanned_extractors.append([name for name, _ in extractors])
+    return scan(self, extractors)
+  monkeypatch.setattr(JsonlTable, "scan", recording_scan)
+  query = dataset.query("select page, ts from clicks")
+  ctx = {'dataset': dataset, 'params': ()}
+  res = list(local.compile(query)(ctx))
+  assert scanned_extractors == [["page", "ts"]]
+  assert res == [(click["page"], click["ts"]) for click in clicks]
+  # the pushed-down projection records its output rows
+  assert ctx[local.stat_field_in_ctx][local.num_input_rows_and_cost_factor_field][0][0] == len(clicks)
@@ -0,0 +1,45 @@
+from .. import dataset as ds
+from .fixtures.employee_adapter import EmployeeAdapter
+from ..query_parser import parse_statement
+from ..query import Query
+from ..planners.cost.logical_cost import LogicalCost, CostMode
+from ..planners.cost.cardinality import CardinalityEstimator, DEFAULT_RANGE_SELECTIVITY
+
+dataset = ds.DataSet()
+dataset.add_adapter(EmployeeAdapter())
+
+def get_plan(sql):
+  plan = Query(dataset, parse_statement(sql)).getPlan()
+  LogicalCost.refineCostFactors(plan, False)
+  return plan
+
+def test_cardinality_estimation():
+  estimator = CardinalityEstimator(dataset)
+  # 1 distinct manager_id in 3 rows, one of which is null
+  plan = get_plan("select employee_id from employees where manager_id = 1234")
+  assert estimator.rows(plan) == 2
+  # out of the range [min, max] of the column
+  plan = get_plan("select employee_id from employees where employee_id < 1000")
+  assert estimator.rows(plan) == 0
+  plan = get_plan("select employee_id from employees where employee_id >= 1234 or full_name like 'T%'")
+  assert estimator.rows(plan) == 3
+  # the equi-join of two relations over their unique keys
+  plan = get_plan("select * from employees as e1, employees as e2 where e1.employee_id = e2.employee_id")
+  assert abs(estimator.rows(plan) - 3) < 1e-9
+  plan = get_plan("select count(employee_id) from employees")
+  assert estimator.rows(plan) == 1
+
+def test_selectivity_without_statistics():
+  plan = get_plan("select employee_id from employees where employee_id > 5000")
+  # no column statistics given, so the default selectivity is used
+  estimator = CardinalityEstimator()
+  assert estimator.selectivity(plan.relation.bool_op, plan.relation.relation.schema, [None] * 5) == DEFAULT_RANGE_SELECTIVITY
+
+def test_estimated_and_calibrated_cost():
+  plan = get_plan("select employee_id from employees where manager_id = 1234")
+  estimated = LogicalCost.getCost(plan).toNumeric()
+  calibrated = LogicalCost.getCost(plan, dataset, CostMode.CALIBRATE).toNumeric()
+  # the selectivity of the predicate is exactly estimated from the statistics
+  assert abs(estimated - calibrated) < 1e-9
+  plan = get_plan("select e1.employee_id from employees as e1, employees as e2 where e1.employee_id = e2.manager_id")
+  assert LogicalCost.getCost(plan).toNumeric() > 0
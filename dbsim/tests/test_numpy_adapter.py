@@ -0,0 +1,50 @@
+from .. import dataset as ds
+from ..adapters.numpy_adapter import NumpyAdapter
+from ..extensions.extended_syntax.sim_select_syntax import *
+from .fixtures.employee_adapter import employee_vectors_dataframe
+from datetime import date
+import numpy as np
+
+employee_schema = dict(
+  fields=[
+    dict(name="employee_id", type=field.FieldType.INTEGER),
+    dict(name="full_name", type=field.FieldType.STRING),
+    dict(name="employment_date", type=field.FieldType.DATE),
+    dict(name="manager_id", type=field.FieldType.INTEGER),
+    dict(name="vector", type=field.FieldType.VECTOR)
+  ]
+)
+
+def write_employees(dirpath):
+  NumpyAdapter.writeTable(
+    str(dirpath),
+    employee_schema,
+    {name: employee_vectors_dataframe[name].tolist() for name in employee_vectors_dataframe.columns}
+  )
+
+def test_numpy_adapter_scan(tmp_path):
+  write_employees(tmp_path / "employees_with_vectors")
+  adapter = NumpyAdapter.fromDirectory(str(tmp_path))
+  assert adapter.has("employees_with_vectors")
+  table = adapter.get_relation("employees_with_vectors")
+  assert table.size() == 3
+  # vector columns are kept as a single memory-mapped 2-D float32 matrix
+  matrix = table.column("vector")
+  assert isinstance(matrix, np.memmap) and matrix.shape == (3, 4) and matrix.dtype == np.float32
+
+  rows = list(table)
+  assert rows[0][:4] == (1234, "Tom Tompson", date(2009,1,17), -1)
+  assert rows[2][4].tolist() == [8, 9, 0, 1]
+
+def test_numpy_adapter_query(tmp_path):
+  write_employees(tmp_path / "employees_with_vectors")
+  dataset = ds.DataSet()
+  dataset.add_adapter(NumpyAdapter(employees_with_vectors=str(tmp_path / "employees_with_vectors")))
+  res = dataset.query(
+    'select employee_id from employees_with_vectors where manager_id = 1234'
+  ).get_pretty_results()
+  assert res == [(4567,), (8901,)]
+  res = dataset.query(
+    'select employee_id from employees_with_vectors where vector to [1, 2, 3, 4] < 7'
+  ).get_pretty_results()
+  assert res == [(1234,), (4567,)]
@@ -0,0 +1,55 @@
+from .. import dataset as ds
+from ..adapters.adapter_factory import AdapterFactory
+from ..adapters.partitioned_adapter import PartitionedTable
+from ..field import FieldType
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame
+import numpy as np
+
+dates = ["2026-10-01", "2026-10-02", "2026-10-03"]
+hours = [0, 12]
+rows_per_file = 50
+
+def write_events(dirpath):
+  random = np.random.default_rng(3)
+  for date in dates:
+    for hour in hours:
+      partition_dirpath = dirpath / "date={}".format(date) / "hour={}".format(hour)
+      partition_dirpath.mkdir(parents=True)
+      for part in range(2):
+        DataFrame(dict(
+          user_id = random.integers(0, 100, size=rows_per_file),
+          value = random.random(rows_per_file)
+        )).to_csv(partition_dirpath / "part-{}.csv".format(part), index=False)
+
+def test_partitioned_adapter(tmp_path, monkeypatch):
+  write_events(tmp_path / "events")
+  adapter = AdapterFactory.fromPartitionedDirectory(str(tmp_path / "events"), max_workers=4)
+  table = adapter.get_relation("events")
+  assert [f.name for f in table.schema.fields] == ["user_id", "value", "date", "hour"]
+  assert [f.type.name for f in table.schema.fields[2:]] == [FieldType.STRING.name, FieldType.INTEGER.name]
+  assert len(table.partitions) == 6
+  all_rows = list(table)
+  assert len(all_rows) == len(dates) * len(hours) * 2 * rows_per_file
+
+  dataset = ds.DataSet()
+  dataset.add_adapter(adapter)
+  opened_files = []
+  read_file = PartitionedTable._read_file
+  def counting_read_file(self, filepath):
+    opened_files.append(filepath)
+    return read_file(self, filepath)
+  monkeypatch.setattr(PartitionedTable, "_read_file", counting_read_file)
+
+  for sql, matches, num_partitions in [
+    ("select user_id from events where date = '2026-10-02' and hour >= 6",
+      lambda row: row[2] == '2026-10-02' and row[3] >= 6, 1),
+    ("select user_id from events where date in ('2026-10-01', '2026-10-03') and user_id < 50",
+      lambda row: row[2] in ('2026-10-01', '2026-10-03') and row[0] < 50, 4),
+  ]:
+    opened_files.clear()
+    results, stat = execute_with_stat(dataset.query(sql))
+    assert sorted(row[0] for row in results) == sorted(row[0] for row in all_rows if matches(row))
+    # only the files of the remaining partitions are opened and scanned
+    assert len(opened_files) == num_partitions * 2
+    assert stat[0][0] == num_partitions * 2 * rows_per_file
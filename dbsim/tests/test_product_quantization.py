@@ -0,0 +1,96 @@
+from ..extensions.extended_syntax.sim_select_syntax import *
+from ..storage.product_quantization import ProductQuantizer, QuantizedVectorStore
+from ..storage.vector_store import VectorStore
+from .fixtures.vector_items import items_dataset, vector_literal
+import gc
+import numpy as np
+import os
+
+random = np.random.default_rng(8)
+num_items, dim = 3000, 32
+centers = random.random((20, dim)) * 4
+# vector literals cannot have negative elements
+embeddings = np.abs(centers[random.integers(0, 20, size=num_items)] + random.normal(size=(num_items, dim)) * 0.2).astype(np.float32).round(2)
+
+def brute_force_distances(query):
+  return np.sqrt(((embeddings.astype(np.float64) - query) ** 2).sum(axis=1))
+
+def test_product_quantizer():
+  quantizer = ProductQuantizer(num_subspaces=8)
+  quantizer.train(embeddings)
+  assert [b - a for a, b in quantizer.bounds] == [4] * 8
+  codes = quantizer.encode(embeddings)
+  assert codes.dtype == np.uint8 and codes.shape == (num_items, 8)
+  # ADC gives the exact distances to the reconstructed vectors
+  query = embeddings[7] + 0.05
+  reconstructed = quantizer.decode(codes)
+  assert np.allclose(
+    quantizer.adcDistances(codes, quantizer.distanceTables(query)),
+    np.sqrt(((reconstructed - query) ** 2).sum(axis=1)), atol=1e-3
+  )
+
+def test_quantized_vector_store(tmp_path):
+  approximate = QuantizedVectorStore(list(embeddings[:1000]) + [None], num_subspaces=8)
+  approximate.append(embeddings[1000:])
+  assert len(approximate) == num_items + 1 and approximate.row(1000) is None
+  # 8 bytes of codes (and 4 bytes of error) per vector instead of 128
+  assert approximate.nbytes * 8 < VectorStore(embeddings).nbytes
+  query = embeddings[42] + 0.05
+  distances = brute_force_distances(query)
+  exact = np.argsort(distances, kind='stable')[:10]
+  # without the exact vectors, the search is over the reconstructed vectors
+  reconstructed = np.sqrt(((approximate.matrix.astype(np.float64) - query) ** 2).sum(axis=1))
+  reconstructed[1000] = np.inf
+  row_ids, knn_distances = approximate.knnSearch(query, 10)
+  assert row_ids.tolist() == np.argsort(reconstructed, kind='stable')[:10].tolist()
+  assert row_ids[0] == exact[0] and np.allclose(knn_distances, reconstructed[row_ids], atol=1e-4)
+  # only the vectors of the given rows are decoded
+  decode, decoded = approximate.quantizer.decode, []
+  approximate.quantizer.decode = lambda codes: decoded.append(len(codes)) or decode(codes)
+  assert np.array_equal(approximate.vectors([7, 3]), approximate.matrix[[7, 3]]) and decoded[0] == 2
+
+  store = QuantizedVectorStore(embeddings, num_subspaces=8, exact_path=str(tmp_path / "embeddings.f32"))
+  assert np.array_equal(store.row(5), embeddings[5]) and np.array_equal(store.matrix, embeddings)
+  # the candidates found by ADC are re-ranked by the exact vectors
+  row_ids, knn_distances = store.knnSearch(query, 10)
+  assert row_ids.tolist() == exact.tolist() and np.allclose(knn_distances, distances[exact], atol=1e-4)
+  assert store.rangeSearch(query, 1.5).tolist() == np.flatnonzero(distances <= 1.5).tolist()
+
+def test_quantizer_training_deferred():
+  # too few vectors to train the quantizer: they are kept and searched exactly
+  store = QuantizedVectorStore([None, embeddings[0]], num_subspaces=8)
+  assert not store.quantizer.is_trained and np.array_equal(store.row(1), embeddings[0])
+  query = embeddings[42] + 0.05
+  assert store.knnSearch(query, 1)[0].tolist() == [1]
+  # trained once there are enough vectors, on all of them
+  store.append(embeddings[1:2000])
+  assert store.quantizer.is_trained and len(store.quantizer.codebooks[0]) == 256
+  assert store.row(0) is None
+  errors = np.sqrt(((store.matrix[1:].astype(np.float64) - embeddings[:2000]) ** 2).sum(axis=1))
+  # (a single centroid per subspace would reconstruct every vector as their mean, about 6 away)
+  assert errors.mean() < 1.0 and len(np.unique(store.matrix[1:], axis=0)) > 1000
+  store.append(embeddings[2000:])
+  distances = brute_force_distances(query)
+  distances = np.concatenate([[np.inf], distances])
+  assert store.knnSearch(query, 1)[0].tolist() == [np.argmin(distances)]
+
+def test_quantized_vector_column(tmp_path):
+  compression = dict(num_subspaces=8, exact_dir=str(tmp_path))
+  dataset = items_dataset(embeddings, vector_compression=compression)
+  store = dataset.adapter_for("items").get_relation("items").vector_store("embedding")
+  assert isinstance(store, QuantizedVectorStore) and os.path.dirname(store.exact_path) == str(tmp_path)
+  # a table of the same name in another dataset keeps its exact vectors in another file
+  other = items_dataset(embeddings[::-1], vector_compression=compression).adapter_for("items").get_relation("items").vector_store("embedding")
+  assert other.exact_path != store.exact_path and len(list(tmp_path.glob("items.embedding.*.f32"))) == 2
+  assert np.array_equal(store.row(5), embeddings[5]) and np.array_equal(other.row(5), embeddings[-6])
+  query_vector = embeddings[300]
+  literal = vector_literal(query_vector)
+  distances = brute_force_distances(query_vector)
+  res = dataset.query("select item_id from items where embedding to {} < 1.5".format(literal)).get_pretty_results()
+  assert [row[0] for row in res] == np.flatnonzero(distances < 1.5).tolist()
+  res = dataset.query("select item_id from items order by embedding to {} limit 5".format(literal)).get_pretty_results()
+  assert [row[0] for row in res] == np.lexsort((np.arange(num_items), distances))[:5].tolist()
+  # the files are deleted with their stores
+  del dataset, store, other, res
+  gc.collect()
+  assert len(list(tmp_path.glob("items.embedding.*.f32"))) == 0
@@ -0,0 +1,74 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..extensions.extended_syntax.sim_select_syntax import *
+from ..planners.cost.cardinality import CardinalityEstimator, DEFAULT_SELECTIVITY
+from ..planners.cost.sampling import SamplingEstimator
+from ..query import Query
+from pandas import DataFrame
+import numpy as np
+
+num_points = 5000
+random = np.random.default_rng(7)
+points_dataframe = DataFrame(dict(
+  point_id = np.arange(num_points),
+  vector = list(random.normal(size=(num_points, 4)))
+))
+
+class PointAdapter(DataFrameAdapter):
+  def __init__(self):
+    super(self.__class__, self).__init__(
+      points = dict(
+        schema = dict(
+          fields=[
+            dict(name="point_id", type=field.FieldType.INTEGER),
+            dict(name="vector", type=field.FieldType.VECTOR)
+          ]
+        ),
+        dataframe = points_dataframe
+      )
+    )
+
+dataset = ds.DataSet()
+dataset.add_adapter(PointAdapter())
+
+def test_sampling_estimator():
+  query = dataset.query('select point_id from points where vector to [0, 0, 0, 0] < 1.5')
+  selection = query.getPlan().relation
+  actual = len(query.get_pretty_results())
+
+  estimate = SamplingEstimator(dataset, fraction=0.05).estimate(selection)
+  assert estimate.low <= actual <= estimate.high
+  assert estimate.low < estimate.rows < estimate.high
+  # samples are drawn with a fixed seed and cached
+  sampler = SamplingEstimator(dataset, fraction=0.05)
+  assert sampler.estimate(selection).rows == estimate.rows
+  relation = selection.relation
+  assert sampler.sample(relation) is SamplingEstimator(dataset, fraction=0.05).sample(relation)
+  assert abs(sampler.sample(relation).rate - 0.05) < 0.01
+  # fully sampled small relations give exact estimates
+  estimate = SamplingEstimator(dataset, fraction=1.0).estimate(selection)
+  assert estimate.rows == actual
+
+def test_cardinality_estimation_by_sampling():
+  query = dataset.query('select point_id from points where vector to [0, 0, 0, 0] < 1.5 and point_id * 2 < 5000')
+  selection = query.getPlan().relation
+  actual = len(query.get_pretty_results())
+  # 'point_id * 2 < 5000' cannot be estimated from the statistics of the columns
+  #   (while the selectivity of the ToOp threshold is estimated from the distance distribution of the vectors)
+  distance_rows = CardinalityEstimator(dataset).rows(dataset.query('select point_id from points where vector to [0, 0, 0, 0] < 1.5').getPlan().relation)
+  assert abs(CardinalityEstimator(dataset).rows(selection) - distance_rows * DEFAULT_SELECTIVITY) < 1e-6
+  estimator = CardinalityEstimator(dataset, SamplingEstimator(dataset, fraction=0.1))
+  assert abs(estimator.rows(selection) - actual) / actual < 0.25
+
+def test_distance_threshold_cardinality():
+  # estimated from the distance distribution of the vectors without executing the plan
+  estimator = CardinalityEstimator(dataset)
+  vectors = np.stack(points_dataframe['vector'].tolist())
+  for radius in [1.0, 2.5]:
+    selection = dataset.query('select point_id from points where vector to [0, 0, 0, 0] < {}'.format(radius)).getPlan().relation
+    actual = (np.sqrt((vectors ** 2).sum(axis=1)) < radius).sum()
+    assert abs(estimator.rows(selection) - actual) / actual < 0.1
+  # the query vector of a parameter is assumed to be distributed like the vectors
+  selection = dataset.query('select point_id from points where vector to ?0 < 2.5').getPlan().relation
+  pairwise = np.sqrt(((vectors[:500, None] - vectors[None, 500:1000]) ** 2).sum(axis=-1))
+  assert abs(estimator.rows(selection) - num_points * (pairwise < 2.5).mean()) / num_points < 0.05
@@ -0,0 +1,79 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..extensions.extended_syntax.sim_select_syntax import *
+from ..storage.index import IndexType
+from ..utils.exceptions import SQLSyntaxError
+from .fixtures.execution import execute_with_stat
+from pandas import DataFrame, Series
+import numpy as np
+import pytest
+
+random = np.random.default_rng(5)
+dim = 4
+left_vectors = random.normal(size=(300, dim))
+right_vectors = random.normal(size=(200, dim))
+distances = np.sqrt(((left_vectors[:, None] - right_vectors[None]) ** 2).sum(axis=-1))
+
+def vectors_table(vectors):
+  return dict(
+    schema=dict(fields=[
+      dict(name="id", type=field.FieldType.INTEGER),
+      dict(name="v", type=field.FieldType.VECTOR)
+    ]),
+    dataframe=DataFrame(dict(id=np.arange(len(vectors)), v=Series(list(vectors), dtype=object)))
+  )
+
+def vectors_dataset():
+  dataset = ds.DataSet()
+  dataset.add_adapter(DataFrameAdapter(a=vectors_table(left_vectors), b=vectors_table(right_vectors)))
+  return dataset
+
+def nearest(i, k):
+  return np.lexsort((np.arange(len(right_vectors)), distances[i]))[:k].tolist()
+
+def test_threshold_similarity_join():
+  dataset = vectors_dataset()
+  expected = sorted(zip(*(positions.tolist() for positions in np.nonzero(distances < 0.5))))
+  results = dataset.query("select a.id, b.id from a join b on a.v to b.v < 0.5").get_pretty_results()
+  assert sorted(results) == expected
+  # the sides of the condition can be swapped, and the other conjuncts are applied to the joined rows
+  results = dataset.query("select a.id, b.id from a join b on 0.5 > b.v to a.v and a.id < b.id").get_pretty_results()
+  assert sorted(results) == [(i, j) for i, j in expected if i < j]
+
+  # every left row is output by a left join
+  results = dataset.query("select a.id, b.id from a left join b on a.v to b.v <= 0.2").get_pretty_results()
+  matched = distances <= 0.2
+  assert len(results) == matched.sum() + (~matched.any(axis=1)).sum()
+  assert sorted(row for row in results if row[1] is not None) == sorted(zip(*(p.tolist() for p in np.nonzero(matched))))
+
+  # with a vector index on the right relation, it is searched for each of the (fewer) left rows
+  dataset.create_index("b", "v", IndexType.IVF_FLAT, num_lists=10)
+  query = dataset.query("select a.id, b.id from (select * from a where a.id < 50) as a join b on a.v to b.v < 0.5")
+  results, stat = execute_with_stat(query)
+  assert sorted(results) == [(i, j) for i, j in expected if i < 50]
+  assert stat[1][0] == 50
+
+def test_knn_similarity_join():
+  dataset = vectors_dataset()
+  results = dataset.query("select a.id, b.id from a join b on knn(a.v, b.v, 3)").get_pretty_results()
+  # the right rows of each left row are ordered by their distances
+  assert results == [(i, j) for i in range(len(left_vectors)) for j in nearest(i, 3)]
+  results = dataset.query("select a.id, b.id from a join b on knn(a.v, b.v, 3) and b.id < 100").get_pretty_results()
+  assert results == [(i, j) for i in range(len(left_vectors)) for j in nearest(i, 3) if j < 100]
+
+  # the vector index finds the nearest rows exactly when all its lists are probed
+  dataset.create_index("b", "v", IndexType.IVF_FLAT, num_lists=10, nprobe=10)
+  query = dataset.query("select a.id, b.id from (select * from a where a.id < 50) as a join b on knn(a.v, b.v, 2)")
+  results, stat = execute_with_stat(query)
+  assert results == [(i, j) for i in range(50) for j in nearest(i, 2)]
+  assert stat[1][0] == 50
+
+def test_invalid_knn_similarity_join():
+  dataset = vectors_dataset()
+  # the k-NN join is not symmetric
+  with pytest.raises(SQLSyntaxError, match="first argument of knn\\(\\) must be a column of the left relation"):
+    dataset.query("select a.id, b.id from a join b on knn(b.v, a.v, 2)").get_pretty_results()
+  with pytest.raises(SQLSyntaxError, match="must be a non-negative integer"):
+    dataset.query("select a.id, b.id from a join b on knn(a.v, b.v, 1.5)").get_pretty_results()
+  with pytest.raises(SQLSyntaxError, match="must be columns of the joined relations"):
+    dataset.query("select a.id, b.id from a join b on knn(a.v, c.v, 2)").get_pretty_results()
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+
+from .. import dataset as ds
+from .. import Relation
+from ..adapters.sqlite_adapter import SqliteAdapter, SqliteQuery
+from ..compilers import local
+from ..field import FieldType
+from .fixtures.execution import execute_with_stat
+
+def create_database(filepath):
+  connection = sqlite3.connect(filepath)
+  connection.executescript("""
+    CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, full_name TEXT, salary REAL, dept_id INTEGER);
+    CREATE TABLE departments (dept_id INTEGER PRIMARY KEY, dept_name VARCHAR(32));
+    CREATE INDEX employees_dept ON employees(dept_id);
+    INSERT INTO employees VALUES (1234, 'Tom Tompson', 100.5, 1), (4567, 'Sally Sanders', 200.0, 2), (8901, 'Mark Markty', 150.0, 2);
+    INSERT INTO departments VALUES (1, 'sales'), (2, 'marketing');
+  """)
+  connection.commit()
+  connection.close()
+
+def sqlite_data_set(tmp_path):
+  filepath = str(tmp_path / "company.db")
+  create_database(filepath)
+  adapter = SqliteAdapter(filepath, batch_size=2)
+  dataset = ds.DataSet()
+  dataset.add_adapter(adapter)
+  return dataset, adapter
+
+def test_sqlite_adapter_relations(tmp_path):
+  dataset, adapter = sqlite_data_set(tmp_path)
+  assert [name for name, _ in adapter.relations] == ['departments', 'employees']
+  schema = adapter.schema('employees')
+  assert [f.type for f in schema.fields] == [FieldType.INTEGER, FieldType.STRING, FieldType.FLOAT, FieldType.INTEGER]
+  assert adapter.get_relation('employees').size() == 3
+  assert len(list(adapter.get_relation('departments'))) == 2
+
+def test_sqlite_adapter_push_down(tmp_path):
+  dataset, adapter = sqlite_data_set(tmp_path)
+  query = dataset.query(
+    'select employees.full_name, departments.dept_name from employees, departments '
+    'where employees.dept_id = departments.dept_id'
+  )
+  # The selection over the cross product is pushed down together with the join and projection,
+  #   so the whole plan is compiled into a single SQLite statement.
+  compiled = local.compile(query)
+  assert isinstance(compiled, Relation) and isinstance(compiled.records.records, SqliteQuery)
+  assert sorted(query.get_pretty_results()) == [
+    ('Mark Markty', 'marketing'), ('Sally Sanders', 'marketing'), ('Tom Tompson', 'sales')
+  ]
+
+  query = dataset.query("select full_name from employees where salary > 120 and full_name != 'Mark Markty'")
+  assert isinstance(local.compile(query), Relation)
+  assert query.get_pretty_results() == [('Sally Sanders',)]
+
+  query = dataset.query("select * from employees limit 2")
+  assert len(query.get_pretty_results()) == 2
+
+def test_sqlite_adapter_push_down_stat(tmp_path):
+  dataset, adapter = sqlite_data_set(tmp_path)
+  # the pushed-down plan records its output rows like the compiled operators record their input rows
+  query = dataset.query("select full_name from employees where salary > 120")
+  assert isinstance(local.compile(query), Relation)
+  results, stat = execute_with_stat(query)
+  assert sorted(results) == [('Mark Markty',), ('Sally Sanders',)]
+  assert [num_rows for num_rows, _ in stat] == [2]
+
+def test_sqlite_adapter_null_comparisons(tmp_path):
+  filepath = str(tmp_path / "company.db")
+  create_database(filepath)
+  connection = sqlite3.connect(filepath)
+  connection.execute("INSERT INTO employees VALUES (5678, 'Nick Nulls', NULL, NULL)")
+  connection.commit()
+  connection.close()
+  dataset = ds.DataSet()
+  dataset.add_adapter(SqliteAdapter(filepath))
+  # the comparisons with nulls are false, as in the compiled predicates, instead of SQL's unknown
+  queries = {
+    "select employee_id from employees where salary != 100.5": [4567, 8901],
+    "select employee_id from employees where not (salary > 120)": [1234, 5678],
+    "select employee_id from employees where not (salary > 120 or dept_id = 2)": [1234, 5678],
+    "select employee_id from employees where not (dept_id = null)": [1234, 4567, 5678, 8901],
+  }
+  for statement, expected in queries.items():
+    query = dataset.query(statement)
+    assert isinstance(local.compile(query), Relation)
+    assert sorted(row[0] for row in query.get_pretty_results()) == expected
+  # NOT over a nullable column is not pushed down
+  query = dataset.query("select employee_id from employees where not dept_id")
+  assert not isinstance(local.compile(query), Relation)
+
+def test_sqlite_adapter_not_pushable(tmp_path):
+  dataset, adapter = sqlite_data_set(tmp_path)
+  # aggregates are not pushed down and executed by the compiler as usual
+  query = dataset.query("select count(employee_id) from employees where dept_id = 2")
+  assert not isinstance(local.compile(query), Relation)
+  assert query.get_pretty_results() == [(2,)]
+
+def test_sqlite_adapter_connection_per_thread(tmp_path):
+  dataset, adapter = sqlite_data_set(tmp_path)
+  connections = []
+  thread = threading.Thread(target=lambda: connections.append(adapter.connection()))
+  thread.start()
+  thread.join()
+  assert connections[0] is not adapter.connection()
+  assert adapter.connection() is adapter.connection()
+  adapter.close()
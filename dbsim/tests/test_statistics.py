@@ -0,0 +1,78 @@
+from ..statistics import DistinctCountSketch, Histogram, DistanceDistribution, TableStatistics, hashValues
+from ..schema import Schema
+from ..field import FieldType
+from .fixtures.employee_adapter import EmployeeAdapter, EmployeeDataFrameAdapter
+from datetime import date
+import os
+import subprocess
+import sys
+import numpy as np
+
+def test_distinct_count_sketch():
+  sketch = DistinctCountSketch(k=256)
+  sketch.update(np.arange(100))
+  sketch.update(np.arange(50, 150))
+  # exact when fewer than k distinct values have been seen
+  assert sketch.estimate() == 150
+  sketch.update(np.arange(100000))
+  assert abs(sketch.estimate() - 100000) / 100000 < 0.2
+  other = DistinctCountSketch(k=256)
+  other.update(["a", "b", "c"])
+  assert other.merge(DistinctCountSketch(k=256)).estimate() == 3
+
+def test_stable_hash_values():
+  values = ["a", "b", b"c", date(2020, 1, 2), (1, "d"), 3, 2.5]
+  hashes = hashValues(values).tolist()
+  # the same hashes in processes with other salts of the built-in hash()
+  script = "import datetime; from dbsim.statistics import hashValues; print(hashValues({!r}).tolist())".format(values)
+  root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  for seed in ["1", "2"]:
+    env = dict(os.environ, PYTHONHASHSEED=seed)
+    output = subprocess.run([sys.executable, "-c", script], env=env, cwd=root, capture_output=True, text=True, check=True).stdout
+    assert eval(output) == hashes
+
+def test_histogram():
+  histogram = Histogram.fromValues(list(range(1000)), num_buckets=10)
+  assert histogram.num_buckets == 10
+  assert abs(histogram.cdf(500) - 0.5) < 0.01
+  assert abs(histogram.rangeFraction(100, 300) - 0.2) < 0.01
+  assert histogram.rangeFraction(high=-1) == 0.0 and histogram.rangeFraction(low=2000) == 0.0
+  assert Histogram.fromValues([]) is None
+
+def test_distance_distribution():
+  random = np.random.default_rng(3)
+  vectors = random.normal(size=(2000, 4))
+  distribution = DistanceDistribution.fromVectors(list(vectors[:1000]))
+  # with a known query vector, the fraction of the sampled vectors within the radius
+  query = np.zeros(4)
+  distances = np.sqrt((vectors ** 2).sum(axis=1))
+  for radius in [1.0, 2.0, 3.0]:
+    assert abs(distribution.fraction(radius, query) - (distances <= radius).mean()) < 0.05
+  # otherwise, the fraction of the pairs of vectors within the radius
+  pairwise = np.sqrt(((vectors[:200, None] - vectors[None, 200:400]) ** 2).sum(axis=-1))
+  for radius in [1.0, 2.0, 3.0]:
+    assert abs(distribution.fraction(radius) - (pairwise <= radius).mean()) < 0.05
+  assert distribution.fraction(0.0) == 0.0 and distribution.fraction(100.0) == 1.0
+  assert DistanceDistribution.fromVectors([]) is None
+
+def test_table_statistics_incremental():
+  schema = Schema([dict(name="x", type=FieldType.INTEGER), dict(name="s", type=FieldType.STRING)])
+  stats = TableStatistics.fromColumns(schema, [np.arange(10), ["a", None] * 5])
+  assert stats.row_count == 10
+  assert stats["x"].min == 0 and stats["x"].max == 9 and stats["x"].distinct_count == 10
+  assert stats["s"].null_fraction() == 0.5 and stats["s"].distinct_count == 1
+  stats.update([np.arange(10, 2010), ["b"] * 2000])
+  assert stats.row_count == 2010
+  assert stats["x"].max == 2009 and stats["s"].max == "b"
+  assert abs(stats["x"].histogram.cdf(1005) - 0.5) < 0.05
+
+def test_adapter_statistics():
+  for adapter in (EmployeeAdapter(), EmployeeDataFrameAdapter()):
+    stats = adapter.statistics("employees")
+    assert stats.row_count == 3
+    assert stats["employee_id"].min == 1234 and stats["employee_id"].max == 8901
+    assert stats["employee_id"].distinct_count == 3
+    assert stats["employment_date"].min == date(2009,1,17)
+    # repeated fields have neither min/max nor histograms
+    assert stats["roles"].histogram is None
+  assert EmployeeAdapter().statistics("employees")["manager_id"].null_fraction() == 1 / 3
@@ -0,0 +1,251 @@
+from .. import dataset as ds
+from ..adapters.dict_adapter import DictAdapter
+from ..extensions.extended_syntax.sim_select_syntax import *
+from ..storage.index import IndexType
+from ..storage.vector_index import IVFFlatIndex
+from .fixtures.execution import execute_with_stat
+from .fixtures.vector_items import items_dataset, vector_literal
+from pandas import DataFrame, Series
+import numpy as np
+
+random = np.random.default_rng(21)
+num_items, dim = 6000, 8
+cluster_centers = random.random((30, dim)) * 10
+# vector literals cannot have negative elements
+embeddings = np.abs(cluster_centers[random.integers(0, 30, size=num_items)] + random.normal(size=(num_items, dim)) * 0.3).round(2)
+
+def brute_force_distances(query):
+  return np.sqrt(((embeddings - query) ** 2).sum(axis=1))
+
+def test_ivf_flat_index():
+  index = IVFFlatIndex("embedding", list(embeddings[:5000]), nprobe=4)
+  assert index.num_lists == int(np.sqrt(5000)) and index.listSizes().sum() == 5000
+  index.update(list(embeddings[5000:]) + [None])
+  assert index.num_rows == num_items + 1 and index.listSizes().sum() == num_items
+
+  query = embeddings[17] + 0.1
+  distances = brute_force_distances(query)
+  # range searches are exact
+  for radius in [0.5, 1.0, 3.0]:
+    assert set(index.rangeSearch(query, radius).tolist()) >= set(np.flatnonzero(distances <= radius).tolist())
+  # k-NN searches are exact when all the lists are probed, and approximate otherwise
+  exact = np.argsort(distances, kind='stable')[:10]
+  row_ids, knn_distances = index.knnSearch(query, 10, nprobe=index.num_lists)
+  assert row_ids.tolist() == exact.tolist() and np.allclose(knn_distances, distances[exact], atol=1e-4)
+  row_ids, _ = index.knnSearch(query, 10)
+  assert len(set(row_ids.tolist()) & set(exact.tolist())) >= 8
+  # all the lists are searched when the probed ones hold fewer than k vectors
+  clustered = np.concatenate([np.zeros((50, dim)), np.full((2, dim), 10.0), np.full((2, dim), 20.0)])
+  index = IVFFlatIndex("embedding", list(clustered), num_lists=3, nprobe=1)
+  assert index.knnSearch(np.full(dim, 20.0), 5)[0].tolist() == [52, 53, 50, 51, 0]
+
+def test_vector_index_selection():
+  dataset = items_dataset(embeddings)
+  query_vector = embeddings[100]
+  literal = vector_literal(query_vector)
+  query = dataset.query("select item_id from items where embedding to {} < 1.5".format(literal))
+  expected, stat = execute_with_stat(query)
+  # the distances are computed over the contiguous vectors of the column, and only the matching rows are read
+  assert stat[0][0] == len(expected)
+
+  dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=40)
+  results, stat = execute_with_stat(query)
+  assert results == expected
+  assert sorted(row[0] for row in results) == np.flatnonzero(brute_force_distances(query_vector) < 1.5).tolist()
+  # only the rows of the lists near the query vector are read
+  assert stat[0][0] < num_items / 5
+
+def test_knn_query():
+  dataset = items_dataset(embeddings)
+  query_vector = embeddings[100] + 0.1
+  literal = vector_literal(query_vector)
+  exact = np.lexsort((np.arange(num_items), brute_force_distances(query_vector)))
+  # the ordered column does not have to be projected
+  query = dataset.query("select item_id from items order by embedding to {} limit 10".format(literal))
+  results, stat = execute_with_stat(query)
+  assert [row[0] for row in results] == exact[:10].tolist()
+  # the nearest rows are searched over the contiguous vectors of the column,
+  #   and the pushed-down search records the rows it returns before the projection does
+  assert [num_rows for num_rows, _ in stat] == [10, 10]
+
+  # over a selection, the distances of its rows are computed in batches
+  query = dataset.query("select item_id from items where item_id < 3000 order by embedding to {} desc limit 3 offset 2".format(literal))
+  results, _ = execute_with_stat(query)
+  farthest = np.lexsort((np.arange(3000), -brute_force_distances(query_vector)[:3000]))
+  assert [row[0] for row in results] == farthest[2:5].tolist()
+  # orderings which cannot be evaluated in batches keep the k smallest rows in a heap
+  assert dataset.query("select item_id from items order by item_id desc limit 2").get_pretty_results() == [(5999,), (5998,)]
+
+  # the k nearest rows are searched by the vector index
+  dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=40, nprobe=40)
+  results, stat = execute_with_stat(dataset.query("select item_id from items order by embedding to {} limit 10".format(literal)))
+  assert [row[0] for row in results] == exact[:10].tolist()
+  assert [num_rows for num_rows, _ in stat] == [10, 10]
+
+def test_filtered_vector_search():
+  category = np.arange(num_items) % 4
+  dataset = items_dataset(embeddings, dict(category=category))
+  dataset.create_index("items", "item_id", IndexType.SORTED)
+  dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=40, nprobe=40)
+  query_vector = embeddings[100] + 0.1
+  literal = vector_literal(query_vector)
+  distances = brute_force_distances(query_vector)
+  def nearest(mask, k):
+    row_ids = np.flatnonzero(mask)
+    return row_ids[np.lexsort((row_ids, distances[row_ids]))][:k].tolist()
+
+  # unselective predicate: the nearest rows are searched first, and then filtered (post-filtering)
+  query = dataset.query("select item_id from items where category = 1 order by embedding to {} limit 10".format(literal))
+  results, stat = execute_with_stat(query)
+  assert [row[0] for row in results] == nearest(category == 1, 10)
+  assert stat[0][0] == 10
+  # selective predicate with an index: the distances of the filtered rows are computed (pre-filtering)
+  query = dataset.query("select item_id from items where item_id < 50 order by embedding to {} limit 10".format(literal))
+  results, stat = execute_with_stat(query)
+  assert [row[0] for row in results] == nearest(np.arange(num_items) < 50, 10)
+  assert stat[0][0] == 50
+  # too few of the fetched rows satisfy the predicate: the search is repeated for more rows
+  query = dataset.query("select item_id from items where embedding to {} > 12 order by embedding to {} limit 3".format(literal, literal))
+  results, _ = execute_with_stat(query)
+  assert [row[0] for row in results] == nearest(distances > 12, 3)
+
+  # the similarity threshold is not searched by the index when the attribute predicate is more selective
+  query = dataset.query("select item_id from items where item_id < 50 and embedding to {} < 3".format(literal))
+  results, stat = execute_with_stat(query)
+  assert sorted(row[0] for row in results) == np.flatnonzero((np.arange(num_items) < 50) & (distances < 3)).tolist()
+  assert stat[0][0] == 50
+
+def test_filtered_vector_search_planning(monkeypatch):
+  dataset = items_dataset(embeddings, dict(category=np.arange(num_items) % 4))
+  index = dataset.create_index("items", "item_id", IndexType.SORTED)
+  vector_index = dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=40, nprobe=40)
+  literal = vector_literal(embeddings[100] + 0.1)
+  calls = []
+  def counted(method):
+    def call(*args, **kw):
+      calls.append(method.__name__)
+      return method(*args, **kw)
+    return call
+  monkeypatch.setattr(index, "lookup", counted(index.lookup))
+  monkeypatch.setattr(vector_index, "rangeSearch", counted(vector_index.rangeSearch))
+  monkeypatch.setattr(vector_index, "knnSearch", counted(vector_index.knnSearch))
+
+  # the rows read by pre-filtering are estimated from the statistics, so the index is only looked up by the scan
+  query = dataset.query("select item_id from items where item_id < 50 order by embedding to {} limit 10".format(literal))
+  _, stat = execute_with_stat(query)
+  assert stat[0][0] == 50
+  assert calls == ["lookup"]
+  del calls[:]
+  # neither is the vector index searched for the similarity threshold
+  query = dataset.query("select item_id from items where embedding to {} < 3 order by embedding to {} limit 10".format(literal, literal))
+  execute_with_stat(query)
+  assert calls.count("rangeSearch") == 1
+  del calls[:]
+  # post-filtering only searches the nearest rows
+  query = dataset.query("select item_id from items where category = 1 order by embedding to {} limit 10".format(literal))
+  execute_with_stat(query)
+  assert calls == ["knnSearch"]
+
+def test_batched_vector_search():
+  dataset = items_dataset(embeddings)
+  query_vectors = embeddings[[3, 50, 700, 2000, 4500]] + 0.05
+  # the results of each query vector are those of executing the statement with it
+  for statement in [
+    "simselect item_id from items where embedding to ?0 < 1.5",
+    "select item_id from items where item_id > 100 order by embedding to ?0 limit 5",
+    # the nearest rows do not satisfy the other predicate on the distances
+    "select item_id from items where embedding to ?0 > 0.5 order by embedding to ?0 limit 3",
+  ]:
+    query = dataset.query(statement)
+    results = dataset.execute_batch(query, query_vectors)
+    assert results == [query.get_pretty_results(vector) for vector in query_vectors]
+
+  # the other parameters are given as usual
+  results = dataset.execute_batch(
+    "select item_id from items where embedding to ?1 < 1.0 and item_id > ?0 order by embedding to ?1 limit 3",
+    query_vectors, 1000, param=1
+  )
+  for vector, rows in zip(query_vectors, results):
+    distances = brute_force_distances(vector)
+    mask = (distances < 1.0) & (np.arange(num_items) > 1000)
+    row_ids = np.flatnonzero(mask)
+    assert [row[0] for row in rows] == row_ids[np.lexsort((row_ids, distances[row_ids]))][:3].tolist()
+
+  # the rows with null vectors, in contiguous storage or not, as by executing the statement with each query vector
+  null_vectors = [None if i in (3, 10, 150) else vector for i, vector in enumerate(embeddings[:200])]
+  dict_dataset = ds.DataSet()
+  dict_dataset.add_adapter(DictAdapter(items=dict(
+    schema=dataset.adapter_for("items").schema("items"),
+    rows=[dict(item_id=i, embedding=vector) for i, vector in enumerate(null_vectors)]
+  )))
+  knn_statement = "select item_id from items order by embedding to ?0 limit 199"
+  for vectors_dataset in [items_dataset(null_vectors), dict_dataset]:
+    ctx = {'dataset': vectors_dataset}
+    for statement in [
+      "simselect item_id from items where embedding to ?0 < 1.5",
+      knn_statement,
+      "select item_id from items where not (embedding to ?0 < 1.0) order by embedding to ?0 limit 5",
+    ]:
+      query = vectors_dataset.query(statement)
+      results = vectors_dataset.execute_batch(query, query_vectors[:2], ctx=ctx)
+      assert results == [query.get_pretty_results(vector) for vector in query_vectors[:2]]
+    # the given ctx is left as is
+    assert ctx == {'dataset': vectors_dataset}
+    # the distances to the null vectors are sorted last
+    assert [row[0] for row in vectors_dataset.execute_batch(knn_statement, query_vectors[:1])[0]][-2:] == [3, 10]
+
+def test_similarity_cache():
+  dataset = items_dataset(embeddings[:5000])
+  table = dataset.adapter_for("items").get_relation("items")
+  cache = table.similarity_cache
+  # counts the distances computed over the contiguous vectors and for the rows not found by the searches
+  num_distances = [0]
+  store = table.vector_store("embedding")
+  store_distances, vector_distances = store.distances, table._vector_distances
+  def count_store_distances(query, start=0, stop=None):
+    distances = store_distances(query, start, stop)
+    num_distances[0] += len(distances)
+    return distances
+  def count_vector_distances(pos, query, row_ids):
+    num_distances[0] += len(row_ids)
+    return vector_distances(pos, query, row_ids)
+  store.distances, table._vector_distances = count_store_distances, count_vector_distances
+
+  query_vector = embeddings[100] + 0.1
+  literal = vector_literal(query_vector)
+  def search(radius):
+    num_distances[0] = 0
+    query = dataset.query("select item_id from items where embedding to {} < {}".format(literal, radius))
+    return sorted(row[0] for row in query.get_pretty_results())
+
+  distances = brute_force_distances(query_vector)
+  # a smaller radius is answered by the cached rows without computing any distance,
+  #   and a larger one computes the distances of all the contiguous vectors once
+  for radius, num_hits, num_computed in [(1.5, 0, 5000), (1.0, 1, 0), (2.5, 1, 5000), (0.5, 2, 0)]:
+    assert search(radius) == np.flatnonzero(distances[:5000] < radius).tolist()
+    assert cache.num_hits == num_hits and len(cache) == 1 and num_distances[0] == num_computed
+  # the cached results are updated with the distances of the appended rows only
+  dataset.append("items", DataFrame(dict(item_id=np.arange(5000, num_items), embedding=Series(list(embeddings[5000:]), dtype=object))))
+  assert search(2.0) == np.flatnonzero(distances < 2.0).tolist()
+  assert num_distances[0] == num_items - 5000
+  # with a vector index, only the distances of the rows in the ring are computed
+  dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=40)
+  cached = np.flatnonzero(distances <= 2.5)
+  assert search(8.0) == np.flatnonzero(distances < 8.0).tolist()
+  assert 0 < num_distances[0] == len(table.vector_index("embedding").rangeSearch(query_vector, 8.0)) - len(cached)
+  assert search(1.0) == np.flatnonzero(distances < 1.0).tolist()
+  assert cache.num_hits == 3 and num_distances[0] == 0
+
+  # the least recently used results are evicted beyond the maximum number of cached rows
+  other_vector = embeddings[200] + 0.1
+  other_literal = vector_literal(other_vector)
+  cache.max_rows = cache.numCachedRows() + 100
+  other_distances = brute_force_distances(other_vector)
+  for radius, num_entries in [(0.5, 2), (2.0, 1)]:
+    query = dataset.query("select item_id from items where embedding to {} < {}".format(other_literal, radius))
+    assert sorted(row[0] for row in query.get_pretty_results()) == np.flatnonzero(other_distances < radius).tolist()
+    assert len(cache) == num_entries and cache.numCachedRows() <= cache.max_rows
+  assert cache.covers("embedding", other_vector, 2.0, num_items) and not cache.covers("embedding", query_vector, 1.0, num_items)
+  # including a result larger than the maximum
+  cache.max_rows = 10
+  assert search(1.5) == np.flatnonzero(distances < 1.5).tolist() and len(cache) == 0
@@ -0,0 +1,82 @@
+from .. import dataset as ds
+from ..adapters.dict_adapter import DictAdapter
+from ..extensions.extended_syntax.sim_select_syntax import *
+from ..storage.index import IndexType
+from ..storage.vector_store import VectorStore
+from .fixtures.vector_items import items_adapter, items_dataset
+from pandas import DataFrame, Series
+import numpy as np
+
+random = np.random.default_rng(5)
+vectors = random.random((1000, 4)).astype(np.float32)
+
+def test_vector_store():
+  store = VectorStore([None, None])
+  assert len(store) == 2 and store.dim == 0 and store.row(1) is None
+  store.append(list(vectors[:10]) + [None])
+  views = [store.row(i) for i in range(2, 12)]
+  # growing the matrix keeps the views given out before valid
+  store.append(vectors[10:])
+  assert len(store) == 1003 and store.matrix.shape == (1003, 4) and store.matrix.dtype == np.float32
+  assert np.array_equal(np.stack(views), vectors[:10]) and store.row(12) is None
+  assert store.valid.sum() == 1000 and np.shares_memory(store.row(500), store.matrix)
+
+  query = vectors[3] + 0.05
+  distances = store.distances(query)
+  assert np.isnan(distances[[0, 1, 12]]).all()
+  expected = np.full(1003, np.nan)
+  expected[store.valid] = np.sqrt(((vectors - query) ** 2).sum(axis=1))
+  assert np.allclose(distances, expected, equal_nan=True, atol=1e-6)
+
+  store.batch_size = 64
+  assert store.rangeSearch(query, 0.3).tolist() == np.flatnonzero(expected <= 0.3).tolist()
+  row_ids, knn_distances = store.knnSearch(query, 5)
+  assert row_ids.tolist() == np.argsort(np.nan_to_num(expected, nan=np.inf), kind='stable')[:5].tolist()
+  assert np.allclose(knn_distances, expected[row_ids])
+
+  half = VectorStore(vectors, dtype=np.float16)
+  assert half.matrix.dtype == np.float16 and np.allclose(half.distances(query), expected[store.valid], atol=1e-2)
+
+def test_dataframe_vector_columns():
+  adapter = items_adapter(vectors[:100])
+  table = adapter.get_relation("items")
+  store = table.vector_store("embedding")
+  rows = list(table)
+  # the rows carry views of the contiguous vectors
+  assert all(np.shares_memory(row[1], store.matrix) for row in rows)
+  assert np.array_equal(np.stack([row[1] for row in rows]), vectors[:100])
+  table.append(DataFrame(dict(item_id=[100, 101], embedding=Series([vectors[100], None], dtype=object))))
+  appended = list(table.rows_at([101, 100]))
+  assert len(store) == 102 and appended[0] == (101, None) and np.array_equal(appended[1][1], vectors[100])
+  assert np.array_equal(table.df()["embedding"][100], vectors[100])
+  # the statistics own their sampled vectors rather than views of the contiguous vectors
+  sample = table.statistics()["embedding"].sample
+  assert len(sample) == 101 and all(vector.base is None for vector in sample)
+
+def test_nearest_rows_with_null_vectors():
+  null_vectors = [None if i in (2, 5) else np.array([0.5 * i, 1.0]) for i in range(10)]
+  def dict_items_dataset():
+    dataset = ds.DataSet()
+    dataset.add_adapter(DictAdapter(items=dict(
+      schema=dict(fields=[
+        dict(name="item_id", type=field.FieldType.INTEGER),
+        dict(name="embedding", type=field.FieldType.VECTOR)
+      ]),
+      rows=[dict(item_id=i, embedding=v) for i, v in enumerate(null_vectors)]
+    )))
+    return dataset
+  unindexed_dataset = dict_items_dataset()
+  indexed_datasets = [items_dataset(null_vectors), dict_items_dataset()]
+  for dataset in indexed_datasets:
+    dataset.create_index("items", "embedding", IndexType.IVF_FLAT, num_lists=2, nprobe=1)
+  # the rows with null vectors come last, in row order
+  for sql, expected in [
+    ("select item_id from items order by embedding to [0, 1] limit 10", [0, 1, 3, 4, 6, 7, 8, 9, 2, 5]),
+    ("select item_id from items order by embedding to [0, 1] limit 9", [0, 1, 3, 4, 6, 7, 8, 9, 2]),
+    ("select item_id from items where item_id < 9 order by embedding to [0, 1] limit 10", [0, 1, 3, 4, 6, 7, 8, 2, 5]),
+  ]:
+    # without any index, the distances of all the rows are sorted
+    assert [row[0] for row in unindexed_dataset.query(sql).execute()] == expected
+    # searched by the contiguous vectors or the vector indexes
+    for dataset in [items_dataset(null_vectors)] + indexed_datasets:
+      assert [row[0] for row in dataset.query(sql).execute()] == expected, sql
@@ -0,0 +1,67 @@
+from .. import dataset as ds
+from ..adapters.dataframe_adapter import DataFrameAdapter
+from ..adapters.dict_adapter import DictAdapter
+from ..compilers import local
+from ..field import FieldType
+from ..query_parser import parse_statement
+from ..schema import Schema
+from ..storage.ranges import ColumnRange, columnRanges
+from ..storage.zone_map import ZoneMap
+from pandas import DataFrame
+import numpy as np
+
+num_events = 1000
+event_schema = dict(
+  fields=[
+    dict(name="event_id", type=FieldType.INTEGER),
+    dict(name="ts", type=FieldType.FLOAT),
+    dict(name="kind", type=FieldType.STRING)
+  ]
+)
+events_dataframe = DataFrame(dict(
+  event_id = np.arange(num_events),
+  # appended in time order
+  ts = np.arange(num_events) * 0.5,
+  kind = ['click' if i % 3 else 'view' for i in range(num_events)]
+))
+
+def where(condition):
+  return parse_statement('select * from events where ' + condition).bool_op
+
+def test_column_ranges():
+  schema = Schema(**event_schema)
+  ranges = columnRanges(where('ts > 10 and 20 >= ts and kind = "view" or 1 = 1'), schema)
+  # disjunctions are not extracted
+  assert ranges == {}
+  ranges = columnRanges(where('ts > 10 and 20 >= ts and kind = "view"'), schema)
+  assert ranges[1].low == 10 and not ranges[1].low_inclusive and ranges[1].high == 20 and ranges[1].high_inclusive
+  assert ranges[2].isPoint()
+  assert ColumnRange(low=5).intersect(ColumnRange(high=4)).isEmpty()
+
+def test_zone_map_incremental_update():
+  schema = Schema(fields=[dict(name="x", type=FieldType.INTEGER), dict(name="v", type=FieldType.VECTOR)])
+  zone_map = ZoneMap.fromColumns(schema, [np.arange(150), [None] * 150], block_size=100)
+  assert zone_map.numBlocks() == 2 and zone_map.columns[0] == [(0, 99), (100, 149)]
+  # vectors are not orderable
+  assert 1 not in zone_map.columns
+  zone_map.update([np.arange(1000, 1100), [None] * 100])
+  assert zone_map.columns[0] == [(0, 99), (100, 1049), (1050, 1099)]
+  assert zone_map.candidateBlocks({0: ColumnRange(low=120, high=130)}) == [1]
+  assert zone_map.candidateRowRanges({0: ColumnRange(low=50, high=1060)}) == [(0, 250)]
+
+def test_zone_map_block_skipping():
+  dataset = ds.DataSet()
+  dataset.add_adapter(DataFrameAdapter(events=dict(schema=event_schema, dataframe=events_dataframe, block_size=100)))
+  dataset.add_adapter(DictAdapter(events_dict=dict(
+    schema=event_schema, rows=events_dataframe.to_dict('records'), block_size=100
+  )))
+  for table_name in ('events', 'events_dict'):
+    query = dataset.query('select event_id from {} where ts >= 450 and kind = "view"'.format(table_name))
+    ctx = {'dataset': dataset, 'params': ()}
+    results = list(local.compile(query)(ctx))
+    assert [row[0] for row in results] == [i for i in range(900, num_events) if i % 3 == 0]
+    # only the last block of 100 rows is scanned by the selection
+    num_input_rows = ctx[local.stat_field_in_ctx][local.num_input_rows_and_cost_factor_field]
+    assert num_input_rows[0][0] == 100
+    # no block qualifies
+    assert dataset.query('select event_id from {} where ts < 0'.format(table_name)).get_pretty_results() == []